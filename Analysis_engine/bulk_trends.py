@@ -0,0 +1,319 @@
+"""
+Vectorized bulk trends over historical emotion rows.
+
+Streams (userId, Emotion, TimeStamp) rows - the shape save_user_emotion writes to
+`user_emotion` - in fixed-size chunks and folds each chunk into per-user running sums
+with NumPy (bincount / add.at), so memory depends on the number of users, never on
+the history size. From the sums it reports, per user:
+
+- slope:      least-squares trend of valence (Happy +1 ... Sad/Fear/Angry/Disgust -1) per day
+- volatility: standard deviation of valence
+- dominant emotion before / since `split` and whether it shifted
+
+Reading uses pyarrow's streaming CSV reader when installed, otherwise the csv module.
+Zoned ISO timestamps are converted to UTC and naive ones are taken as UTC (see
+to_epoch_seconds: save_user_emotion writes naive local time).
+
+Usage:
+    python bulk_trends.py user_emotion.csv --split 2025-06-01 --out weekly_trends.csv
+    python bulk_trends.py --benchmark 2000000
+"""
+
+import argparse
+import csv
+import datetime
+import os
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pa_compute
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional: fall back to the csv module for reading
+    pa = None
+
+from calculate_trend import EMOTION_INDEX, EMOTIONS
+
+# Valence per emotion, indexed like EMOTIONS
+VALENCE = np.array([-1.0, -1.0, -1.0, 1.0, -1.0, 0.5, 0.0])
+SECONDS_PER_DAY = 86400.0
+
+
+def parse_iso_utc(value) -> float:
+    """One ISO-8601 timestamp -> UTC seconds; a naive value is taken as UTC, unparseable -> NaN"""
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return np.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def to_epoch_seconds(values) -> np.ndarray:
+    """
+    Vectorized ISO-8601 (or numeric) timestamps -> float UTC seconds; unparseable values become NaN.
+
+    Values with a zone designator (Z, +HH:MM, -HH:MM) are converted to UTC. Naive values are
+    taken as UTC as they are: save_user_emotion writes the worker's naive local time, so a
+    worker not running in UTC shifts its rows by its UTC offset (trends per day are unaffected,
+    only where --split falls).
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in "iuf":
+        return values.astype(np.float64)
+    try:
+        with warnings.catch_warnings():
+            # NumPy only warns about (and would apply) zone designators; send those chunks below
+            warnings.simplefilter("error", UserWarning)
+            parsed = np.asarray(values, dtype="datetime64[us]")
+        return np.where(np.isnat(parsed), np.nan, parsed.astype(np.int64) / 1e6)
+    except (ValueError, UserWarning):
+        pass
+    if pa is not None:
+        try:
+            # All values zoned (e.g. a timestamptz export): pyarrow converts the offsets in C
+            parsed = pa_compute.cast(pa.array(values, pa.string()), pa.timestamp("us", "UTC"))
+            return parsed.cast(pa.int64()).to_numpy(zero_copy_only=False) / 1e6
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    # Mixed naive and zoned, or bad values: parse each distinct value once, only for this chunk
+    seconds = {value: parse_iso_utc(value) for value in set(values.tolist())}
+    return np.array([seconds[value] for value in values.tolist()], dtype=np.float64)
+
+
+def iter_csv_chunks(path: str, chunk_rows: int = 500_000):
+    """Yield (user_ids, emotions, timestamps) numpy arrays of at most ~chunk_rows rows"""
+    if pa is not None:
+        # ~40 bytes per row; pyarrow decodes block by block in C
+        read_options = pa_csv.ReadOptions(block_size=max(1 << 20, chunk_rows * 40))
+        convert_options = pa_csv.ConvertOptions(
+            include_columns=["userId", "Emotion", "TimeStamp"],
+            column_types={"userId": pa.string(), "Emotion": pa.string(), "TimeStamp": pa.string()},
+        )
+        with pa_csv.open_csv(path, read_options=read_options, convert_options=convert_options) as reader:
+            for batch in reader:
+                yield (
+                    batch.column("userId").to_numpy(zero_copy_only=False),
+                    batch.column("Emotion").to_numpy(zero_copy_only=False),
+                    batch.column("TimeStamp").to_numpy(zero_copy_only=False),
+                )
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        cols = [header.index(name) for name in ("userId", "Emotion", "TimeStamp")]
+        rows = []
+        for row in reader:
+            rows.append([row[c] for c in cols])
+            if len(rows) >= chunk_rows:
+                yield tuple(np.array(rows, dtype=object).T)
+                rows = []
+        if rows:
+            yield tuple(np.array(rows, dtype=object).T)
+
+
+class BulkTrendAggregator:
+    """
+    Mergeable per-user sums for trend statistics.
+
+    Times are kept in days relative to `origin` (the first timestamp seen unless given)
+    so the regression sums stay well conditioned in float64.
+    """
+
+    def __init__(self, split: float | None = None, origin: float | None = None):
+        self.split = split
+        self.origin = origin
+        self.user_index = {}
+        self.user_ids = []
+        self.rows = 0
+        self.skipped = 0
+        self._alloc(1024)
+
+    def _alloc(self, capacity: int):
+        def grow(old, shape):
+            new = np.zeros(shape, dtype=old.dtype if old is not None else np.float64)
+            if old is not None:
+                new[: len(old)] = old
+            return new
+
+        self.capacity = capacity
+        self.n = grow(getattr(self, "n", None), capacity)
+        self.st = grow(getattr(self, "st", None), capacity)
+        self.stt = grow(getattr(self, "stt", None), capacity)
+        self.sy = grow(getattr(self, "sy", None), capacity)
+        self.syy = grow(getattr(self, "syy", None), capacity)
+        self.sty = grow(getattr(self, "sty", None), capacity)
+        # [user, period (0 = before split, 1 = since), emotion]
+        old = getattr(self, "counts", None)
+        self.counts = np.zeros((capacity, 2, len(EMOTIONS)), dtype=np.int64)
+        if old is not None:
+            self.counts[: len(old)] = old
+
+    def _user_codes(self, user_ids: np.ndarray) -> np.ndarray:
+        uniques, inverse = np.unique(user_ids.astype(str), return_inverse=True)
+        # Only the chunk's distinct users go through Python
+        mapping = np.empty(len(uniques), dtype=np.int64)
+        for i, uid in enumerate(uniques):
+            code = self.user_index.get(uid)
+            if code is None:
+                code = self.user_index[uid] = len(self.user_ids)
+                self.user_ids.append(uid)
+            mapping[i] = code
+        if len(self.user_ids) > self.capacity:
+            self._alloc(max(len(self.user_ids), self.capacity * 2))
+        return mapping[inverse]
+
+    @staticmethod
+    def _emotion_codes(emotions: np.ndarray) -> np.ndarray:
+        uniques, inverse = np.unique(emotions.astype(str), return_inverse=True)
+        mapping = np.array([EMOTION_INDEX.get(e.strip().lower(), -1) for e in uniques], dtype=np.int64)
+        return mapping[inverse]
+
+    def update(self, user_ids, emotions, timestamps):
+        """Fold one chunk of rows into the running sums"""
+        ts = to_epoch_seconds(timestamps)
+        emotion = self._emotion_codes(np.asarray(emotions))
+        valid = (emotion >= 0) & ~np.isnan(ts)
+        self.skipped += int((~valid).sum())
+        if not valid.any():
+            return
+        user = self._user_codes(np.asarray(user_ids)[valid])
+        emotion = emotion[valid]
+        ts = ts[valid]
+        if self.origin is None:
+            self.origin = float(ts.min())
+
+        t = (ts - self.origin) / SECONDS_PER_DAY
+        y = VALENCE[emotion]
+        size = self.capacity
+        self.n += np.bincount(user, minlength=size)
+        self.st += np.bincount(user, weights=t, minlength=size)
+        self.stt += np.bincount(user, weights=t * t, minlength=size)
+        self.sy += np.bincount(user, weights=y, minlength=size)
+        self.syy += np.bincount(user, weights=y * y, minlength=size)
+        self.sty += np.bincount(user, weights=t * y, minlength=size)
+        period = (ts >= self.split).astype(np.int64) if self.split is not None else np.zeros(len(ts), dtype=np.int64)
+        np.add.at(self.counts, (user, period, emotion), 1)
+        self.rows += len(ts)
+
+    def result(self) -> dict:
+        """Per-user arrays (aligned with `user_ids`)"""
+        k = len(self.user_ids)
+        n, st, stt, sy, syy, sty = (a[:k] for a in (self.n, self.st, self.stt, self.sy, self.syy, self.sty))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = sy / n
+            denom = n * stt - st * st
+            slope = np.where(denom > 1e-12, (n * sty - st * sy) / denom, 0.0)
+            volatility = np.sqrt(np.maximum(syy / n - mean * mean, 0.0))
+        counts = self.counts[:k]
+        before = counts[:, 0].sum(axis=1) > 0
+        after = counts[:, 1].sum(axis=1) > 0
+        dominant_before = np.where(before, counts[:, 0].argmax(axis=1), -1)
+        dominant_after = np.where(after, counts[:, 1].argmax(axis=1), -1)
+        return {
+            "user_ids": np.array(self.user_ids, dtype=object),
+            "rows": n.astype(np.int64),
+            "mean_valence": mean,
+            "slope_per_day": slope,
+            "volatility": volatility,
+            "dominant_before": dominant_before,
+            "dominant_after": dominant_after,
+            "shifted": before & after & (dominant_before != dominant_after),
+        }
+
+
+def compute_trends(path: str, split: float | None = None, chunk_rows: int = 500_000) -> dict:
+    aggregator = BulkTrendAggregator(split)
+    for chunk in iter_csv_chunks(path, chunk_rows):
+        aggregator.update(*chunk)
+    result = aggregator.result()
+    result["skipped"] = aggregator.skipped
+    return result
+
+
+def write_trends(result: dict, path: str):
+    def label(idx):
+        return EMOTIONS[idx] if idx >= 0 else ""
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["userId", "rows", "mean_valence", "slope_per_day", "volatility",
+                         "dominant_before", "dominant_after", "shifted"])
+        for i, uid in enumerate(result["user_ids"]):
+            writer.writerow([
+                uid, int(result["rows"][i]), round(float(result["mean_valence"][i]), 4),
+                round(float(result["slope_per_day"][i]), 6), round(float(result["volatility"][i]), 4),
+                label(result["dominant_before"][i]), label(result["dominant_after"][i]),
+                bool(result["shifted"][i]),
+            ])
+
+
+def generate_rows(rows: int, users: int = 10_000, days: int = 28, seed: int = 0, chunk_rows: int = 500_000):
+    """Synthetic (userId, Emotion, TimeStamp) chunks; half the users drift towards negative emotions"""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2025-01-01T00:00:00", "us")
+    names = np.array(EMOTIONS, dtype=object)
+    for offset in range(0, rows, chunk_rows):
+        size = min(chunk_rows, rows - offset)
+        user = rng.integers(0, users, size)
+        seconds = rng.uniform(0, days * SECONDS_PER_DAY, size)
+        emotion = rng.integers(0, len(EMOTIONS), size)
+        drifting = (user % 2 == 0) & (rng.random(size) < seconds / (days * SECONDS_PER_DAY) * 0.5)
+        emotion[drifting] = EMOTION_INDEX["sad"]
+        stamps = (start + (seconds * 1e6).astype("timedelta64[us]")).astype(str)
+        yield np.char.add("user", user.astype(str)).astype(object), names[emotion], stamps
+
+
+def benchmark(rows: int, chunk_rows: int = 500_000):
+    """Rows/s for in-memory aggregation and for CSV -> trends end to end, on generated data"""
+    split = float(np.datetime64("2025-01-22", "us").astype(np.int64) / 1e6)
+
+    chunks = list(generate_rows(rows, chunk_rows=chunk_rows))
+    aggregator = BulkTrendAggregator(split)
+    start = time.perf_counter()
+    for chunk in chunks:
+        aggregator.update(*chunk)
+    result = aggregator.result()
+    aggregate_s = time.perf_counter() - start
+    print(f"aggregate: {rows} rows in {aggregate_s:.2f}s = {rows / aggregate_s:,.0f} rows/s "
+          f"({len(result['user_ids'])} users, {int(result['shifted'].sum())} shifted)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "user_emotion.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["userId", "Emotion", "TimeStamp"])
+            for users, emotions, stamps in chunks:
+                writer.writerows(zip(users, emotions, stamps))
+        del chunks
+        start = time.perf_counter()
+        compute_trends(path, split, chunk_rows)
+        end_to_end_s = time.perf_counter() - start
+    reader = "pyarrow" if pa is not None else "csv module"
+    print(f"csv -> trends ({reader}): {rows} rows in {end_to_end_s:.2f}s = {rows / end_to_end_s:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-user emotion trends over user_emotion exports")
+    parser.add_argument("csv", nargs="?", help="CSV export with userId, Emotion, TimeStamp columns")
+    parser.add_argument("--split", help="ISO time separating the baseline from the report period")
+    parser.add_argument("--out", default="user_trends.csv")
+    parser.add_argument("--chunk-rows", type=int, default=500_000)
+    parser.add_argument("--benchmark", type=int, metavar="ROWS", help="benchmark on generated data instead")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.chunk_rows)
+    elif args.csv:
+        split = float(to_epoch_seconds([args.split])[0]) if args.split else None
+        result = compute_trends(args.csv, split, args.chunk_rows)
+        write_trends(result, args.out)
+        print(f"{len(result['user_ids'])} users written to {args.out} ({result['skipped']} rows skipped)")
+    else:
+        parser.error("give a CSV file or --benchmark ROWS")
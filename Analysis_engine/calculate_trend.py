@@ -0,0 +1,254 @@
+"""
+Incremental emotion trend engine.
+
+Keeps rolling aggregates per uid and per mirror as predictions arrive, so trend queries
+are answered from the aggregates instead of rescanning `user_emotion` / `emotion_logs`:
+
+- lifetime counts per emotion
+- an exponentially weighted (time-decayed) emotion distribution
+- windowed distributions over the last 1h, 24h and 7d
+
+Each window is a ring of fixed-width time buckets with a running total, so adding an
+event and querying a window are both O(1) (expiring old buckets is bounded by the ring
+size). History can be backfilled from a CSV or SQLite export of either table.
+
+Usage:
+    python calculate_trend.py --csv user_emotion.csv --uid <userId>
+    python calculate_trend.py --sqlite admin.db --table emotion_logs --mirror <mirrorId>
+"""
+
+import argparse
+import csv
+import datetime
+import math
+import sqlite3
+import time
+
+import numpy as np
+
+# Same label order as the emotion worker
+EMOTIONS = ["Angry", "Disgust", "Fear", "Happy", "Sad", "Surprise", "Neutral"]
+EMOTION_INDEX = {name.lower(): i for i, name in enumerate(EMOTIONS)}
+
+# name -> (span seconds, bucket seconds)
+DEFAULT_WINDOWS = {
+    "1h": (3600, 300),
+    "24h": (86400, 3600),
+    "7d": (7 * 86400, 6 * 3600),
+}
+DEFAULT_HALF_LIFE_SECONDS = 3600.0
+
+
+def parse_timestamp(value) -> float:
+    """Unix seconds from a number, a numeric string or an ISO-8601 string (as save_user_emotion writes)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+class RollingWindow:
+    """Emotion counts over the last `span` seconds, in a ring of `span / bucket` buckets"""
+
+    def __init__(self, span: float, bucket: float):
+        self.span = span
+        self.bucket = bucket
+        self.size = max(1, int(math.ceil(span / bucket)))
+        self.buckets = np.zeros((self.size, len(EMOTIONS)), dtype=np.int32)
+        self.totals = np.zeros(len(EMOTIONS), dtype=np.int64)
+        self.head = None  # newest bucket id seen
+
+    def _advance(self, bucket_id: int):
+        if self.head is not None and bucket_id <= self.head:
+            return
+        if self.head is None or bucket_id - self.head >= self.size:
+            self.buckets[:] = 0
+            self.totals[:] = 0
+        else:
+            # Expire the slots the new buckets reuse
+            for b in range(self.head + 1, bucket_id + 1):
+                slot = b % self.size
+                self.totals -= self.buckets[slot]
+                self.buckets[slot] = 0
+        self.head = bucket_id
+
+    def add(self, timestamp: float, emotion_idx: int, count: int = 1) -> bool:
+        bucket_id = int(timestamp // self.bucket)
+        self._advance(bucket_id)
+        if bucket_id <= self.head - self.size:
+            return False  # older than the window
+        self.buckets[bucket_id % self.size, emotion_idx] += count
+        self.totals[emotion_idx] += count
+        return True
+
+    def counts(self, now: float | None = None) -> np.ndarray:
+        """Counts per emotion within the window ending at `now` (bucket granularity)"""
+        if now is not None:
+            self._advance(int(now // self.bucket))
+        return self.totals.copy()
+
+
+class TrendSeries:
+    """All aggregates for one uid or mirror"""
+
+    def __init__(self, windows: dict, half_life: float):
+        self.half_life = half_life
+        self.counts = np.zeros(len(EMOTIONS), dtype=np.int64)
+        self.decayed = np.zeros(len(EMOTIONS), dtype=np.float64)
+        self.last_ts = None
+        self.windows = {name: RollingWindow(span, bucket) for name, (span, bucket) in windows.items()}
+
+    def _decay(self, dt: float) -> float:
+        return 0.5 ** (max(dt, 0.0) / self.half_life)
+
+    def add(self, timestamp: float, emotion_idx: int, count: int = 1):
+        self.counts[emotion_idx] += count
+        if self.last_ts is None or timestamp >= self.last_ts:
+            if self.last_ts is not None:
+                self.decayed *= self._decay(timestamp - self.last_ts)
+            self.last_ts = timestamp
+            self.decayed[emotion_idx] += count
+        else:
+            # Late event: add it already decayed to the current reference time
+            self.decayed[emotion_idx] += count * self._decay(self.last_ts - timestamp)
+        for window in self.windows.values():
+            window.add(timestamp, emotion_idx, count)
+
+    def ewma(self, now: float | None = None):
+        """(distribution, activity): the time-decayed emotion mix and the decayed event weight"""
+        total = self.decayed.sum()
+        if total <= 0:
+            return np.zeros(len(EMOTIONS)), 0.0
+        activity = total * (self._decay(now - self.last_ts) if now is not None else 1.0)
+        return self.decayed / total, float(activity)
+
+    def snapshot(self, now: float | None = None) -> dict:
+        now = time.time() if now is None else now
+        distribution, activity = self.ewma(now)
+        result = {
+            "counts": dict(zip(EMOTIONS, self.counts.tolist())),
+            "ewma": dict(zip(EMOTIONS, np.round(distribution, 4).tolist())),
+            "activity": round(activity, 3),
+            "windows": {},
+        }
+        for name, window in self.windows.items():
+            counts = window.counts(now)
+            total = int(counts.sum())
+            result["windows"][name] = {
+                "total": total,
+                "distribution": dict(zip(EMOTIONS, np.round(counts / total, 4).tolist())) if total else {},
+                "dominant": EMOTIONS[int(counts.argmax())] if total else None,
+            }
+        return result
+
+
+class TrendEngine:
+    """
+    Rolling emotion aggregates keyed by uid and by mirror.
+
+    Feed it with add() as predictions arrive (or backfill_csv / backfill_sqlite for
+    history) and read them back with uid_trend() / mirror_trend().
+    """
+
+    def __init__(self, windows: dict | None = None, half_life: float = DEFAULT_HALF_LIFE_SECONDS):
+        self.windows = windows or DEFAULT_WINDOWS
+        self.half_life = half_life
+        self.users = {}
+        self.mirrors = {}
+        self.stats = {"events": 0, "unknown_emotions": 0}
+
+    def _series(self, table: dict, key: str) -> TrendSeries:
+        series = table.get(key)
+        if series is None:
+            series = table[key] = TrendSeries(self.windows, self.half_life)
+        return series
+
+    def add(self, emotion: str, timestamp=None, uid: str | None = None, mirror_id: str | None = None,
+            count: int = 1) -> bool:
+        idx = EMOTION_INDEX.get(str(emotion).strip().lower())
+        if idx is None:
+            self.stats["unknown_emotions"] += 1
+            return False
+        ts = time.time() if timestamp is None else parse_timestamp(timestamp)
+        if uid:
+            self._series(self.users, uid).add(ts, idx, count)
+        if mirror_id:
+            self._series(self.mirrors, mirror_id).add(ts, idx, count)
+        self.stats["events"] += 1
+        return True
+
+    def uid_trend(self, uid: str, now: float | None = None):
+        series = self.users.get(uid)
+        return series.snapshot(now) if series else None
+
+    def mirror_trend(self, mirror_id: str, now: float | None = None):
+        series = self.mirrors.get(mirror_id)
+        return series.snapshot(now) if series else None
+
+    def _ingest_row(self, row: dict) -> bool:
+        # user_emotion: userId, Emotion, TimeStamp; emotion_logs: mirrorId, emotion, count, timestamp
+        if "userId" in row:
+            return self.add(row["Emotion"], row["TimeStamp"], uid=row["userId"])
+        return self.add(row["emotion"], row["timestamp"], mirror_id=row["mirrorId"],
+                        count=int(row.get("count") or 1))
+
+    def backfill_csv(self, path: str) -> int:
+        """Load a CSV export of `user_emotion` or `emotion_logs` (detected from the header)"""
+        loaded = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    loaded += self._ingest_row(row)
+                except (KeyError, ValueError) as e:
+                    print(f"Skipping bad row {row}: {e}")
+        print(f"Backfilled {loaded} rows from {path}")
+        return loaded
+
+    def backfill_sqlite(self, path: str, table: str = "emotion_logs") -> int:
+        """Load `emotion_logs` (admin DB) or a `user_emotion` copy from SQLite, oldest first"""
+        if table == "user_emotion":
+            query = 'SELECT "userId", "Emotion", "TimeStamp" FROM user_emotion ORDER BY "TimeStamp"'
+        else:
+            query = f'SELECT mirrorId, emotion, count, timestamp FROM "{table}" ORDER BY timestamp'
+        loaded = 0
+        with sqlite3.connect(path) as conn:
+            conn.row_factory = sqlite3.Row
+            for row in conn.execute(query):
+                try:
+                    loaded += self._ingest_row(dict(row))
+                except (KeyError, ValueError) as e:
+                    print(f"Skipping bad row {dict(row)}: {e}")
+        print(f"Backfilled {loaded} rows from {path}:{table}")
+        return loaded
+
+
+if __name__ == "__main__":
+    import json
+
+    parser = argparse.ArgumentParser(description="Emotion trends from user_emotion / emotion_logs exports")
+    parser.add_argument("--csv", nargs="*", default=[], help="CSV exports to backfill")
+    parser.add_argument("--sqlite", help="SQLite database to backfill")
+    parser.add_argument("--table", default="emotion_logs", help="table in --sqlite (emotion_logs or user_emotion)")
+    parser.add_argument("--uid", action="append", default=[], help="print the trend for this uid")
+    parser.add_argument("--mirror", action="append", default=[], help="print the trend for this mirror")
+    parser.add_argument("--now", help="reference time for the windows (default: now)")
+    args = parser.parse_args()
+
+    engine = TrendEngine()
+    for path in args.csv:
+        engine.backfill_csv(path)
+    if args.sqlite:
+        engine.backfill_sqlite(args.sqlite, args.table)
+
+    now = parse_timestamp(args.now) if args.now else None
+    print(f"{len(engine.users)} uids, {len(engine.mirrors)} mirrors, {engine.stats}")
+    for uid in args.uid:
+        print(f"uid {uid}: {json.dumps(engine.uid_trend(uid, now), indent=2)}")
+    for mirror_id in args.mirror:
+        print(f"mirror {mirror_id}: {json.dumps(engine.mirror_trend(mirror_id, now), indent=2)}")
@@ -0,0 +1,28 @@
+"""
+Shared inference core for the gRPC worker (CNN) and the SigLIP detector.
+
+One unified label space (EMOTIONS), backend plug-ins that turn images into native class
+probabilities, and an InferenceEngine that adds batching, an optional result cache and
+timing stats on top of any backend.
+"""
+
+from .backend import Backend, available_backends, create_backend, register_backend
+from .engine import InferenceEngine
+from .labels import EMOTIONS, SIGLIP_LABELS, SIGLIP_TO_EMOTION, LabelMap
+from .runtime import configure_runtime, configure_threads, describe_layout, select_device
+
+__all__ = [
+    "Backend",
+    "EMOTIONS",
+    "InferenceEngine",
+    "LabelMap",
+    "SIGLIP_LABELS",
+    "SIGLIP_TO_EMOTION",
+    "available_backends",
+    "configure_runtime",
+    "configure_threads",
+    "create_backend",
+    "describe_layout",
+    "register_backend",
+    "select_device",
+]
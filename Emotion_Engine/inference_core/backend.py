@@ -0,0 +1,62 @@
+import importlib
+
+import numpy as np
+import torch
+
+from .labels import LabelMap
+from .runtime import select_device
+
+# Built-in backends are imported on first use, so the CNN worker never imports transformers
+_BUILTIN_MODULES = {
+    "cnn": ".cnn",
+    "siglip": ".siglip",
+    "siglip-int8": ".siglip",
+    "siglip-student": ".siglip",
+}
+_REGISTRY = {}
+
+
+class Backend:
+    """
+    A model that turns a list of images into native class probabilities.
+
+    Subclasses implement preprocess() (images -> model input batch) and forward() (batch
+    -> N x len(labels.native_labels) numpy probabilities). Images may be PIL images or
+    RGB numpy arrays.
+    """
+
+    name = ""
+
+    def __init__(self, labels: LabelMap, device: torch.device | None = None):
+        self.labels = labels
+        self.device = device or select_device()
+        self.model = None
+
+    def preprocess(self, images):
+        raise NotImplementedError
+
+    def forward(self, batch) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict_proba(self, images) -> np.ndarray:
+        return self.forward(self.preprocess(images))
+
+
+def register_backend(name: str):
+    """Decorator registering a backend factory (a Backend subclass or a function returning one)"""
+    def decorator(factory):
+        _REGISTRY[name] = factory
+        return factory
+    return decorator
+
+
+def available_backends():
+    return sorted(set(_REGISTRY) | set(_BUILTIN_MODULES))
+
+
+def create_backend(name: str, **options) -> Backend:
+    if name not in _REGISTRY and name in _BUILTIN_MODULES:
+        importlib.import_module(_BUILTIN_MODULES[name], __package__)
+    if name not in _REGISTRY:
+        raise ValueError(f"Unknown inference backend {name!r}; available: {', '.join(available_backends())}")
+    return _REGISTRY[name](**options)
@@ -0,0 +1,49 @@
+from collections.abc import Callable
+
+import numpy as np
+import torch
+import torchvision.transforms as transforms
+from PIL import Image
+
+from .backend import Backend, register_backend
+from .labels import EMOTIONS, LabelMap
+
+infer_transform: Callable[[Image.Image], torch.Tensor] = transforms.Compose([
+    transforms.Resize((48, 48)),
+    transforms.Grayscale(num_output_channels=1),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.5], std=[0.5])
+])
+
+
+@register_backend("cnn")
+class CnnBackend(Backend):
+    """The worker's 48x48 greyscale CNN; predicts EMOTIONS directly
+
+    With mmap=True (CPU only) the weights stay memory-mapped from the checkpoint file
+    instead of being copied into the model, so every process serving the same file shares
+    one copy of them in the page cache.
+    """
+
+    name = "cnn"
+
+    def __init__(self, path: str, model_cls, device=None, mmap: bool = False):
+        super().__init__(LabelMap(EMOTIONS), device)
+        mmap = mmap and self.device.type == "cpu"
+        model = model_cls()
+        model.load_state_dict(torch.load(path, map_location="cpu", mmap=mmap), assign=mmap)
+        model.to(self.device)
+        model.eval()
+        self.model = model
+
+    def preprocess(self, images):
+        tensors = [
+            infer_transform(image if isinstance(image, Image.Image) else Image.fromarray(image))
+            for image in images
+        ]
+        return torch.stack(tensors).to(self.device)
+
+    def forward(self, batch) -> np.ndarray:
+        with torch.no_grad():
+            # The CNN ends in log_softmax
+            return self.model(batch).exp().cpu().numpy()
@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from .backend import Backend
+
+
+class InferenceEngine:
+    """
+    Batching, caching and instrumentation around a Backend.
+
+    predict_native() returns the backend's own class probabilities and predict_proba()
+    the same projected onto EMOTIONS. Images are run in chunks of at most max_batch_size.
+    With cache_size > 0, results are cached per image content (LRU), which pays for the
+    hashing only when identical crops/frames actually recur. predict_proba_async runs on
+    `executor` (default: the event loop's default executor).
+    """
+
+    def __init__(self, backend: Backend, max_batch_size: int = 16, cache_size: int = 0, executor=None):
+        self.backend = backend
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "images": 0, "batches": 0, "cache_hits": 0, "seconds": 0.0}
+
+    @property
+    def labels(self):
+        return self.backend.labels
+
+    @staticmethod
+    def _key(image) -> bytes:
+        if isinstance(image, Image.Image):
+            data, shape = image.tobytes(), (image.mode, image.size)
+        else:
+            array = np.ascontiguousarray(image)
+            data, shape = array.tobytes(), (str(array.dtype), array.shape)
+        return hashlib.blake2b(data + repr(shape).encode(), digest_size=16).digest()
+
+    def predict_native(self, images) -> np.ndarray:
+        """(N, native classes) probabilities for a list of images"""
+        images = list(images)
+        results = [None] * len(images)
+        keys = None
+        if self.cache_size > 0:
+            keys = [self._key(image) for image in images]
+            with self._lock:
+                for i, key in enumerate(keys):
+                    cached = self._cache.get(key)
+                    if cached is not None:
+                        self._cache.move_to_end(key)
+                        results[i] = cached
+                        self.stats["cache_hits"] += 1
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        batch_size = max(1, self.max_batch_size)
+        start = time.perf_counter()
+        for offset in range(0, len(pending), batch_size):
+            chunk = pending[offset:offset + batch_size]
+            probs = self.backend.predict_proba([images[i] for i in chunk])
+            for i, row in zip(chunk, probs):
+                results[i] = row
+            self.stats["batches"] += 1
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["images"] += len(pending)
+            self.stats["seconds"] += elapsed
+            if keys is not None:
+                for i in pending:
+                    self._cache[keys[i]] = results[i]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        if not results:
+            return np.empty((0, len(self.labels.native_labels)), dtype=np.float32)
+        return np.stack(results)
+
+    def predict_proba(self, images) -> np.ndarray:
+        """(N, len(EMOTIONS)) probabilities for a list of images"""
+        return self.labels.to_unified(self.predict_native(images))
+
+    async def predict_proba_async(self, images) -> np.ndarray:
+        """predict_proba on the engine's executor, so the event loop keeps serving"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.predict_proba, images)
+
+    def summary(self) -> str:
+        images = self.stats["images"]
+        per_image = self.stats["seconds"] / images * 1000 if images else 0.0
+        return (
+            f"{self.backend.name}: {images} imgs in {self.stats['batches']} batches, "
+            f"{per_image:.1f} ms/img, {self.stats['cache_hits']} cache hits"
+        )
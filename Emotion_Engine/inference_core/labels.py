@@ -0,0 +1,57 @@
+import numpy as np
+
+# The unified label space, in the order the CNN was trained on (and results are stored in)
+EMOTIONS = [
+    "Angry",
+    "Disgust",
+    "Fear",
+    "Happy",
+    "Sad",
+    "Surprise",
+    "Neutral",
+]
+
+# Class index -> label for the SigLIP2 classifier (and the student distilled from it)
+SIGLIP_LABELS = {
+    0: "Ahegao",
+    1: "Angry",
+    2: "Happy",
+    3: "Neutral",
+    4: "Sad",
+    5: "Surprise",
+}
+
+# SigLIP label -> unified label; None drops the class
+SIGLIP_TO_EMOTION = {
+    "Ahegao": None,
+    "Angry": "Angry",
+    "Happy": "Happy",
+    "Neutral": "Neutral",
+    "Sad": "Sad",
+    "Surprise": "Surprise",
+}
+
+
+class LabelMap:
+    """Projects a backend's native class probabilities onto EMOTIONS
+
+    Native classes map to a unified label by name (or through `mapping`); classes that map
+    to nothing are dropped and the rest renormalized. Unified labels the backend cannot
+    predict (e.g. Disgust/Fear for SigLIP) get probability 0.
+    """
+
+    def __init__(self, native_labels, mapping=None):
+        self.native_labels = list(native_labels)
+        mapping = mapping or {}
+        index = {name: i for i, name in enumerate(EMOTIONS)}
+        self.matrix = np.zeros((len(self.native_labels), len(EMOTIONS)), dtype=np.float32)
+        for i, name in enumerate(self.native_labels):
+            target = mapping.get(name, name)
+            if target in index:
+                self.matrix[i, index[target]] = 1.0
+
+    def to_unified(self, probs: np.ndarray) -> np.ndarray:
+        """(N, native) -> (N, len(EMOTIONS)) probabilities"""
+        unified = np.asarray(probs, dtype=np.float32) @ self.matrix
+        total = unified.sum(axis=1, keepdims=True)
+        return np.divide(unified, total, out=np.zeros_like(unified), where=total > 0)
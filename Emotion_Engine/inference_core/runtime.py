@@ -0,0 +1,167 @@
+import os
+
+import torch
+
+NUMA_SYSFS = "/sys/devices/system/node"
+
+
+def select_device(name: str | None = None) -> torch.device:
+    """Device from `name` or INFERENCE_DEVICE: cpu, cuda or auto (default: cuda if available)"""
+    name = (name or os.getenv("INFERENCE_DEVICE", "auto")).lower()
+    if name == "auto":
+        name = "cuda" if torch.cuda.is_available() else "cpu"
+    return torch.device(name)
+
+
+def configure_threads(num_threads: int | None = None, interop_threads: int | None = None):
+    """Set torch's intra-/inter-op thread pools (INFERENCE_THREADS / INFERENCE_INTEROP_THREADS)
+
+    Unset values leave torch's defaults alone. Inter-op threads can only be set once per
+    process, before any parallel work, so a late call is reported and ignored.
+    """
+    num_threads = num_threads or int(os.getenv("INFERENCE_THREADS", "0"))
+    interop_threads = interop_threads or int(os.getenv("INFERENCE_INTEROP_THREADS", "0"))
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    if interop_threads > 0 and interop_threads != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            print(f"Could not set inter-op threads: {e}")
+    return torch.get_num_threads()
+
+
+def parse_cpulist(text: str) -> list[int]:
+    """CPU ids from a Linux cpulist such as "0-7,16-23" """
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return sorted(set(cpus))
+
+
+def format_cpulist(cpus) -> str:
+    """Inverse of parse_cpulist"""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{a}-{b}" if a != b else str(a) for a, b in ranges)
+
+
+def numa_nodes() -> dict:
+    """NUMA node -> CPU ids from sysfs (empty off Linux)"""
+    nodes = {}
+    try:
+        names = os.listdir(NUMA_SYSFS)
+    except OSError:
+        return nodes
+    for name in names:
+        if name.startswith("node") and name[4:].isdigit():
+            with open(os.path.join(NUMA_SYSFS, name, "cpulist")) as f:
+                cpus = parse_cpulist(f.read())
+            if cpus:
+                nodes[int(name[4:])] = cpus
+    return dict(sorted(nodes.items()))
+
+
+def _available_cpus() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def worker_cpus(worker_index: int = 0, worker_count: int = 1, cpus=None, numa_node: int | None = None) -> list[int]:
+    """The slice of CPUs worker `worker_index` of `worker_count` should run on
+
+    CPUs are ordered by NUMA node before slicing, so with a worker count that divides the
+    node size every worker stays on one node. More workers than CPUs share them round-robin.
+    """
+    allowed = list(cpus) if cpus is not None else _available_cpus()
+    nodes = numa_nodes()
+    if numa_node is not None and numa_node in nodes:
+        allowed = [cpu for cpu in allowed if cpu in nodes[numa_node]] or allowed
+    node_of = {cpu: node for node, node_cpus in nodes.items() for cpu in node_cpus}
+    allowed.sort(key=lambda cpu: (node_of.get(cpu, 0), cpu))
+    if worker_count <= 1:
+        return allowed
+    if worker_count > len(allowed):
+        return [allowed[worker_index % len(allowed)]]
+    per_worker = len(allowed) // worker_count
+    return allowed[worker_index * per_worker:(worker_index + 1) * per_worker]
+
+
+def pin_process(cpus) -> bool:
+    """Restrict every thread of this process (and threads started later) to `cpus`"""
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    cpus = set(cpus)
+    try:
+        tids = [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        tids = [0]
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError:
+            pass  # thread exited meanwhile
+    return True
+
+
+def configure_runtime(worker_index: int | None = None, worker_count: int | None = None,
+                      num_threads: int | None = None, interop_threads: int | None = None,
+                      executor_workers: int | None = None) -> dict:
+    """Pin this worker process and size torch's thread pools to its share of the host
+
+    Reads WORKER_INDEX / WORKER_COUNT (this process's slot among the workers on the host),
+    INFERENCE_CPUS (a cpulist to confine all workers to), INFERENCE_NUMA_NODE,
+    INFERENCE_PIN (default 1), INFERENCE_EXECUTOR_WORKERS (concurrent inference calls,
+    default 1) and INFERENCE_THREADS / INFERENCE_INTEROP_THREADS. By default the intra-op
+    pool gets cpus / executor_workers threads and the inter-op pool 1, so torch, the
+    inference executor and sibling workers never oversubscribe the cores.
+    Call it from the main thread before the model runs; returns the effective layout.
+    """
+    worker_index = worker_index if worker_index is not None else int(os.getenv("WORKER_INDEX", "0"))
+    worker_count = worker_count or int(os.getenv("WORKER_COUNT", "1"))
+    executor_workers = max(1, executor_workers or int(os.getenv("INFERENCE_EXECUTOR_WORKERS", "1")))
+    cpulist = os.getenv("INFERENCE_CPUS")
+    numa_node = os.getenv("INFERENCE_NUMA_NODE")
+
+    cpus = worker_cpus(
+        worker_index,
+        worker_count,
+        parse_cpulist(cpulist) if cpulist else None,
+        int(numa_node) if numa_node else None,
+    )
+    pinned = os.getenv("INFERENCE_PIN", "1") == "1" and pin_process(cpus)
+    num_threads = num_threads or int(os.getenv("INFERENCE_THREADS", "0")) or max(1, len(cpus) // executor_workers)
+    interop_threads = interop_threads or int(os.getenv("INFERENCE_INTEROP_THREADS", "0")) or 1
+    configure_threads(num_threads, interop_threads)
+
+    nodes = numa_nodes()
+    return {
+        "pid": os.getpid(),
+        "worker": f"{worker_index}/{worker_count}",
+        "cpus": format_cpulist(cpus),
+        "numa_nodes": sorted({node for node, node_cpus in nodes.items() if set(cpus) & set(node_cpus)}),
+        "pinned": pinned,
+        "intra_op_threads": torch.get_num_threads(),
+        "inter_op_threads": torch.get_num_interop_threads(),
+        "executor_workers": executor_workers,
+    }
+
+
+def describe_layout(layout: dict) -> str:
+    return (
+        f"worker {layout['worker']} (pid {layout['pid']}): cpus {layout['cpus'] or '-'} "
+        f"numa {layout['numa_nodes'] or '-'} pinned={layout['pinned']} "
+        f"intra-op={layout['intra_op_threads']} inter-op={layout['inter_op_threads']} "
+        f"executor={layout['executor_workers']}"
+    )
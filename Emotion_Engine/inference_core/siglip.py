@@ -0,0 +1,128 @@
+import os
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from PIL import Image
+
+from .backend import Backend, register_backend
+from .labels import SIGLIP_LABELS, SIGLIP_TO_EMOTION, LabelMap
+
+DEFAULT_MODEL_NAME = "prithivMLmods/Facial-Emotion-Detection-SigLIP2"
+
+
+def _siglip_labels():
+    return LabelMap([SIGLIP_LABELS[i] for i in sorted(SIGLIP_LABELS)], SIGLIP_TO_EMOTION)
+
+
+def _to_rgb_array(image):
+    if isinstance(image, Image.Image):
+        return np.asarray(image.convert("RGB"))
+    return image
+
+
+class SiglipBackend(Backend):
+    """SigLIP2 classifier in fp32, or with its Linear layers dynamically quantized to int8"""
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, device=None, cache_dir=None,
+                 local_files_only=False, quantize=False, **_):
+        from transformers import AutoImageProcessor, SiglipForImageClassification
+
+        # Dynamic quantization only has CPU kernels
+        super().__init__(_siglip_labels(), torch.device("cpu") if quantize else device)
+        self.name = "siglip-int8" if quantize else "siglip"
+        model = SiglipForImageClassification.from_pretrained(
+            model_name, cache_dir=cache_dir, local_files_only=local_files_only
+        )
+        self.processor = AutoImageProcessor.from_pretrained(
+            model_name, cache_dir=cache_dir, local_files_only=local_files_only, use_fast=True
+        )
+        model.eval()
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        self.model = model.to(self.device)
+
+    def preprocess(self, images):
+        pil_imgs = [
+            image.convert("RGB") if isinstance(image, Image.Image) else Image.fromarray(image).convert("RGB")
+            for image in images
+        ]
+        return self.processor(images=pil_imgs, return_tensors="pt").to(self.device)
+
+    def forward(self, batch) -> np.ndarray:
+        with torch.no_grad():
+            logits = self.model(**batch).logits
+        return F.softmax(logits, dim=1).cpu().numpy()
+
+
+class StudentNet(nn.Module):
+    """Small CNN (~0.4M parameters) trained to mimic SigLIP's output distribution"""
+
+    def __init__(self, num_labels, width=32):
+        super().__init__()
+        layers = []
+        channels = 3
+        for out_channels in (width, width * 2, width * 4, width * 8):
+            layers += [
+                nn.Conv2d(channels, out_channels, 3, padding=1, bias=False),
+                nn.BatchNorm2d(out_channels),
+                nn.ReLU(inplace=True),
+                nn.MaxPool2d(2),
+            ]
+            channels = out_channels
+        self.features = nn.Sequential(*layers)
+        self.classifier = nn.Linear(channels, num_labels)
+
+    def forward(self, x):
+        x = self.features(x)
+        x = F.adaptive_avg_pool2d(x, 1).flatten(1)
+        return self.classifier(x)
+
+
+def student_inputs(images, input_size):
+    """Resize RGB crops and normalize to [-1, 1], like the SigLIP processor"""
+    batch = np.stack([
+        cv2.resize(_to_rgb_array(image), (input_size, input_size), interpolation=cv2.INTER_AREA)
+        for image in images
+    ]).astype(np.float32)
+    batch = (batch / 127.5 - 1.0).transpose(0, 3, 1, 2)
+    return torch.from_numpy(np.ascontiguousarray(batch))
+
+
+def student_checkpoint_path(student_path, cache_dir=None):
+    """Relative student paths live in the model cache directory, when there is one"""
+    if cache_dir and not os.path.isabs(student_path):
+        return os.path.join(cache_dir, student_path)
+    return student_path
+
+
+@register_backend("siglip-student")
+class StudentBackend(Backend):
+    """Distilled student; predicts over the SigLIP label map"""
+
+    name = "siglip-student"
+
+    def __init__(self, student_path="siglip_student.pt", device=None, cache_dir=None, model=None,
+                 input_size=64, **_):
+        super().__init__(_siglip_labels(), device)
+        if model is None:
+            checkpoint = torch.load(student_checkpoint_path(student_path, cache_dir), map_location="cpu")
+            model = StudentNet(checkpoint["num_labels"], checkpoint.get("width", 32))
+            model.load_state_dict(checkpoint["state_dict"])
+            input_size = checkpoint["input_size"]
+        self.model = model.to(self.device).eval()
+        self.input_size = input_size
+
+    def preprocess(self, images):
+        return student_inputs(images, self.input_size).to(self.device)
+
+    def forward(self, batch) -> np.ndarray:
+        with torch.no_grad():
+            logits = self.model(batch)
+        return F.softmax(logits, dim=1).cpu().numpy()
+
+
+register_backend("siglip")(SiglipBackend)
+register_backend("siglip-int8")(lambda **options: SiglipBackend(quantize=True, **options))
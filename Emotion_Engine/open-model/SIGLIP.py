@@ -1,31 +1,89 @@
+import argparse
+import csv
+import itertools
+import math
+import os
+import queue
+import sys
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 import cv2
-from PIL import Image
 import numpy as np
 import torch
-from transformers import AutoImageProcessor, SiglipForImageClassification
-import torch.nn.functional as F
 import mediapipe as mp
 from collections import defaultdict, deque
 import time
 
+# The shared inference core lives next to this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from inference_core import EMOTIONS, InferenceEngine, configure_threads, select_device
+from model_tiers import DEFAULT_MODEL_NAME, TIERS, load_tier
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # optional: FaceTracker falls back to greedy matching
+    linear_sum_assignment = None
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
 
 class EmotionDetectionConfig:
     """Configuration class for emotion detection parameters"""
 
     def __init__(self):
-        self.model_name = "prithivMLmods/Facial-Emotion-Detection-SigLIP2"
+        self.model_name = DEFAULT_MODEL_NAME
+        # "full" (fp32 SigLIP), "int8" (dynamically quantized, CPU) or "student" (distilled
+        # CNN, see model_tiers.py). Set model_cache_dir + local_files_only for offline mirrors.
+        self.model_tier = os.getenv("SIGLIP_MODEL_TIER", "full")
+        self.model_cache_dir = os.getenv("SIGLIP_CACHE_DIR") or None
+        self.local_files_only = os.getenv("SIGLIP_LOCAL_FILES_ONLY", "0") == "1"
+        self.student_path = "siglip_student.pt"  # relative to model_cache_dir if set
         self.min_detection_confidence = 0.7
         self.padding_ratio = 0.2
         self.min_face_size = 50
         self.base_skip_frames = 1
-        self.max_skip_frames = 10
+        # Full face detection runs every K frames (adapted between these bounds by
+        # AdaptiveQualityController) or sooner when motion is detected; boxes are propagated
+        # with a constant-velocity model in between.
+        self.base_detection_interval = 1
+        self.max_detection_interval = 5
+        self.motion_threshold = 12.0  # mean abs grey-level change on a tiny frame thumbnail
+        self.detection_max_width = 640  # MediaPipe runs on a copy downscaled to at most this width
+        self.trace_allocations = False  # tracemalloc per-frame allocation stats (adds overhead)
         self.smoothing_window = 5
+        # Per-track result reuse: a face whose crop changed less than stability_threshold
+        # (mean abs grey level on a 16x16 thumbnail) keeps its last prediction, with
+        # confidence decayed per reuse, for at most max_cached_rounds classification rounds.
+        self.stability_threshold = 4.0
+        self.max_cached_rounds = 10
+        self.cached_confidence_decay = 0.9
         self.face_tracking_threshold = 0.3
         self.performance_check_interval = 10  # frames
         self.target_fps = 10
+        self.max_batch_size = 16  # faces per SigLIP forward pass
+        # AdaptiveQualityController bounds: faces classified per frame (round-robin across
+        # tracks when there are more) and the detection widths it may step down through
+        self.max_faces_per_frame = 16
+        self.detection_widths = (640, 480, 320, 240)
+        self.pipeline_queue_size = 4  # frames buffered between pipeline stages
+
+        # Offline (batch file) processing
+        self.offline_batch_frames = 8  # consecutive frames whose faces are classified together
+        self.offline_decode_workers = 4
+        self.offline_decode_buffer = 32  # decoded frames (video or image folder) buffered ahead
+        self.offline_image_fps = None  # image folders carry no timing: timestamp_s is NaN unless set
 
         # Filter out inappropriate emotions
-        self.emotion_filter = {"Ahegao"}  # Emotions to exclude
+        # Unified emotions to exclude (SigLIP's Ahegao class is already dropped by the label map)
+        self.emotion_filter = set()
+        self.inference_cache_size = 0  # per-crop result cache in the inference engine; 0 disables
 
         self.webcam_width = 1920
         self.webcam_height = 1080
@@ -33,86 +91,154 @@ class EmotionDetectionConfig:
 
 
 class FaceTracker:
-    """Simple face tracker using IoU overlap"""
+    """Face tracker using IoU overlap with one-to-one detection/track assignment
+
+    Tracks live in parallel NumPy arrays (ids, boxes, missing-frame counts). Each update
+    builds the full detections x tracks IoU matrix in one vectorized step and solves the
+    assignment with the Hungarian algorithm (scipy, if installed) or greedy matching on
+    IoU sorted in descending order, so two faces can never claim the same track.
+    """
 
     def __init__(self, tracking_threshold=0.3):
         self.tracking_threshold = tracking_threshold
-        self.tracked_faces = {}
+        self.ids = np.empty(0, dtype=np.int64)
+        self.boxes = np.empty((0, 4), dtype=np.float64)  # x, y, w, h
+        self.missing = np.empty(0, dtype=np.int64)
+        self.velocities = np.empty((0, 2), dtype=np.float64)  # dx, dy per frame
+        self.propagated = np.empty(0, dtype=np.int64)  # frames propagated since last detection
         self.next_id = 0
         self.max_missing_frames = 10
 
+    @property
+    def tracked_faces(self):
+        """Current tracks as {track_id: {"bbox": (x, y, w, h), "missing_frames": n}}"""
+        return {
+            int(track_id): {"bbox": tuple(int(v) for v in box), "missing_frames": int(missing)}
+            for track_id, box, missing in zip(self.ids, self.boxes, self.missing)
+        }
+
     def calculate_iou(self, box1, box2):
         """Calculate Intersection over Union of two bounding boxes"""
-        x1, y1, w1, h1 = box1
-        x2, y2, w2, h2 = box2
-
-        # Calculate intersection
-        xi1 = max(x1, x2)
-        yi1 = max(y1, y2)
-        xi2 = min(x1 + w1, x2 + w2)
-        yi2 = min(y1 + h1, y2 + h2)
-
-        if xi2 <= xi1 or yi2 <= yi1:
-            return 0.0
-
-        intersection = (xi2 - xi1) * (yi2 - yi1)
-        union = w1 * h1 + w2 * h2 - intersection
+        return float(self.iou_matrix(np.asarray([box1]), np.asarray([box2]))[0, 0])
+
+    @staticmethod
+    def iou_matrix(boxes_a, boxes_b):
+        """IoU of every box in `boxes_a` (N x 4, x/y/w/h) against every box in `boxes_b` (M x 4)"""
+        a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)[:, None, :]
+        b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)[None, :, :]
+
+        xi1 = np.maximum(a[..., 0], b[..., 0])
+        yi1 = np.maximum(a[..., 1], b[..., 1])
+        xi2 = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2])
+        yi2 = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3])
+
+        intersection = np.clip(xi2 - xi1, 0, None) * np.clip(yi2 - yi1, 0, None)
+        union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - intersection
+        return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+    def _assign(self, iou):
+        """Match rows (detections) to columns (tracks); returns a track column per detection or -1"""
+        assignment = np.full(iou.shape[0], -1, dtype=np.int64)
+        if iou.size == 0:
+            return assignment
+
+        if linear_sum_assignment is not None:
+            # Gate first so a sub-threshold pair can't displace a valid match in the optimum
+            gated = np.where(iou > self.tracking_threshold, iou, 0.0)
+            rows, cols = linear_sum_assignment(gated, maximize=True)
+        else:
+            # Greedy: take pairs in descending IoU order while both sides are free
+            order = np.argsort(-iou, axis=None, kind="stable")
+            rows, cols = np.unravel_index(order, iou.shape)
+            row_used = np.zeros(iou.shape[0], dtype=bool)
+            col_used = np.zeros(iou.shape[1], dtype=bool)
+            keep = []
+            for k, (r, c) in enumerate(zip(rows, cols)):
+                if iou[r, c] <= self.tracking_threshold:
+                    break
+                if not row_used[r] and not col_used[c]:
+                    row_used[r] = col_used[c] = True
+                    keep.append(k)
+            rows, cols = rows[keep], cols[keep]
 
-        return intersection / union if union > 0 else 0.0
+        valid = iou[rows, cols] > self.tracking_threshold
+        assignment[rows[valid]] = cols[valid]
+        return assignment
 
     def update_tracks(self, detected_faces):
         """Update face tracks with new detections"""
         # Mark all existing tracks as not found
-        for track_id in self.tracked_faces:
-            self.tracked_faces[track_id]["found"] = False
-            self.tracked_faces[track_id]["missing_frames"] += 1
-
-        assigned_faces = []
-        updated_tracks = {}
+        self.missing += 1
 
-        # Try to match each detected face with existing tracks
-        for face in detected_faces:
-            best_match_id = None
-            best_iou = 0
+        # Only tracks that haven't been missing for too long can be matched
+        eligible = np.flatnonzero(self.missing <= self.max_missing_frames)
+        iou = self.iou_matrix(detected_faces, self.boxes[eligible])
+        assignment = self._assign(iou)
 
-            for track_id, track_data in self.tracked_faces.items():
-                if track_data["missing_frames"] > self.max_missing_frames:
-                    continue
-
-                iou = self.calculate_iou(face, track_data["bbox"])
-                if iou > best_iou and iou > self.tracking_threshold:
-                    best_iou = iou
-                    best_match_id = track_id
-
-            if best_match_id is not None:
-                # Update existing track
-                self.tracked_faces[best_match_id]["bbox"] = face
-                self.tracked_faces[best_match_id]["found"] = True
-                self.tracked_faces[best_match_id]["missing_frames"] = 0
-                updated_tracks[best_match_id] = face
-                assigned_faces.append(face)
+        updated_tracks = {}
+        new_boxes = []
+        for det_idx, face in enumerate(detected_faces):
+            if assignment[det_idx] >= 0:
+                # Update existing track; the box may have been propagated n frames since the
+                # last detection, so the observed velocity is (residual + n * v) / (n + 1)
+                track_idx = eligible[assignment[det_idx]]
+                n = self.propagated[track_idx]
+                residual = np.asarray(face[:2], dtype=np.float64) - self.boxes[track_idx, :2]
+                observed = (residual + n * self.velocities[track_idx]) / (n + 1)
+                self.velocities[track_idx] = 0.5 * self.velocities[track_idx] + 0.5 * observed
+                self.propagated[track_idx] = 0
+                self.boxes[track_idx] = face
+                self.missing[track_idx] = 0
+                updated_tracks[int(self.ids[track_idx])] = face
             else:
                 # Create new track
-                track_id = self.next_id
+                updated_tracks[self.next_id] = face
+                new_boxes.append(face)
                 self.next_id += 1
-                self.tracked_faces[track_id] = {
-                    "bbox": face,
-                    "found": True,
-                    "missing_frames": 0,
-                }
-                updated_tracks[track_id] = face
+
+        if new_boxes:
+            count = len(new_boxes)
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id - count, self.next_id)])
+            self.boxes = np.concatenate([self.boxes, np.asarray(new_boxes, dtype=np.float64)])
+            self.missing = np.concatenate([self.missing, np.zeros(count, dtype=np.int64)])
+            self.velocities = np.concatenate([self.velocities, np.zeros((count, 2))])
+            self.propagated = np.concatenate([self.propagated, np.zeros(count, dtype=np.int64)])
+
+        # Tracks that were not detected keep their last box but lose their velocity
+        self.velocities[self.missing > 0] = 0.0
+        self.propagated[self.missing > 0] = 0
 
         # Remove tracks that have been missing for too long
-        to_remove = [
-            track_id
-            for track_id, track_data in self.tracked_faces.items()
-            if track_data["missing_frames"] > self.max_missing_frames
-        ]
-        for track_id in to_remove:
-            del self.tracked_faces[track_id]
+        keep = self.missing <= self.max_missing_frames
+        if not keep.all():
+            self.ids = self.ids[keep]
+            self.boxes = self.boxes[keep]
+            self.missing = self.missing[keep]
+            self.velocities = self.velocities[keep]
+            self.propagated = self.propagated[keep]
 
         return updated_tracks
 
+    def propagate(self, frame_shape):
+        """Advance tracks seen at the last detection by their velocity, without detecting
+
+        Returns {track_id: (x, y, w, h)} like update_tracks, with boxes clipped to the frame.
+        """
+        visible = np.flatnonzero(self.missing == 0)
+        self.boxes[visible, :2] += self.velocities[visible]
+        self.propagated[visible] += 1
+
+        h, w = frame_shape[:2]
+        boxes = self.boxes[visible]
+        x = np.clip(boxes[:, 0], 0, w - 1)
+        y = np.clip(boxes[:, 1], 0, h - 1)
+        bw = np.clip(boxes[:, 2], 1, w - x)
+        bh = np.clip(boxes[:, 3], 1, h - y)
+        return {
+            int(self.ids[i]): (int(x[k]), int(y[k]), int(bw[k]), int(bh[k]))
+            for k, i in enumerate(visible)
+        }
+
 
 class EmotionSmoother:
     """Smooth emotion predictions over time"""
@@ -166,6 +292,46 @@ class EmotionSmoother:
             del self.emotion_history[track_id]
 
 
+class TrackResultCache:
+    """Reuse a track's last classification while its face crop stays visually stable"""
+
+    SIGNATURE_SIZE = (16, 16)
+
+    def __init__(self, threshold=4.0, max_rounds=10, decay=0.9):
+        self.threshold = threshold
+        self.max_rounds = max_rounds
+        self.decay = decay
+        # track_id -> [signature at last real classification, (label, score, predictions), rounds reused]
+        self.entries = {}
+        self.stats = {"reused": 0, "classified": 0}
+
+    @classmethod
+    def signature(cls, crop):
+        """Tiny grey thumbnail used to measure how much a face crop changed"""
+        tiny = cv2.resize(crop, cls.SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(tiny, cv2.COLOR_RGB2GRAY).astype(np.int16)
+
+    def lookup(self, track_id, signature):
+        """Cached (label, decayed score, predictions) if the track is stable and not too stale, else None"""
+        entry = self.entries.get(track_id)
+        if entry is None or self.threshold <= 0:
+            return None
+        reference, (label, score, predictions), rounds = entry
+        if rounds >= self.max_rounds or np.abs(signature - reference).mean() > self.threshold:
+            return None
+        entry[2] = rounds + 1
+        self.stats["reused"] += 1
+        return label, score * self.decay ** entry[2], predictions
+
+    def store(self, track_id, signature, result):
+        self.entries[track_id] = [signature, result, 0]
+        self.stats["classified"] += 1
+
+    def cleanup_old_tracks(self, active_track_ids):
+        for track_id in [t for t in self.entries if t not in active_track_ids]:
+            del self.entries[track_id]
+
+
 class PerformanceMonitor:
     """Monitor and adapt performance based on FPS"""
 
@@ -194,14 +360,430 @@ class PerformanceMonitor:
         avg_frame_time = sum(self.frame_times) / len(self.frame_times)
         return 1.0 / max(avg_frame_time, 0.001)
 
-    def get_recommended_skip_frames(self, base_skip, max_skip):
-        """Get recommended frame skip based on performance"""
+
+class AdaptiveQualityController(PerformanceMonitor):
+    """Per-stage timing plus several quality knobs, adjusted to hold target_fps
+
+    Stage costs (detect, preprocess, classify, draw) are averaged over the check window.
+    When FPS is low the knob that relieves the most expensive stage is turned down one
+    step: detection interval then detection resolution for detection, face budget
+    (faces classified per frame, round-robin across tracks) for classification, and
+    detection resolution for preprocessing. With headroom, knobs are restored one step at
+    a time, face budget first. The SigLIP batch size follows the face budget so a frame's
+    budget is one forward pass.
+    """
+
+    STAGES = ("detect", "preprocess", "classify", "draw")
+
+    def __init__(self, config):
+        super().__init__(config.target_fps, config.performance_check_interval)
+        self.config = config
+        self.stage_times = {stage: deque(maxlen=self.check_interval) for stage in self.STAGES}
+        self.detection_interval = config.base_detection_interval
+        # Width 0 means full resolution, so it is the top level when configured
+        max_width = config.detection_max_width
+        self.detection_widths = [max_width] + [
+            w for w in sorted(config.detection_widths, reverse=True) if not max_width or w < max_width
+        ]
+        self.width_level = 0
+        self.face_budget = config.max_faces_per_frame
+        self.face_counts = deque(maxlen=self.check_interval)
+        self.decisions = deque(maxlen=3)
+
+    @property
+    def detection_width(self):
+        return self.detection_widths[self.width_level]
+
+    @property
+    def batch_size(self):
+        return max(1, min(self.config.max_batch_size, self.face_budget))
+
+    def record(self, stage, seconds):
+        """Add one frame's time for a stage (0 is fine for stages skipped on a frame)"""
+        self.stage_times[stage].append(seconds)
+
+    def record_faces(self, count):
+        self.face_counts.append(count)
+
+    @property
+    def peak_faces(self):
+        return max(self.face_counts, default=0)
+
+    def stage_costs(self):
+        """Average seconds per frame for each stage over the window"""
+        return {
+            stage: sum(times) / len(times) if times else 0.0
+            for stage, times in self.stage_times.items()
+        }
+
+    def _degrade(self, stage):
+        if stage == "detect" and self.detection_interval < self.config.max_detection_interval:
+            self.detection_interval += 1
+            return f"detection interval -> {self.detection_interval}"
+        # A budget above the number of faces present is not limiting anything yet
+        effective_budget = min(self.face_budget, self.peak_faces)
+        if stage == "classify" and effective_budget > 1:
+            self.face_budget = effective_budget - 1
+            return f"face budget -> {self.face_budget}"
+        if stage in ("detect", "preprocess") and self.width_level < len(self.detection_widths) - 1:
+            self.width_level += 1
+            return f"detection width -> {self.detection_width}"
+        return None
+
+    def _restore(self):
+        if self.face_budget < min(self.peak_faces, self.config.max_faces_per_frame):
+            self.face_budget += 1
+            return f"face budget -> {self.face_budget}"
+        if self.width_level > 0:
+            self.width_level -= 1
+            return f"detection width -> {self.detection_width}"
+        if self.detection_interval > self.config.base_detection_interval:
+            self.detection_interval -= 1
+            return f"detection interval -> {self.detection_interval}"
+        if self.face_budget < self.config.max_faces_per_frame:
+            self.face_budget = self.config.max_faces_per_frame
+            return f"face budget -> {self.face_budget}"
+        return None
+
+    def adjust(self):
+        """Turn one knob if FPS is off target. Returns a description of the change, or None."""
         current_fps = self.get_current_fps()
-        if current_fps < self.target_fps * 0.8:  # If FPS is too low
-            return min(max_skip, base_skip + 2)
-        elif current_fps > self.target_fps * 1.2:  # If FPS is too high
-            return max(1, base_skip - 1)
-        return base_skip
+        costs = self.stage_costs()
+        if current_fps < self.target_fps * 0.8:
+            # Try the most expensive stage first, then the others in cost order
+            decision = None
+            for stage in sorted(costs, key=costs.get, reverse=True):
+                decision = self._degrade(stage)
+                if decision:
+                    decision = f"{stage}-bound ({costs[stage] * 1000:.0f} ms): {decision}"
+                    break
+        elif current_fps > self.target_fps * 1.2:
+            decision = self._restore()
+            if decision:
+                decision = f"headroom: {decision}"
+        else:
+            decision = None
+        if decision:
+            self.decisions.append(decision)
+        return decision
+
+    def summary(self):
+        costs = self.stage_costs()
+        stages = " ".join(f"{stage[:3]} {costs[stage] * 1000:.0f}ms" for stage in self.STAGES)
+        knobs = (
+            f"K={self.detection_interval} W={self.detection_width} "
+            f"budget={self.face_budget} batch={self.batch_size}"
+        )
+        return f"{stages} | {knobs}"
+
+
+class FrameBuffers:
+    """Per-frame conversion cache backed by preallocated arrays
+
+    Each frame is downscaled and converted to RGB once for detection, and converted to
+    full-resolution RGB at most once (only when faces are cropped). The arrays are reused
+    across frames and reallocated only when the frame size changes.
+    """
+
+    def __init__(self, max_width=640):
+        self.max_width = max_width
+        self.frame = None
+        self.scale = 1.0
+        self.reallocations = 0
+        self._shape = None
+        self._rgb = None
+        self._small_bgr = None
+        self._small_rgb = None
+        self._rgb_ready = False
+
+    def _allocate(self, shape):
+        h, w = shape[:2]
+        self.scale = min(1.0, self.max_width / w) if self.max_width else 1.0
+        self._rgb = np.empty((h, w, 3), dtype=np.uint8)
+        if self.scale < 1.0:
+            small = (int(round(h * self.scale)), int(round(w * self.scale)), 3)
+            self._small_bgr = np.empty(small, dtype=np.uint8)
+            self._small_rgb = np.empty(small, dtype=np.uint8)
+        self._shape = shape
+        self.reallocations += 1
+
+    def set_max_width(self, max_width):
+        """Change the detection width; buffers are reallocated on the next frame"""
+        if max_width != self.max_width:
+            self.max_width = max_width
+            self._shape = None
+
+    def load(self, frame):
+        """Take a new BGR frame and fill the detection buffer"""
+        if frame.shape != self._shape:
+            self._allocate(frame.shape)
+        self.frame = frame
+        self._rgb_ready = False
+        if self.scale < 1.0:
+            size = (self._small_bgr.shape[1], self._small_bgr.shape[0])
+            cv2.resize(frame, size, dst=self._small_bgr, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self._small_bgr, cv2.COLOR_BGR2RGB, dst=self._small_rgb)
+
+    @property
+    def detection_rgb(self):
+        """RGB copy for the face detector, downscaled to at most max_width"""
+        return self._small_rgb if self.scale < 1.0 else self.rgb
+
+    @property
+    def rgb(self):
+        """Full-resolution RGB copy of the current frame, converted on first use"""
+        if not self._rgb_ready:
+            cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+            self._rgb_ready = True
+        return self._rgb
+
+
+class MemoryMonitor:
+    """Peak RSS and (optionally, via tracemalloc) bytes allocated per frame
+
+    tracemalloc sees Python and NumPy allocations; torch and MediaPipe use their own
+    allocators, which only show up in the peak RSS figure.
+    """
+
+    def __init__(self, trace_allocations=False, window=30):
+        self.trace_allocations = trace_allocations
+        self.frame_allocations = deque(maxlen=window)
+        self._frame_start = 0
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start_frame(self):
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            self._frame_start = tracemalloc.get_traced_memory()[0]
+
+    def end_frame(self):
+        if self.trace_allocations:
+            # Peak rather than net: temporaries freed before the frame ends still count
+            self.frame_allocations.append(tracemalloc.get_traced_memory()[1] - self._frame_start)
+
+    @staticmethod
+    def peak_rss_mb():
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+    def summary(self):
+        parts = []
+        peak = self.peak_rss_mb()
+        if peak is not None:
+            parts.append(f"Peak mem: {peak:.0f} MB")
+        if self.frame_allocations:
+            avg = sum(self.frame_allocations) / len(self.frame_allocations)
+            parts.append(f"Alloc/frame: {avg / 1024:.0f} KB")
+        return " | ".join(parts)
+
+
+class LatestFrameCapture(threading.Thread):
+    """Capture thread feeding the pipelined detector
+
+    For a live camera only the newest frame is kept, so reads never lag behind the sensor.
+    For a video file frames are buffered in order (up to `buffer_size`) and the reader
+    waits for the consumer, so no frames are skipped.
+    """
+
+    def __init__(self, source, config, keep_latest=True, buffer_size=8):
+        super().__init__(name="siglip-capture", daemon=True)
+        self.cap = cv2.VideoCapture(source)
+        if isinstance(source, int):
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, config.webcam_width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config.webcam_height)
+            self.cap.set(cv2.CAP_PROP_FPS, config.webcam_fps)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0
+        self.keep_latest = keep_latest
+        self.buffer_size = 1 if keep_latest else buffer_size
+        self.buffer = deque()
+        self.latest = None
+        self.seq = 0
+        self.ended = False
+        self.stopped = False
+        self.cond = threading.Condition()
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def run(self):
+        try:
+            while not self.stopped:
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                with self.cond:
+                    if self.keep_latest:
+                        self.buffer.clear()
+                    else:
+                        while len(self.buffer) >= self.buffer_size and not self.stopped:
+                            self.cond.wait(0.1)
+                    self.seq += 1
+                    self.latest = (self.seq, frame)
+                    self.buffer.append(self.latest)
+                    self.cond.notify_all()
+        finally:
+            self.cap.release()
+            with self.cond:
+                self.ended = True
+                self.cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """Take the next frame as (seq, frame); None on timeout or once the source is exhausted"""
+        with self.cond:
+            if not self.buffer and not self.ended:
+                self.cond.wait(timeout)
+            if not self.buffer:
+                return None
+            item = self.buffer.popleft()
+            self.cond.notify_all()
+            return item
+
+    def peek_latest(self):
+        """Newest captured (seq, frame) without consuming it"""
+        with self.cond:
+            return self.latest
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+
+class TimelineWriter:
+    """Stream per-frame/per-track emotion rows to Parquet or compact CSV
+
+    Parquet needs pyarrow (optional); without it, or for any other extension, CSV is written.
+    Rows are written out every `flush_rows` rows (one Parquet row group or one CSV append),
+    so memory stays flat however long the input is. A per-track summary (frame span,
+    dominant smoothed emotion, mean probabilities) is accumulated as rows arrive and written
+    next to the timeline as `<name>_tracks.<ext>` on close().
+    """
+
+    def __init__(self, output_path, emotions, flush_rows=4096):
+        self.emotions = emotions
+        self.flush_rows = flush_rows
+        self.use_parquet = output_path.endswith(".parquet") and _has_pyarrow()
+        if output_path.endswith(".parquet") and not self.use_parquet:
+            print("pyarrow not installed, writing CSV instead of Parquet")
+            output_path = output_path[: -len(".parquet")] + ".csv"
+        self.output_path = output_path
+        stem, ext = os.path.splitext(output_path)
+        self.summary_path = f"{stem}_tracks{ext}"
+        # column -> type; Parquet gets an explicit schema so every row group matches
+        self.types = {
+            "source": "string", "frame": "int64", "timestamp_s": "float64", "track_id": "int64",
+            "x": "int64", "y": "int64", "w": "int64", "h": "int64",
+            "label": "string", "score": "float64", "smoothed_label": "string", "smoothed_confidence": "float64",
+        }
+        for emotion in emotions:
+            self.types[f"p_{emotion}"] = "float64"
+        self.columns = {name: [] for name in self.types}
+        self.rows_written = 0
+        self._out = None  # open ParquetWriter or CSV file
+        self._csv = None
+        # (source, track_id) -> first frame, last frame, smoothed label counts, summed probabilities
+        self.tracks = {}
+
+    def add(self, source, frame_idx, timestamp, track_id, box, label, score, emotion, confidence, predictions):
+        row = {
+            "source": source,
+            "frame": frame_idx,
+            "timestamp_s": round(timestamp, 3),
+            "track_id": track_id,
+            "x": box[0],
+            "y": box[1],
+            "w": box[2],
+            "h": box[3],
+            "label": label,
+            "score": score,
+            "smoothed_label": emotion,
+            "smoothed_confidence": round(confidence, 3),
+        }
+        probs = [predictions.get(emotion_name, 0.0) for emotion_name in self.emotions]
+        for emotion_name, p in zip(self.emotions, probs):
+            row[f"p_{emotion_name}"] = p
+        for name, value in row.items():
+            self.columns[name].append(value)
+
+        track = self.tracks.setdefault((source, track_id), {
+            "first": frame_idx, "counts": defaultdict(int), "probs": np.zeros(len(self.emotions)),
+        })
+        track["last"] = frame_idx
+        track["counts"][emotion] += 1
+        track["probs"] += probs
+
+        if len(self.columns["frame"]) >= self.flush_rows:
+            self.flush()
+
+    def _summary(self):
+        summary = {name: [] for name in ["source", "track_id", "first_frame", "last_frame", "frames", "dominant_emotion"]}
+        for emotion in self.emotions:
+            summary[f"mean_p_{emotion}"] = []
+        for (source, track_id), track in self.tracks.items():
+            frames = sum(track["counts"].values())
+            summary["source"].append(source)
+            summary["track_id"].append(track_id)
+            summary["first_frame"].append(track["first"])
+            summary["last_frame"].append(track["last"])
+            summary["frames"].append(frames)
+            summary["dominant_emotion"].append(max(track["counts"], key=track["counts"].get))
+            for emotion, total in zip(self.emotions, track["probs"]):
+                summary[f"mean_p_{emotion}"].append(round(float(total) / frames, 3))
+        return summary
+
+    def flush(self):
+        """Write the buffered rows; the first call creates the file"""
+        if self._out is None:
+            if self.use_parquet:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                self._schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in self.types.items()])
+                self._out = pq.ParquetWriter(self.output_path, self._schema)
+            else:
+                self._out = open(self.output_path, "w", newline="")
+                self._csv = csv.writer(self._out)
+                self._csv.writerow(self.columns.keys())
+        rows = len(self.columns["frame"])
+        if rows == 0:
+            return
+        if self.use_parquet:
+            import pyarrow as pa
+
+            self._out.write_table(pa.table(self.columns, schema=self._schema))
+        else:
+            self._csv.writerows(zip(*self.columns.values()))
+        self.rows_written += rows
+        self.columns = {name: [] for name in self.types}
+
+    def _write(self, path, columns):
+        if self.use_parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            pq.write_table(pa.table(columns), path)
+            return
+        with open(path, "w", newline="") as f:
+            out = csv.writer(f)
+            out.writerow(columns.keys())
+            out.writerows(zip(*columns.values()))
+
+    def close(self):
+        self.flush()
+        self._out.close()
+        self._write(self.summary_path, self._summary())
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
 
 
 class ImprovedEmotionDetector:
@@ -209,14 +791,21 @@ class ImprovedEmotionDetector:
 
     def __init__(self, config=None):
         self.config = config or EmotionDetectionConfig()
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        print(f"Using device: {self.device}")
+        self.device = select_device()
+        print(f"Using device: {self.device} ({configure_threads()} threads)")
 
         # Initialize components
         self.face_tracker = FaceTracker(self.config.face_tracking_threshold)
         self.emotion_smoother = EmotionSmoother(self.config.smoothing_window)
-        self.performance_monitor = PerformanceMonitor(
-            self.config.target_fps, self.config.performance_check_interval
+        self.result_cache = TrackResultCache(
+            self.config.stability_threshold,
+            self.config.max_cached_rounds,
+            self.config.cached_confidence_decay,
+        )
+        self.quality = AdaptiveQualityController(self.config)
+        self.frame_buffers = FrameBuffers(self.config.detection_max_width)
+        self.memory_monitor = MemoryMonitor(
+            self.config.trace_allocations, self.config.performance_check_interval
         )
 
         # Initialize MediaPipe
@@ -231,52 +820,60 @@ class ImprovedEmotionDetector:
 
         # Dynamic parameters
         self.current_skip_frames = self.config.base_skip_frames
+        self.current_detection_interval = self.quality.detection_interval
+        self.current_face_budget = self.quality.face_budget
+        self.current_batch_size = self.quality.batch_size
+        self.frames_since_detection = 0
+        self._last_classified = {}  # track_id -> frame_count of its last real classification
+        self._motion_reference = None
         self.frame_count = 0
 
     def _load_model(self):
         """Load the emotion classification model"""
         try:
-            self.model = SiglipForImageClassification.from_pretrained(
-                self.config.model_name
-            ).to(self.device)  # type: ignore
-            self.processor = AutoImageProcessor.from_pretrained(
-                self.config.model_name, use_fast=True
+            self.classifier = load_tier(
+                self.config.model_tier,
+                self.config.model_name,
+                device=self.device,
+                cache_dir=self.config.model_cache_dir,
+                local_files_only=self.config.local_files_only,
+                student_path=self.config.student_path,
+            )
+            # int8 always runs on CPU
+            self.device = self.classifier.device
+            self.engine = InferenceEngine(
+                self.classifier, self.config.max_batch_size, self.config.inference_cache_size
             )
-            self.model.eval()
-
-            # Define emotion labels (filtered)
-            all_labels = {
-                0: "Ahegao",
-                1: "Angry",
-                2: "Happy",
-                3: "Neutral",
-                4: "Sad",
-                5: "Surprise",
-            }
 
-            # Filter out inappropriate emotions
+            # Every tier is mapped onto the unified label space shared with the gRPC worker
             self.labels = {
                 k: v
-                for k, v in all_labels.items()
+                for k, v in enumerate(EMOTIONS)
                 if v not in self.config.emotion_filter
             }
 
-            print("Model loaded successfully")
+            print(f"Model loaded successfully ({self.config.model_tier} tier)")
             print(f"Available emotions: {list(self.labels.values())}")
         except Exception as e:
             print(f"Error loading model: {e}")
             exit()
 
-    def detect_faces_mediapipe(self, frame):
-        """Detect faces using MediaPipe and return bounding boxes"""
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_detection.process(rgb_frame)
+    def detect_faces_mediapipe(self, frame, detection_rgb=None):
+        """Detect faces using MediaPipe and return bounding boxes
+
+        `detection_rgb` is an optional (usually downscaled) RGB copy of the frame to run the
+        detector on. MediaPipe returns relative boxes, so they are always mapped back to
+        the full resolution of `frame`.
+        """
+        if detection_rgb is None:
+            detection_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = self.face_detection.process(detection_rgb)
 
         faces = []
         if results.detections:
+            h, w, _ = frame.shape
             for detection in results.detections:
                 bbox = detection.location_data.relative_bounding_box
-                h, w, _ = frame.shape
 
                 # Convert relative coordinates to absolute coordinates
                 x = int(bbox.xmin * w)
@@ -310,41 +907,253 @@ class ImprovedEmotionDetector:
         cropped_face = frame[y_start:y_end, x_start:x_end]
         return cropped_face
 
-    def emotion_classification(self, image: np.ndarray):
-        """Classify emotion from cropped face image"""
-        try:
-            if image.size == 0:
-                return "No Face", 0.0, {}
+    def _predictions_from_probs(self, probs):
+        """Turn one row of class probabilities into (label, score, predictions)"""
+        # Only include filtered emotions
+        predictions = {}
+        for i, prob in enumerate(probs):
+            if i in self.labels:
+                predictions[self.labels[i]] = round(float(prob), 3)
 
-            pil_img = Image.fromarray(image).convert("RGB")
-            inputs = self.processor(images=pil_img, return_tensors="pt").to(self.device)
+        if not predictions:
+            return "Unknown", 0.0, {}
 
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                logits = outputs.logits
-                probs = F.softmax(logits, dim=1).squeeze()
+        top_label = max(predictions, key=predictions.get)  # type: ignore
+        top_score = predictions[top_label]
+        return top_label, top_score, predictions
 
-                if probs.dim() == 0:
-                    probs = probs.unsqueeze(0)
+    def emotion_classification_batch(self, images):
+        """Classify a list of cropped face images with one forward pass per chunk
 
-                probs = probs.cpu().tolist()
+        Returns a list of (label, score, predictions) in input order.
+        """
+        results = [("No Face", 0.0, {})] * len(images)
+        valid = [i for i, image in enumerate(images) if image.size > 0]
+        batch_size = max(1, self.current_batch_size)
 
-            # Only include filtered emotions
-            predictions = {}
-            for i, prob in enumerate(probs):
-                if i in self.labels:
-                    predictions[self.labels[i]] = round(prob, 3)
+        for start in range(0, len(valid), batch_size):
+            chunk = valid[start : start + batch_size]
+            try:
+                probs = self.engine.predict_proba([images[i] for i in chunk])
 
-            if not predictions:
-                return "Unknown", 0.0, {}
+                for i, row in zip(chunk, probs):
+                    results[i] = self._predictions_from_probs(row)
 
-            top_label = max(predictions, key=predictions.get)  # type: ignore
-            top_score = predictions[top_label]
-            return top_label, top_score, predictions
+            except Exception as e:
+                print(f"Error in emotion classification: {e}")
+                for i in chunk:
+                    results[i] = ("Error", 0.0, {})
 
-        except Exception as e:
-            print(f"Error in emotion classification: {e}")
-            return "Error", 0.0, {}
+        return results
+
+    def emotion_classification(self, image: np.ndarray):
+        """Classify emotion from cropped face image"""
+        return self.emotion_classification_batch([image])[0]
+
+    def classify_tracked_faces(self, rgb_frame, tracked_faces):
+        """Crop every tracked face from an RGB frame and classify them in one batch
+
+        Returns {track_id: (label, score, predictions)}.
+        """
+        track_ids = list(tracked_faces.keys())
+        crops = [self.crop_face(rgb_frame, tracked_faces[track_id]) for track_id in track_ids]
+        return dict(zip(track_ids, self.emotion_classification_batch(crops)))
+
+    def _motion_thumbnail(self, rgb_frame):
+        """Tiny grey copy of the frame for the motion trigger"""
+        tiny = cv2.resize(rgb_frame, (64, 36), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(tiny, cv2.COLOR_RGB2GRAY).astype(np.int16)
+
+    def _should_detect(self, detection_rgb):
+        """Run full detection every K frames, or early if the scene changed since the last one"""
+        if self.current_detection_interval <= 1:
+            return True
+        thumbnail = self._motion_thumbnail(detection_rgb)
+        detect = (
+            self._motion_reference is None
+            or self.frames_since_detection + 1 >= self.current_detection_interval
+            or np.abs(thumbnail - self._motion_reference).mean() > self.config.motion_threshold
+        )
+        if detect:
+            self._motion_reference = thumbnail
+        return detect
+
+    def process_frame(self, frame):
+        """Detection, tracking and (every nth frame) classification for one BGR frame
+
+        Returns {track_id: ((x, y, w, h), emotion, confidence)} with smoothed emotions,
+        a snapshot that is safe to hand to another thread for drawing.
+        """
+        self.frame_count += 1
+        self.memory_monitor.start_frame()
+        stage_start = time.perf_counter()
+        buffers = self.frame_buffers
+        buffers.load(frame)
+        preprocess_time = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        if self._should_detect(buffers.detection_rgb):
+            # Detect faces on the downscaled copy; boxes come back in full-resolution coordinates
+            faces = self.detect_faces_mediapipe(frame, buffers.detection_rgb)
+
+            # Update face tracking
+            tracked_faces = self.face_tracker.update_tracks(faces)
+            self.frames_since_detection = 0
+        else:
+            # Cheap in-between frame: move the boxes along instead of re-detecting
+            tracked_faces = self.face_tracker.propagate(frame.shape)
+            self.frames_since_detection += 1
+        self.quality.record("detect", time.perf_counter() - stage_start)
+
+        classify_time = 0.0
+        # Process emotions every nth frame
+        if self.frame_count % self.current_skip_frames == 0 and tracked_faces:
+            # Crop all faces from the frame's cached RGB copy; stable faces reuse their last
+            # result and only the ones that changed are classified, in a single batch
+            stage_start = time.perf_counter()
+            results = {}
+            to_classify = {}
+            for track_id, face_coords in tracked_faces.items():
+                crop = self.crop_face(buffers.rgb, face_coords)
+                if crop.size == 0:
+                    continue
+                signature = self.result_cache.signature(crop)
+                cached = self.result_cache.lookup(track_id, signature)
+                if cached is not None:
+                    results[track_id] = cached
+                else:
+                    to_classify[track_id] = (crop, signature)
+
+            preprocess_time += time.perf_counter() - stage_start
+
+            if to_classify:
+                # Face budget: the least recently classified tracks go first, so with more
+                # faces than budget every track still gets its turn
+                track_ids = sorted(to_classify, key=lambda t: self._last_classified.get(t, -1))
+                track_ids = track_ids[: self.current_face_budget]
+                stage_start = time.perf_counter()
+                batch = self.emotion_classification_batch([to_classify[t][0] for t in track_ids])
+                classify_time = time.perf_counter() - stage_start
+                for track_id, result in zip(track_ids, batch):
+                    results[track_id] = result
+                    self._last_classified[track_id] = self.frame_count
+                    if result[0] not in ["No Face", "Error", "Unknown"]:
+                        self.result_cache.store(track_id, to_classify[track_id][1], result)
+
+            for track_id, (label, score, predictions) in results.items():
+                if label not in ["No Face", "Error", "Unknown"]:
+                    self.emotion_smoother.add_prediction(track_id, label, score)
+
+        # Clean up old emotion history
+        self.emotion_smoother.cleanup_old_tracks(set(tracked_faces.keys()))
+        self.result_cache.cleanup_old_tracks(set(tracked_faces.keys()))
+        for track_id in [t for t in self._last_classified if t not in tracked_faces]:
+            del self._last_classified[track_id]
+        self.quality.record("preprocess", preprocess_time)
+        self.quality.record_faces(len(tracked_faces))
+        self.quality.record("classify", classify_time)
+
+        annotations = {}
+        for track_id, face_coords in tracked_faces.items():
+            emotion, confidence = self.emotion_smoother.get_smoothed_emotion(track_id)
+            annotations[track_id] = (face_coords, emotion, confidence)
+        self.memory_monitor.end_frame()
+        return annotations
+
+    def draw_results(self, frame, annotations, info_text, show_detailed=False):
+        """Draw boxes, smoothed emotions and the info line onto a BGR frame in place"""
+        for track_id, ((x, y, w, h), emotion, confidence) in annotations.items():
+            # Choose color based on emotion
+            color_map = {
+                "Happy": (0, 255, 0),  # Green
+                "Sad": (255, 0, 0),  # Blue
+                "Angry": (0, 0, 255),  # Red
+                "Surprise": (0, 255, 255),  # Yellow
+                "Neutral": (128, 128, 128),  # Gray
+            }
+            color = color_map.get(emotion, (255, 255, 255))  # Default white
+
+            # Draw bounding box
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+
+            # Draw track ID
+            cv2.putText(
+                frame,
+                f"ID: {track_id}",
+                (x, y - 30),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                color,
+                2,
+                cv2.LINE_AA,
+            )
+
+            # Display emotion
+            display_text = f"{emotion}: {confidence:.2f}"
+            text_y = max(y - 10, 20)
+            cv2.putText(
+                frame,
+                display_text,
+                (x, text_y),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.6,
+                color,
+                2,
+                cv2.LINE_AA,
+            )
+
+        # Show frame info, one overlay line per text line
+        y_offset = 30
+        for line in info_text.split("\n"):
+            cv2.putText(
+                frame,
+                line,
+                (10, y_offset),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.6,
+                (255, 255, 255),
+                2,
+                cv2.LINE_AA,
+            )
+            y_offset += 25
+
+        if show_detailed and annotations:
+            y_offset += 5
+            for track_id, (_, emotion, confidence) in annotations.items():
+                detail_text = f"ID {track_id}: {emotion} ({confidence:.2f})"
+                cv2.putText(
+                    frame,
+                    detail_text,
+                    (10, y_offset),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5,
+                    (255, 255, 255),
+                    1,
+                    cv2.LINE_AA,
+                )
+                y_offset += 25
+
+    def _adjust_performance(self, frame_time):
+        """Performance monitoring and adjustment"""
+        self.quality.add_frame_time(frame_time)
+
+        if self.quality.should_adjust_performance():
+            decision = self.quality.adjust()
+            if decision:
+                print(f"Quality: {decision} [{self.quality.summary()}]")
+            self.current_detection_interval = self.quality.detection_interval
+            self.current_face_budget = self.quality.face_budget
+            self.current_batch_size = self.quality.batch_size
+            self.frame_buffers.set_max_width(self.quality.detection_width)
+
+    def _info_text(self, fps_text, face_count):
+        """Overlay text: FPS, stage costs and knobs, the last quality decision and memory"""
+        lines = [f"Faces: {face_count} | {fps_text}", self.quality.summary()]
+        if self.quality.decisions:
+            lines.append(f"Last change: {self.quality.decisions[-1]}")
+        memory_text = self.memory_monitor.summary()
+        lines.append(f"{memory_text} | {self.engine.summary()}" if memory_text else self.engine.summary())
+        return "\n".join(lines)
 
     def run_detection(self):
         """Main detection loop"""
@@ -370,110 +1179,14 @@ class ImprovedEmotionDetector:
                 if not ret:
                     break
 
-                self.frame_count += 1
-
-                # Detect faces
-                faces = self.detect_faces_mediapipe(frame)
-
-                # Update face tracking
-                tracked_faces = self.face_tracker.update_tracks(faces)
-
-                # Process emotions every nth frame
-                if self.frame_count % self.current_skip_frames == 0:
-                    for track_id, face_coords in tracked_faces.items():
-                        # Crop face from RGB frame
-                        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        cropped_face = self.crop_face(rgb_frame, face_coords)
-
-                        # Classify emotion
-                        label, score, predictions = self.emotion_classification(
-                            cropped_face
-                        )
-
-                        if label not in ["No Face", "Error", "Unknown"]:
-                            self.emotion_smoother.add_prediction(track_id, label, score)
-
-                # Clean up old emotion history
-                self.emotion_smoother.cleanup_old_tracks(set(tracked_faces.keys()))
+                annotations = self.process_frame(frame)
 
                 # Draw results
-                for track_id, (x, y, w, h) in tracked_faces.items():
-                    # Get smoothed emotion
-                    emotion, confidence = self.emotion_smoother.get_smoothed_emotion(
-                        track_id
-                    )
-
-                    # Choose color based on emotion
-                    color_map = {
-                        "Happy": (0, 255, 0),  # Green
-                        "Sad": (255, 0, 0),  # Blue
-                        "Angry": (0, 0, 255),  # Red
-                        "Surprise": (0, 255, 255),  # Yellow
-                        "Neutral": (128, 128, 128),  # Gray
-                    }
-                    color = color_map.get(emotion, (255, 255, 255))  # Default white
-
-                    # Draw bounding box
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-
-                    # Draw track ID
-                    cv2.putText(
-                        frame,
-                        f"ID: {track_id}",
-                        (x, y - 30),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.5,
-                        color,
-                        2,
-                        cv2.LINE_AA,
-                    )
-
-                    # Display emotion
-                    display_text = f"{emotion}: {confidence:.2f}"
-                    text_y = max(y - 10, 20)
-                    cv2.putText(
-                        frame,
-                        display_text,
-                        (x, text_y),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.6,
-                        color,
-                        2,
-                        cv2.LINE_AA,
-                    )
-
-                # Show frame info
-                current_fps = self.performance_monitor.get_current_fps()
-                info_text = f"Faces: {len(tracked_faces)} | FPS: {current_fps:.1f} | Skip: {self.current_skip_frames}"
-                cv2.putText(
-                    frame,
-                    info_text,
-                    (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.6,
-                    (255, 255, 255),
-                    2,
-                    cv2.LINE_AA,
-                )
-
-                if show_detailed and tracked_faces:
-                    y_offset = 60
-                    for track_id in tracked_faces.keys():
-                        emotion, confidence = (
-                            self.emotion_smoother.get_smoothed_emotion(track_id)
-                        )
-                        detail_text = f"ID {track_id}: {emotion} ({confidence:.2f})"
-                        cv2.putText(
-                            frame,
-                            detail_text,
-                            (10, y_offset),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5,
-                            (255, 255, 255),
-                            1,
-                            cv2.LINE_AA,
-                        )
-                        y_offset += 25
+                draw_start = time.perf_counter()
+                current_fps = self.quality.get_current_fps()
+                info_text = self._info_text(f"FPS: {current_fps:.1f}", len(annotations))
+                self.draw_results(frame, annotations, info_text, show_detailed)
+                self.quality.record("draw", time.perf_counter() - draw_start)
 
                 cv2.imshow("Improved Facial Emotion Detection", frame)
 
@@ -485,19 +1198,7 @@ class ImprovedEmotionDetector:
                     show_detailed = not show_detailed
                     print(f"Detailed view: {'ON' if show_detailed else 'OFF'}")
 
-                # Performance monitoring and adjustment
-                frame_time = time.time() - frame_start_time
-                self.performance_monitor.add_frame_time(frame_time)
-
-                if self.performance_monitor.should_adjust_performance():
-                    new_skip_frames = (
-                        self.performance_monitor.get_recommended_skip_frames(
-                            self.config.base_skip_frames, self.config.max_skip_frames
-                        )
-                    )
-                    if new_skip_frames != self.current_skip_frames:
-                        self.current_skip_frames = new_skip_frames
-                        print(f"Adjusted skip frames to: {self.current_skip_frames}")
+                self._adjust_performance(time.time() - frame_start_time)
 
         except KeyboardInterrupt:
             print("Interrupted by user")
@@ -508,13 +1209,333 @@ class ImprovedEmotionDetector:
                 torch.cuda.empty_cache()
             print("Cleanup completed")
 
+    def run_pipelined(self, source=0, headless=False, output_path=None, max_frames=None):
+        """Pipelined detection loop: capture, inference and render run on separate threads
+
+        Live sources keep only the newest frame, so the camera never stalls behind the model
+        and the display redraws the latest inference results on every new frame. File
+        sources are read in order through a bounded buffer so headless runs (e.g. CI with a
+        video file and no camera) are reproducible. `output_path` writes the annotated
+        frames to a video file; `max_frames` stops after that many inferred frames.
+        """
+        live = isinstance(source, int)
+        capture = LatestFrameCapture(source, self.config, keep_latest=live)
+        if not capture.is_opened():
+            print(f"Error: Could not open source {source}")
+            return
+
+        # Inference -> render. Live mode drops stale results; file mode blocks so none are lost.
+        results = queue.Queue(maxsize=self.config.pipeline_queue_size)
+        stop_event = threading.Event()
+        latest_lock = threading.Lock()
+        latest = {"seq": 0, "annotations": {}}
+        inference_fps = deque(maxlen=self.config.performance_check_interval)
+
+        def inference_stage():
+            processed = 0
+            while not stop_event.is_set():
+                item = capture.read(timeout=0.5)
+                if item is None:
+                    if capture.ended:
+                        break
+                    continue
+                seq, frame = item
+                start = time.time()
+                annotations = self.process_frame(frame)
+                elapsed = time.time() - start
+                self._adjust_performance(elapsed)
+                inference_fps.append(elapsed)
+                with latest_lock:
+                    latest["seq"] = seq
+                    latest["annotations"] = annotations
+                if live:
+                    _put_latest(results, (seq, None, annotations))
+                else:
+                    results.put((seq, frame, annotations))
+                processed += 1
+                if max_frames is not None and processed >= max_frames:
+                    break
+            results.put(None)
+
+        capture.start()
+        worker = threading.Thread(target=inference_stage, name="siglip-inference", daemon=True)
+        worker.start()
+
+        writer = None
+        show_detailed = False
+        display_times = deque(maxlen=self.config.performance_check_interval)
+        last_rendered = 0
+        print("Starting pipelined emotion detection." + ("" if headless else " Press 'q' to quit."))
+
+        try:
+            while True:
+                if live:
+                    # Render the newest camera frame with the newest results, at camera rate
+                    try:
+                        if results.get_nowait() is None:
+                            break
+                    except queue.Empty:
+                        pass
+                    frame_item = capture.peek_latest()
+                    if frame_item is None or frame_item[0] == last_rendered:
+                        if not worker.is_alive():
+                            break
+                        time.sleep(0.001)
+                        continue
+                    last_rendered, frame = frame_item
+                    frame = frame.copy()
+                    with latest_lock:
+                        annotations = latest["annotations"]
+                else:
+                    item = results.get()
+                    if item is None:
+                        break
+                    last_rendered, frame, annotations = item
+
+                display_times.append(time.time())
+                display_fps = (
+                    (len(display_times) - 1) / max(display_times[-1] - display_times[0], 1e-3)
+                    if len(display_times) > 1
+                    else 0.0
+                )
+                infer_fps = len(inference_fps) / max(sum(inference_fps), 1e-3) if inference_fps else 0.0
+                draw_start = time.perf_counter()
+                info_text = self._info_text(
+                    f"Display FPS: {display_fps:.1f} | Inference FPS: {infer_fps:.1f}", len(annotations)
+                )
+                self.draw_results(frame, annotations, info_text, show_detailed)
+                # Drawing runs on this thread, in parallel with inference
+                self.quality.record("draw", time.perf_counter() - draw_start)
+
+                if output_path:
+                    if writer is None:
+                        h, w = frame.shape[:2]
+                        fps = capture.fps or self.config.target_fps
+                        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+                    writer.write(frame)
+
+                if headless:
+                    if last_rendered % self.config.performance_check_interval == 0:
+                        print(info_text)
+                    continue
+
+                cv2.imshow("Improved Facial Emotion Detection", frame)
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord("q"):
+                    break
+                elif key == ord("s"):
+                    show_detailed = not show_detailed
+                    print(f"Detailed view: {'ON' if show_detailed else 'OFF'}")
+
+        except KeyboardInterrupt:
+            print("Interrupted by user")
+        finally:
+            stop_event.set()
+            capture.stop()
+            # Unblock the inference stage if it is waiting on a full results queue
+            while worker.is_alive():
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            capture.join(timeout=1.0)
+            if writer is not None:
+                writer.release()
+            if not headless:
+                cv2.destroyAllWindows()
+            if self.device.type == "cuda":
+                torch.cuda.empty_cache()
+            print(f"Cleanup completed ({self.frame_count} frames inferred)")
+
+    def _iter_offline_frames(self, source, pool, image_fps=None):
+        """Yield (frame_idx, timestamp_s, BGR frame) for a video file or an image directory
+
+        Image files are decoded ahead on the thread pool (at most `offline_decode_buffer` at a
+        time); videos are decoded on a background capture thread. Either way decoding overlaps with detection and classification.
+        Video timestamps come from the container's frame rate. Image files have none, so their
+        timestamp is frame_idx / `image_fps` if given, otherwise NaN.
+        """
+        if os.path.isdir(source):
+            paths = sorted(
+                os.path.join(source, name)
+                for name in os.listdir(source)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            # Sliding window: at most offline_decode_buffer images are decoding or decoded
+            # ahead of the consumer, so a long folder doesn't pile up frames in memory.
+            paths = iter(paths)
+            pending = deque(
+                pool.submit(cv2.imread, path) for path in itertools.islice(paths, self.config.offline_decode_buffer)
+            )
+            frame_idx = 0
+            try:
+                while pending:
+                    frame = pending.popleft().result()
+                    next_path = next(paths, None)
+                    if next_path is not None:
+                        pending.append(pool.submit(cv2.imread, next_path))
+                    if frame is not None:
+                        yield frame_idx, frame_idx / image_fps if image_fps else math.nan, frame
+                    frame_idx += 1
+            finally:
+                for future in pending:
+                    future.cancel()
+            return
+
+        capture = LatestFrameCapture(source, self.config, keep_latest=False,
+                                     buffer_size=self.config.offline_decode_buffer)
+        if not capture.is_opened():
+            print(f"Error: Could not open {source}")
+            return
+        fps = capture.fps or 1.0
+        capture.start()
+        try:
+            while True:
+                item = capture.read(timeout=1.0)
+                if item is None:
+                    if capture.ended:
+                        break
+                    continue
+                seq, frame = item
+                yield seq - 1, (seq - 1) / fps, frame
+        finally:
+            capture.stop()
+            capture.join(timeout=1.0)
+
+    def _classify_offline_batch(self, source_name, batch, writer):
+        """Classify every face of a batch of frames in one pass, then smooth and write in frame order"""
+        crops = []
+        owners = []  # (batch position, track_id) for each crop
+        for pos, (_, _, face_crops, _) in enumerate(batch):
+            for track_id, crop in face_crops.items():
+                crops.append(crop)
+                owners.append((pos, track_id))
+
+        per_frame = [dict() for _ in batch]
+        for (pos, track_id), result in zip(owners, self.emotion_classification_batch(crops)):
+            per_frame[pos][track_id] = result
+
+        for (frame_idx, timestamp, _, tracked_faces), results in zip(batch, per_frame):
+            for track_id, (label, score, predictions) in results.items():
+                if label not in ["No Face", "Error", "Unknown"]:
+                    self.emotion_smoother.add_prediction(track_id, label, score)
+            self.emotion_smoother.cleanup_old_tracks(set(tracked_faces.keys()))
+
+            for track_id, (x, y, w, h) in tracked_faces.items():
+                label, score, predictions = results[track_id]
+                emotion, confidence = self.emotion_smoother.get_smoothed_emotion(track_id)
+                writer.add(source_name, frame_idx, timestamp, track_id, (x, y, w, h),
+                           label, score, emotion, confidence, predictions)
+        return len(crops)
+
+    def run_offline(self, sources, output_path, batch_frames=None, decode_workers=None, image_fps=None):
+        """Process video files or image directories as fast as possible, without a display
+
+        Faces from up to `batch_frames` consecutive frames are classified in one batch. Every
+        frame is classified (no skipping) and FaceTracker / EmotionSmoother state is reset per
+        source, so results are reproducible. As in live mode, faces are detected on a copy
+        downscaled to `detection_max_width` and cropped from one RGB conversion per frame
+        (FrameBuffers). Writes a per-frame/per-track timeline to `output_path` (.parquet if
+        pyarrow is installed, otherwise CSV) and a per-track summary next to it. Image folders
+        get timestamp_s = frame / `image_fps`, or NaN without it.
+        """
+        batch_frames = batch_frames or self.config.offline_batch_frames
+        decode_workers = decode_workers or self.config.offline_decode_workers
+        image_fps = image_fps or self.config.offline_image_fps
+        writer = TimelineWriter(output_path, list(self.labels.values()))
+        # Own buffers at the configured width, untouched by the live quality controller
+        buffers = FrameBuffers(self.config.detection_max_width)
+
+        total_frames = 0
+        total_faces = 0
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=decode_workers) as pool:
+            for source in sources:
+                source_name = os.path.basename(os.path.normpath(source))
+                self.face_tracker = FaceTracker(self.config.face_tracking_threshold)
+                self.emotion_smoother = EmotionSmoother(self.config.smoothing_window)
+                source_start = time.time()
+                source_frames = 0
+
+                batch = []
+                for frame_idx, timestamp, frame in self._iter_offline_frames(source, pool, image_fps):
+                    buffers.load(frame)
+                    faces = self.detect_faces_mediapipe(frame, buffers.detection_rgb)
+                    tracked_faces = self.face_tracker.update_tracks(faces)
+                    # The buffers are reused by the next frame, so keep copies of the crops only
+                    face_crops = {
+                        track_id: self.crop_face(buffers.rgb, face_coords).copy()
+                        for track_id, face_coords in tracked_faces.items()
+                    }
+                    batch.append((frame_idx, timestamp, face_crops, tracked_faces))
+                    source_frames += 1
+                    if len(batch) >= batch_frames:
+                        total_faces += self._classify_offline_batch(source_name, batch, writer)
+                        batch = []
+                if batch:
+                    total_faces += self._classify_offline_batch(source_name, batch, writer)
+
+                elapsed = time.time() - source_start
+                total_frames += source_frames
+                print(f"{source}: {source_frames} frames in {elapsed:.2f}s "
+                      f"({source_frames / max(elapsed, 1e-6):.1f} frames/s)")
+
+        writer.close()
+        elapsed = time.time() - start
+        print(f"Processed {total_frames} frames / {total_faces} faces in {elapsed:.2f}s "
+              f"({total_frames / max(elapsed, 1e-6):.1f} frames/s, {total_faces / max(elapsed, 1e-6):.1f} faces/s)")
+        print(f"Timeline written to {writer.output_path}, track summary to {writer.summary_path}")
+
+
+def _put_latest(q, item):
+    """Put into a bounded queue, discarding the oldest entry instead of blocking"""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
 
 # Usage
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SigLIP facial emotion detection")
+    parser.add_argument("--source", default="0", help="camera index or video file path")
+    parser.add_argument("--pipelined", action="store_true", help="run capture/inference/render on separate threads")
+    parser.add_argument("--headless", action="store_true", help="no display window (implies --pipelined)")
+    parser.add_argument("--output", help="write annotated frames to this video file (pipelined mode)")
+    parser.add_argument("--max-frames", type=int, help="stop after this many inferred frames (pipelined mode)")
+    parser.add_argument("--offline", nargs="+", metavar="INPUT", help="process video files / image directories offline")
+    parser.add_argument("--timeline", default="emotion_timeline.csv", help="offline output (.csv or .parquet)")
+    parser.add_argument("--batch-frames", type=int, help="frames per classification batch (offline mode)")
+    parser.add_argument("--decode-workers", type=int, help="decoder threads (offline mode)")
+    parser.add_argument("--fps", type=float,
+                        help="frame rate of image-folder input, for timestamp_s (offline mode; default NaN)")
+    parser.add_argument("--model-tier", choices=TIERS, help="full, int8 or distilled student model")
+    parser.add_argument("--cache-dir", help="local model cache directory")
+    parser.add_argument("--local-files-only", action="store_true", help="load models without network access")
+    parser.add_argument("--trace-memory", action="store_true", help="report per-frame allocations in the overlay")
+    args = parser.parse_args()
+
     config = EmotionDetectionConfig()
+    config.trace_allocations = args.trace_memory
+    if args.model_tier:
+        config.model_tier = args.model_tier
+    if args.cache_dir:
+        config.model_cache_dir = args.cache_dir
+    config.local_files_only = config.local_files_only or args.local_files_only
     # config.min_face_size = 60  
     # config.smoothing_window = 7 
 
     # Create and run detector
     detector = ImprovedEmotionDetector(config)
-    detector.run_detection()
+    source = int(args.source) if args.source.isdigit() else args.source
+    if args.offline:
+        detector.run_offline(args.offline, args.timeline, args.batch_frames, args.decode_workers, args.fps)
+    elif args.pipelined or args.headless or args.output or not isinstance(source, int):
+        detector.run_pipelined(source, headless=args.headless, output_path=args.output, max_frames=args.max_frames)
+    else:
+        detector.run_detection()
@@ -0,0 +1,228 @@
+"""
+Model tiers for the SigLIP emotion detector.
+
+- full:    the SigLIP2 classifier in fp32
+- int8:    the same model with its Linear layers dynamically quantized to int8 (CPU only)
+- student: a small CNN distilled from the full model's soft labels (see `distill`)
+
+Every tier is an inference_core backend over the SigLIP label space (SIGLIP_LABELS), so
+the detector's label mapping and emotion filter apply unchanged whichever tier is loaded. Pass a `cache_dir` and
+`local_files_only=True` to load without network access.
+
+Usage:
+    python model_tiers.py distill --images faces/ --student siglip_student.pt
+    python model_tiers.py benchmark --images labeled_faces/ --tiers full int8 student
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# The shared inference core lives next to this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from inference_core import SIGLIP_LABELS, create_backend, select_device
+from inference_core.siglip import (
+    DEFAULT_MODEL_NAME,
+    StudentBackend,
+    StudentNet,
+    student_checkpoint_path,
+    student_inputs,
+)
+
+TIERS = ("full", "int8", "student")
+# Tier -> inference_core backend
+TIER_BACKENDS = {"full": "siglip", "int8": "siglip-int8", "student": "siglip-student"}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_tier(tier, model_name=DEFAULT_MODEL_NAME, device=None, cache_dir=None,
+              local_files_only=False, student_path="siglip_student.pt"):
+    """Load one model tier as an inference_core Backend. int8 always runs on CPU."""
+    if tier not in TIERS:
+        raise ValueError(f"Unknown model tier {tier!r}; expected one of {TIERS}")
+    return create_backend(
+        TIER_BACKENDS[tier],
+        model_name=model_name,
+        device=device,
+        cache_dir=cache_dir,
+        local_files_only=local_files_only,
+        student_path=student_path,
+    )
+
+
+def load_images(paths):
+    """(RGB image, label or None) for every image under the given files/directories
+
+    The label is the name of the image's parent directory if it is a known emotion,
+    so an ImageFolder-style tree (Happy/001.png, Sad/002.png, ...) doubles as a test set.
+    """
+    known = set(SIGLIP_LABELS.values())
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, n) for n in sorted(names) if n.lower().endswith(IMAGE_EXTENSIONS)]
+        else:
+            files.append(path)
+    samples = []
+    for file in files:
+        image = cv2.imread(file)
+        if image is None:
+            continue
+        label = os.path.basename(os.path.dirname(file))
+        samples.append((cv2.cvtColor(image, cv2.COLOR_BGR2RGB), label if label in known else None))
+    return samples
+
+
+def _batched(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def distill(teacher, images, out_path, epochs=10, batch_size=32, input_size=64,
+            temperature=2.0, lr=1e-3, width=32):
+    """Train a StudentNet on the teacher's soft labels for `images` (RGB face crops) and save it"""
+    device = select_device()
+
+    # Teacher probabilities are computed once; log-probs let us re-temper them cheaply
+    soft = np.concatenate([teacher.predict_proba(chunk) for chunk in _batched(images, batch_size)])
+    teacher_logp = torch.from_numpy(np.log(np.clip(soft, 1e-8, 1.0)))
+    inputs = student_inputs(images, input_size)
+
+    model = StudentNet(soft.shape[1], width).to(device)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr)
+    for epoch in range(epochs):
+        model.train()
+        order = torch.randperm(len(images))
+        total = 0.0
+        for idx in _batched(order, batch_size):
+            x = inputs[idx].to(device)
+            if torch.rand(1).item() < 0.5:
+                x = x.flip(3)  # horizontal flip; emotions are mirror-invariant
+            target = F.softmax(teacher_logp[idx].to(device) / temperature, dim=1)
+            log_student = F.log_softmax(model(x) / temperature, dim=1)
+            loss = F.kl_div(log_student, target, reduction="batchmean") * temperature ** 2
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(idx)
+        print(f"Epoch {epoch + 1}/{epochs}: distillation loss {total / len(images):.4f}")
+
+    model.cpu().eval()
+    torch.save({
+        "state_dict": model.state_dict(),
+        "num_labels": soft.shape[1],
+        "input_size": input_size,
+        "width": width,
+    }, out_path)
+    print(f"Saved student to {out_path}")
+    return StudentBackend(model=model, input_size=input_size, device=torch.device("cpu"))
+
+
+def _top_label(probs, emotion_filter):
+    """Index of the best label, ignoring filtered emotions (same rule as the detector)"""
+    allowed = [i for i, name in SIGLIP_LABELS.items() if name not in emotion_filter and i < len(probs)]
+    return max(allowed, key=lambda i: probs[i])
+
+
+def benchmark(tiers, samples, batch_size=8, runs=20, emotion_filter=("Ahegao",)):
+    """Measure each tier on the same samples
+
+    Returns one row per tier: single-image latency (mean / p95 ms), batched throughput,
+    serialized weight size, accuracy against folder labels (if any) and top-1 agreement with the
+    full tier (if it is included).
+    """
+    images = [image for image, _ in samples]
+    labels = [label for _, label in samples]
+    label_ids = {name: i for i, name in SIGLIP_LABELS.items()}
+    predictions = {}
+    rows = []
+    for name, tier in tiers.items():
+        tier.predict_proba(images[:1])  # warm-up
+        single = []
+        for i in range(runs):
+            start = time.perf_counter()
+            tier.predict_proba([images[i % len(images)]])
+            single.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        probs = np.concatenate([tier.predict_proba(chunk) for chunk in _batched(images, batch_size)])
+        elapsed = time.perf_counter() - start
+        predictions[name] = [_top_label(p, emotion_filter) for p in probs]
+
+        # Serialized size counts packed int8 weights, which parameters() does not report
+        buffer = io.BytesIO()
+        torch.save(tier.model.state_dict(), buffer)
+        labeled = [(p, label_ids[l]) for p, l in zip(predictions[name], labels) if l is not None]
+        rows.append({
+            "tier": name,
+            "latency_ms": float(np.mean(single)),
+            "p95_ms": float(np.percentile(single, 95)),
+            "images_per_s": len(images) / elapsed,
+            "size_mb": buffer.tell() / 1e6,
+            "accuracy": sum(p == l for p, l in labeled) / len(labeled) if labeled else None,
+        })
+
+    for row in rows:
+        if "full" in predictions:
+            reference = predictions["full"]
+            row["agreement"] = float(np.mean([a == b for a, b in zip(predictions[row["tier"]], reference)]))
+        else:
+            row["agreement"] = None
+    return rows
+
+
+def format_table(rows):
+    def fmt(value, pattern):
+        return "n/a" if value is None else pattern.format(value)
+
+    lines = [
+        "| tier | latency ms (1 img) | p95 ms | images/s (batched) | weights MB | accuracy | agreement w/ full |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['tier']} | {row['latency_ms']:.1f} | {row['p95_ms']:.1f} | {row['images_per_s']:.1f} | "
+            f"{row['size_mb']:.1f} | {fmt(row['accuracy'], '{:.3f}')} | {fmt(row['agreement'], '{:.3f}')} |"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill and benchmark SigLIP model tiers")
+    parser.add_argument("command", choices=("distill", "benchmark"))
+    parser.add_argument("--images", nargs="+", required=True, help="face crop images or directories")
+    parser.add_argument("--model-name", default=DEFAULT_MODEL_NAME)
+    parser.add_argument("--cache-dir", help="local Hugging Face cache directory")
+    parser.add_argument("--local-files-only", action="store_true", help="never touch the network")
+    parser.add_argument("--student", default="siglip_student.pt", help="student checkpoint path")
+    parser.add_argument("--tiers", nargs="+", default=list(TIERS), choices=TIERS)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=20, help="single-image latency samples per tier")
+    args = parser.parse_args()
+
+    samples = load_images(args.images)
+    if not samples:
+        parser.error("no images found")
+    print(f"Loaded {len(samples)} images")
+
+    def _load(tier):
+        return load_tier(tier, args.model_name, cache_dir=args.cache_dir,
+                         local_files_only=args.local_files_only, student_path=args.student)
+
+    if args.command == "distill":
+        teacher = _load("full")
+        distill(teacher, [image for image, _ in samples], student_checkpoint_path(args.student, args.cache_dir),
+                epochs=args.epochs)
+    else:
+        tiers = {tier: _load(tier) for tier in args.tiers}
+        print(format_table(benchmark(tiers, samples, args.batch_size, args.runs)))
@@ -24,23 +24,35 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0finterface.proto\x12\x07\x65motion\"&\n\nKeyRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x0b\n\x03key\x18\x02 \x01(\t\"4\n\x0cImageRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x17\n\x0f\x65ncrypted_image\x18\x02 \x01(\x0c\"2\n\x0eStatusResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\",\n\x0e\x45motionRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\r\n\x05image\x18\x02 \x01(\x0c\"2\n\x0f\x45motionResponse\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x12\n\nclass_name\x18\x02 \x01(\t2\xd7\x01\n\x0e\x45motionService\x12\x41\n\x11SendDecryptionKey\x12\x13.emotion.KeyRequest\x1a\x17.emotion.StatusResponse\x12\x44\n\x12SendEncryptedImage\x12\x15.emotion.ImageRequest\x1a\x17.emotion.StatusResponse\x12<\n\x07Predict\x12\x17.emotion.EmotionRequest\x1a\x18.emotion.EmotionResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0finterface.proto\x12\x07\x65motion\"&\n\nKeyRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x0b\n\x03key\x18\x02 \x01(\t\"\x83\x01\n\x0cImageRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x17\n\x0f\x65ncrypted_image\x18\x02 \x01(\x0c\x12#\n\x08priority\x18\x03 \x01(\x0e\x32\x11.emotion.Priority\x12\x0e\n\x06source\x18\x04 \x01(\t\x12\x18\n\x10\x65nvelope_version\x18\x05 \x01(\r\"2\n\x0eStatusResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\",\n\x0e\x45motionRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\r\n\x05image\x18\x02 \x01(\x0c\"2\n\x0f\x45motionResponse\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x12\n\nclass_name\x18\x02 \x01(\t\"(\n\x0c\x44rainRequest\x12\x18\n\x10\x64\x65\x61\x64line_seconds\x18\x01 \x01(\x02\"\"\n\x13\x45motionSubscription\x12\x0b\n\x03uid\x18\x01 \x01(\t\"\xc9\x01\n\rEmotionUpdate\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x0f\n\x07\x65motion\x18\x02 \x01(\t\x12\x12\n\nconfidence\x18\x03 \x01(\x02\x12>\n\x0c\x64istribution\x18\x04 \x03(\x0b\x32(.emotion.EmotionUpdate.DistributionEntry\x12\x11\n\ttimestamp\x18\x05 \x01(\x01\x1a\x33\n\x11\x44istributionEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x02:\x02\x38\x01*f\n\x08Priority\x12\x18\n\x14PRIORITY_UNSPECIFIED\x10\x00\x12\x18\n\x14PRIORITY_INTERACTIVE\x10\x01\x12\x13\n\x0fPRIORITY_NORMAL\x10\x02\x12\x11\n\rPRIORITY_BULK\x10\x03\x32\xdd\x02\n\x0e\x45motionService\x12\x41\n\x11SendDecryptionKey\x12\x13.emotion.KeyRequest\x1a\x17.emotion.StatusResponse\x12\x44\n\x12SendEncryptedImage\x12\x15.emotion.ImageRequest\x1a\x17.emotion.StatusResponse\x12<\n\x07Predict\x12\x17.emotion.EmotionRequest\x1a\x18.emotion.EmotionResponse\x12\x37\n\x05\x44rain\x12\x15.emotion.DrainRequest\x1a\x17.emotion.StatusResponse\x12K\n\x11SubscribeEmotions\x12\x1c.emotion.EmotionSubscription\x1a\x16.emotion.EmotionUpdate0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'interface_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
+  _globals['_EMOTIONUPDATE_DISTRIBUTIONENTRY']._loaded_options = None
+  _globals['_EMOTIONUPDATE_DISTRIBUTIONENTRY']._serialized_options = b'8\001'
+  _globals['_PRIORITY']._serialized_start=634
+  _globals['_PRIORITY']._serialized_end=736
   _globals['_KEYREQUEST']._serialized_start=28
   _globals['_KEYREQUEST']._serialized_end=66
-  _globals['_IMAGEREQUEST']._serialized_start=68
-  _globals['_IMAGEREQUEST']._serialized_end=120
-  _globals['_STATUSRESPONSE']._serialized_start=122
-  _globals['_STATUSRESPONSE']._serialized_end=172
-  _globals['_EMOTIONREQUEST']._serialized_start=174
-  _globals['_EMOTIONREQUEST']._serialized_end=218
-  _globals['_EMOTIONRESPONSE']._serialized_start=220
-  _globals['_EMOTIONRESPONSE']._serialized_end=270
-  _globals['_EMOTIONSERVICE']._serialized_start=273
-  _globals['_EMOTIONSERVICE']._serialized_end=488
+  _globals['_IMAGEREQUEST']._serialized_start=69
+  _globals['_IMAGEREQUEST']._serialized_end=200
+  _globals['_STATUSRESPONSE']._serialized_start=202
+  _globals['_STATUSRESPONSE']._serialized_end=252
+  _globals['_EMOTIONREQUEST']._serialized_start=254
+  _globals['_EMOTIONREQUEST']._serialized_end=298
+  _globals['_EMOTIONRESPONSE']._serialized_start=300
+  _globals['_EMOTIONRESPONSE']._serialized_end=350
+  _globals['_DRAINREQUEST']._serialized_start=352
+  _globals['_DRAINREQUEST']._serialized_end=392
+  _globals['_EMOTIONSUBSCRIPTION']._serialized_start=394
+  _globals['_EMOTIONSUBSCRIPTION']._serialized_end=428
+  _globals['_EMOTIONUPDATE']._serialized_start=431
+  _globals['_EMOTIONUPDATE']._serialized_end=632
+  _globals['_EMOTIONUPDATE_DISTRIBUTIONENTRY']._serialized_start=581
+  _globals['_EMOTIONUPDATE_DISTRIBUTIONENTRY']._serialized_end=632
+  _globals['_EMOTIONSERVICE']._serialized_start=739
+  _globals['_EMOTIONSERVICE']._serialized_end=1088
 # @@protoc_insertion_point(module_scope)
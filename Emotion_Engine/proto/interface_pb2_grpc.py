@@ -49,6 +49,16 @@ class EmotionServiceStub(object):
                 request_serializer=interface__pb2.EmotionRequest.SerializeToString,
                 response_deserializer=interface__pb2.EmotionResponse.FromString,
                 _registered_method=True)
+        self.Drain = channel.unary_unary(
+                '/emotion.EmotionService/Drain',
+                request_serializer=interface__pb2.DrainRequest.SerializeToString,
+                response_deserializer=interface__pb2.StatusResponse.FromString,
+                _registered_method=True)
+        self.SubscribeEmotions = channel.unary_stream(
+                '/emotion.EmotionService/SubscribeEmotions',
+                request_serializer=interface__pb2.EmotionSubscription.SerializeToString,
+                response_deserializer=interface__pb2.EmotionUpdate.FromString,
+                _registered_method=True)
 
 
 class EmotionServiceServicer(object):
@@ -76,6 +86,22 @@ class EmotionServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def Drain(self, request, context):
+        """Stops intake and waits (up to deadline_seconds) for queued frames to finish;
+        anything left is spooled to disk and replayed on the next start.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SubscribeEmotions(self, request, context):
+        """Smoothed emotion of one uid, pushed as the worker produces results; for consumers in
+        another process, e.g. a live agent session. Ends if a newer subscriber displaces it.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_EmotionServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -94,6 +120,16 @@ def add_EmotionServiceServicer_to_server(servicer, server):
                     request_deserializer=interface__pb2.EmotionRequest.FromString,
                     response_serializer=interface__pb2.EmotionResponse.SerializeToString,
             ),
+            'Drain': grpc.unary_unary_rpc_method_handler(
+                    servicer.Drain,
+                    request_deserializer=interface__pb2.DrainRequest.FromString,
+                    response_serializer=interface__pb2.StatusResponse.SerializeToString,
+            ),
+            'SubscribeEmotions': grpc.unary_stream_rpc_method_handler(
+                    servicer.SubscribeEmotions,
+                    request_deserializer=interface__pb2.EmotionSubscription.FromString,
+                    response_serializer=interface__pb2.EmotionUpdate.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'emotion.EmotionService', rpc_method_handlers)
@@ -185,3 +221,57 @@ class EmotionService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def Drain(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/emotion.EmotionService/Drain',
+            interface__pb2.DrainRequest.SerializeToString,
+            interface__pb2.StatusResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SubscribeEmotions(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/emotion.EmotionService/SubscribeEmotions',
+            interface__pb2.EmotionSubscription.SerializeToString,
+            interface__pb2.EmotionUpdate.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,85 @@
+import time
+
+import grpc
+
+AES_BLOCK = 16
+IV_BYTES = 16
+# ImageRequest.envelope_version values this worker can decrypt; 0 is an older client (= 1)
+SUPPORTED_ENVELOPES = {0, 1}
+
+
+class Admission:
+    """
+    Cheap checks on an ImageRequest before it is queued.
+
+    Everything here is O(1) and runs in the RPC handler, so payloads that could never be
+    decrypted are refused synchronously with a precise status instead of costing a queue
+    slot plus AES, base64 and PIL work in the worker:
+
+    - INVALID_ARGUMENT: no uid, or ciphertext that is not IV + whole AES blocks
+    - RESOURCE_EXHAUSTED: payload larger than `max_bytes`
+    - FAILED_PRECONDITION: no decryption key stored for the uid yet
+    - UNIMPLEMENTED: an envelope_version this worker doesn't know
+
+    `stats` counts rejections per reason; saved_seconds() estimates the worker time they
+    would have cost from the measured per-frame decryption cost.
+    """
+
+    def __init__(self, storage, max_bytes: int = 4 * 1024 * 1024, min_bytes: int = IV_BYTES + AES_BLOCK):
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.min_bytes = min_bytes
+        self.stats = {"admitted": 0, "rejected": {}, "seconds": 0.0}
+
+    def _has_key(self, uid: str) -> bool:
+        has_key = getattr(self.storage, "has_key", None)
+        if has_key is not None:
+            return has_key(uid)
+        return self.storage.get_key(uid) is not None
+
+    def _verdict(self, request):
+        size = len(request.encrypted_image)
+        if not request.uid:
+            return "missing_uid", grpc.StatusCode.INVALID_ARGUMENT, "uid is required"
+        if request.envelope_version not in SUPPORTED_ENVELOPES:
+            return ("unsupported_envelope", grpc.StatusCode.UNIMPLEMENTED,
+                    f"envelope_version {request.envelope_version} is not supported "
+                    f"(supported: {sorted(SUPPORTED_ENVELOPES - {0})})")
+        if size > self.max_bytes:
+            return ("too_large", grpc.StatusCode.RESOURCE_EXHAUSTED,
+                    f"encrypted_image is {size} bytes; the limit is {self.max_bytes}")
+        if size < self.min_bytes:
+            return ("too_small", grpc.StatusCode.INVALID_ARGUMENT,
+                    f"encrypted_image is {size} bytes; expected a {IV_BYTES}-byte IV and at least one AES block")
+        if (size - IV_BYTES) % AES_BLOCK:
+            return ("misaligned", grpc.StatusCode.INVALID_ARGUMENT,
+                    f"ciphertext length {size - IV_BYTES} is not a multiple of the {AES_BLOCK}-byte AES block")
+        if not self._has_key(request.uid):
+            return ("missing_key", grpc.StatusCode.FAILED_PRECONDITION,
+                    f"no decryption key for {request.uid}; call SendDecryptionKey first")
+        return None
+
+    def check(self, request):
+        """None if the request may be queued, else (StatusCode, message)"""
+        start = time.perf_counter()
+        verdict = self._verdict(request)
+        self.stats["seconds"] += time.perf_counter() - start
+        if verdict is None:
+            self.stats["admitted"] += 1
+            return None
+        reason, code, message = verdict
+        self.stats["rejected"][reason] = self.stats["rejected"].get(reason, 0) + 1
+        return code, message
+
+    def saved_seconds(self, seconds_per_frame: float) -> float:
+        """Worker time the rejected requests would have cost at `seconds_per_frame` each"""
+        return sum(self.stats["rejected"].values()) * seconds_per_frame
+
+    def summary(self, seconds_per_frame: float) -> str:
+        checked = self.stats["admitted"] + sum(self.stats["rejected"].values())
+        per_check_us = self.stats["seconds"] / checked * 1e6 if checked else 0.0
+        return (
+            f"admitted {self.stats['admitted']}, rejected {self.stats['rejected']}, "
+            f"{per_check_us:.1f} us/check, ~{self.saved_seconds(seconds_per_frame):.2f}s of worker time saved "
+            f"at {seconds_per_frame * 1000:.1f} ms/frame"
+        )
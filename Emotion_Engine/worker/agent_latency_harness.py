@@ -0,0 +1,103 @@
+"""
+Local session-setup latency harness for the LiveKit wellness agent.
+
+Runs the agent's real setup path (prewarm, get_vad, start_wellness_session, SessionLatency)
+against a fake room and a fake session whose LLM stand-in "speaks" after a fixed delay,
+so no LiveKit server or Gemini key is needed. Compares jobs that start in a prewarmed
+process with cold ones that load the VAD inside the session.
+
+Usage:
+    python agent_latency_harness.py --jobs 10 --llm-delay 0.3
+"""
+
+import argparse
+import asyncio
+import types
+
+import numpy as np
+
+from livekit_agent_config import SessionLatency, prewarm, start_wellness_session
+
+
+class FakeRoom:
+    def __init__(self, name: str, connect_delay: float):
+        self.name = name
+        self.connect_delay = connect_delay
+
+
+class FakeRealtimeLLM:
+    """Stands in for the Realtime model: the first audio arrives `delay` seconds after a reply is requested"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+
+class FakeSession:
+    """Just enough of AgentSession for the setup path: start, generate_reply and state events"""
+
+    def __init__(self, vad, llm: FakeRealtimeLLM):
+        self.vad = vad
+        self.llm = llm
+        self._handlers = {}
+        self._state = "initializing"
+        self._tasks = set()
+
+    def on(self, event: str, callback):
+        self._handlers.setdefault(event, []).append(callback)
+
+    def _set_state(self, state: str):
+        event = types.SimpleNamespace(old_state=self._state, new_state=state)
+        self._state = state
+        for callback in self._handlers.get("agent_state_changed", []):
+            callback(event)
+
+    async def start(self, room: FakeRoom, agent, room_options):
+        await asyncio.sleep(room.connect_delay)
+        self._set_state("listening")
+
+    async def _speak(self):
+        self._set_state("thinking")
+        await asyncio.sleep(self.llm.delay)
+        self._set_state("speaking")
+
+    async def generate_reply(self, instructions: str):
+        task = asyncio.create_task(self._speak())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+async def run_job(index: int, prewarmed: bool, llm: FakeRealtimeLLM, connect_delay: float) -> dict:
+    proc = types.SimpleNamespace(userdata={})  # a fresh job process
+    if prewarmed:
+        prewarm(proc)  # runs while the process is idle, before the job is assigned
+    latency = SessionLatency()
+    session = await start_wellness_session(
+        FakeRoom(f"harness-{index}", connect_delay), proc, latency,
+        session_factory=lambda vad: FakeSession(vad, llm),
+    )
+    while "first_audio" not in latency.marks:
+        await asyncio.sleep(0.001)
+    await asyncio.gather(*session._tasks)
+    return latency.marks
+
+
+def report(name: str, runs):
+    print(f"{name}:")
+    for mark in runs[0]:
+        values = np.array([run[mark] for run in runs])
+        print(f"  {mark:<20} p50 {np.percentile(values, 50):7.1f} ms   p95 {np.percentile(values, 95):7.1f} ms")
+
+
+async def main(args):
+    llm = FakeRealtimeLLM(args.llm_delay)
+    for prewarmed in (False, True):
+        runs = [await run_job(i, prewarmed, llm, args.connect_delay) for i in range(args.jobs)]
+        report("prewarmed process" if prewarmed else "cold process (VAD loaded in session)", runs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure agent session setup latency with a fake room and LLM")
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--llm-delay", type=float, default=0.3, help="LLM stand-in time to first audio (s)")
+    parser.add_argument("--connect-delay", type=float, default=0.05, help="fake room connect time (s)")
+    asyncio.run(main(parser.parse_args()))
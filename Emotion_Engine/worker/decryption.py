@@ -7,8 +7,13 @@ from PIL import Image
 import binascii
 
 def decrypt_image(encrypted_data: bytes, key: str) -> Image.Image:
+    """Decrypts the frame and opens it (lazily) as a PIL image"""
+    return Image.open(io.BytesIO(decrypt_image_bytes(encrypted_data, key)))
+
+
+def decrypt_image_bytes(encrypted_data: bytes, key: str) -> bytes:
     """
-    Decrypts the encrypted image data using AES-CBC.
+    Decrypts the encrypted image data using AES-CBC and returns the encoded image (JPEG/PNG) bytes.
     Expects encrypted_data to be IV (16 bytes) + Ciphertext.
     Expects key to be a hex string (32 bytes / 64 hex chars).
     """
@@ -50,19 +55,15 @@ def decrypt_image(encrypted_data: bytes, key: str) -> Image.Image:
                 # The image might be raw base64 or data URI
                 if ',' in image_b64:
                     image_b64 = image_b64.split(',')[1]
-                image_bytes = base64.b64decode(image_b64)
-                image = Image.open(io.BytesIO(image_bytes))
-                return image
+                return base64.b64decode(image_b64)
             else:
                 # Fallback for backward compatibility or if raw image was sent
                 print("Warning: 'image' field not found in payload, attempting to treat as raw image bytes.")
-                image = Image.open(io.BytesIO(data))
-                return image
+                return data
         except (json.JSONDecodeError, UnicodeDecodeError):
              # Fallback if not JSON
             print("Warning: Failed to decode as JSON, treating as raw image bytes.")
-            image = Image.open(io.BytesIO(data))
-            return image
+            return data
     except Exception as e:
         print(f"Decryption failed: {e}")
         raise e
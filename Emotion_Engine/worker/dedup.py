@@ -0,0 +1,101 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+THUMBNAIL_SIZE = (48, 48)
+
+
+def make_thumbnail(image: Image.Image) -> Image.Image:
+    """Grayscale 48x48 copy of the frame - the same input size the CNN sees."""
+    return image.convert("L").resize(THUMBNAIL_SIZE)
+
+
+class DedupIndex:
+    """
+    Short-lived, bounded index of recently seen frames.
+
+    Exact duplicates are keyed by uid + a hash of the ciphertext, so client retries are
+    caught before anything is queued. The optional near-duplicate check compares the
+    decoded 48x48 thumbnail against the last one seen for the uid (mean absolute
+    difference in grey levels), which catches static scenes re-encrypted with a new IV.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 10000, near_dup_threshold: float = 0.0):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.near_dup_threshold = near_dup_threshold
+        # (uid, digest) -> [expires_at, result]; result is None while the frame is still queued
+        self._entries = OrderedDict()
+        # uid -> (expires_at, thumbnail array, result)
+        self._thumbnails = OrderedDict()
+        self.stats = {"exact_hits": 0, "near_hits": 0, "misses": 0}
+
+    @staticmethod
+    def fingerprint(payload: bytes) -> bytes:
+        return hashlib.blake2b(payload, digest_size=16).digest()
+
+    def _evict(self, now: float):
+        # Every entry gets the same TTL, so insertion order is expiry order.
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+        while self._thumbnails:
+            uid, (expires_at, _, _) = next(iter(self._thumbnails.items()))
+            if expires_at > now and len(self._thumbnails) <= self.max_entries:
+                break
+            self._thumbnails.popitem(last=False)
+
+    def lookup(self, uid: str, digest: bytes):
+        """Return (hit, result) for an exact duplicate; result is None if the original is still pending."""
+        now = time.monotonic()
+        self._evict(now)
+        entry = self._entries.get((uid, digest))
+        if entry is None:
+            self.stats["misses"] += 1
+            return False, None
+        self.stats["exact_hits"] += 1
+        return True, entry[1]
+
+    def add(self, uid: str, digest: bytes):
+        now = time.monotonic()
+        self._entries[(uid, digest)] = [now + self.ttl_seconds, None]
+        self._entries.move_to_end((uid, digest))
+        self._evict(now)
+
+    def resolve(self, uid: str, digest: bytes, result):
+        entry = self._entries.get((uid, digest))
+        if entry is not None:
+            entry[1] = result
+
+    def forget(self, uid: str, digest: bytes):
+        """Drop a frame that failed, so a retry is processed again."""
+        self._entries.pop((uid, digest), None)
+
+    def lookup_near(self, uid: str, thumbnail: Image.Image):
+        """Return the prior result if `thumbnail` is within the threshold of the uid's last frame."""
+        if self.near_dup_threshold <= 0:
+            return None
+        now = time.monotonic()
+        self._evict(now)
+        entry = self._thumbnails.get(uid)
+        if entry is None:
+            return None
+        _, prev, result = entry
+        current = np.asarray(thumbnail, dtype=np.int16)
+        if np.abs(current - prev).mean() <= self.near_dup_threshold:
+            self.stats["near_hits"] += 1
+            return result
+        return None
+
+    def remember_thumbnail(self, uid: str, thumbnail: Image.Image, result):
+        if self.near_dup_threshold <= 0:
+            return
+        now = time.monotonic()
+        self._thumbnails[uid] = (now + self.ttl_seconds, np.asarray(thumbnail, dtype=np.int16), result)
+        self._thumbnails.move_to_end(uid)
+        self._evict(now)
@@ -0,0 +1,230 @@
+import asyncio
+import collections
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import grpc
+import numpy as np
+
+# Add the Emotion_Engine directory to path to import the shared inference core
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# Add proto directory to path to import generated files
+sys.path.append(os.path.join(os.path.dirname(__file__), '../proto'))
+
+from inference_core import EMOTIONS
+
+import interface_pb2
+import interface_pb2_grpc
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    One subscriber's bounded stream of updates for a uid.
+
+    The buffer keeps the newest `queue_size` updates: when the subscriber falls behind the
+    oldest pending update is dropped, and anything older than `max_age` seconds when it is
+    read is skipped, so a slow consumer always catches up to the current state.
+    Iterate with `async for`, or call get(); close() (or the bus) ends the stream.
+    """
+
+    def __init__(self, bus: "EmotionBus", uid: str, queue_size: int, max_age: float):
+        self.bus = bus
+        self.uid = uid
+        self.max_age = max_age
+        self.loop = asyncio.get_running_loop()
+        self._pending = collections.deque(maxlen=queue_size)
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.dropped = 0
+
+    def _put(self, update: dict):
+        if self.closed:
+            return
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(update)
+        self._ready.set()
+
+    def _close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get(self):
+        """Next fresh update, or None once the subscription is closed"""
+        while True:
+            while self._pending:
+                update = self._pending.popleft()
+                if time.time() - update["timestamp"] <= self.max_age:
+                    return update
+                self.dropped += 1
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        update = await self.get()
+        if update is None:
+            raise StopAsyncIteration
+        return update
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EmotionBus:
+    """
+    In-process publish/subscribe of smoothed emotion predictions, keyed by uid.
+
+    RequestQueue publishes every prediction with publish_prediction(); it is folded into a
+    time-decayed distribution per uid (half-life `half_life_seconds`) and the smoothed state
+    is pushed to that uid's subscribers. Other processes (e.g. a live agent session) subscribe
+    through the worker's SubscribeEmotions RPC, see remote_updates(). Publishing never blocks:
+    each subscriber has a bounded buffer that drops stale updates, at most
+    `max_subscribers_per_uid` subscribers are kept per uid (a new one displaces the oldest),
+    and smoothing state is kept for at most `max_uids` recently active uids.
+    Subscribers on another event loop or thread are handed updates thread-safely.
+    """
+
+    def __init__(self, queue_size: int = 8, max_subscribers_per_uid: int = 4, max_age_seconds: float = 10.0,
+                 half_life_seconds: float = 5.0, max_uids: int = 10000):
+        self.queue_size = queue_size
+        self.max_subscribers_per_uid = max_subscribers_per_uid
+        self.max_age_seconds = max_age_seconds
+        self.half_life_seconds = half_life_seconds
+        self.max_uids = max_uids
+        self._subscribers = {}  # uid -> [Subscription], oldest first
+        self._smoothed = OrderedDict()  # uid -> (last timestamp, distribution), least recently updated first
+        self._latest = OrderedDict()  # uid -> last published update, least recently published first
+        self.stats = {"published": 0, "delivered": 0, "displaced": 0}
+
+    def subscribe(self, uid: str) -> Subscription:
+        """Subscribe to `uid` from a coroutine; the latest update (if still fresh) is delivered first"""
+        subscription = Subscription(self, uid, self.queue_size, self.max_age_seconds)
+        subscribers = self._subscribers.setdefault(uid, [])
+        if len(subscribers) >= self.max_subscribers_per_uid:
+            oldest = subscribers.pop(0)
+            oldest._close()
+            self.stats["displaced"] += 1
+        subscribers.append(subscription)
+        latest = self._latest.get(uid)
+        if latest is not None:
+            subscription._put(latest)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.uid, [])
+        if subscription in subscribers:
+            subscribers.remove(subscription)
+        if not subscribers:
+            self._subscribers.pop(subscription.uid, None)
+        subscription._close()
+
+    def subscriber_count(self, uid: str) -> int:
+        return len(self._subscribers.get(uid, ()))
+
+    def publish(self, uid: str, update: dict) -> int:
+        """Push `update` to the uid's subscribers; returns how many it was handed to"""
+        self.stats["published"] += 1
+        self._latest[uid] = update
+        self._latest.move_to_end(uid)
+        while len(self._latest) > self.max_uids:
+            self._latest.popitem(last=False)
+        subscribers = self._subscribers.get(uid)
+        if not subscribers:
+            return 0
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        for subscription in subscribers:
+            if subscription.loop is loop:
+                subscription._put(update)
+            else:
+                subscription.loop.call_soon_threadsafe(subscription._put, update)
+        self.stats["delivered"] += len(subscribers)
+        return len(subscribers)
+
+    def publish_prediction(self, uid: str, probs, timestamp: float | None = None) -> int:
+        """Fold one prediction (probabilities indexed like EMOTIONS) into the uid's smoothed state and publish it"""
+        now = time.time() if timestamp is None else timestamp
+        probs = np.asarray(probs, dtype=np.float64)
+        previous = self._smoothed.pop(uid, None)
+        if previous is None:
+            distribution = probs.copy()
+        else:
+            last, distribution = previous
+            alpha = 1.0 - 0.5 ** (max(now - last, 0.0) / self.half_life_seconds)
+            distribution += alpha * (probs - distribution)
+        self._smoothed[uid] = (now, distribution)
+        while len(self._smoothed) > self.max_uids:
+            self._smoothed.popitem(last=False)
+
+        best = int(distribution.argmax())
+        return self.publish(uid, {
+            "uid": uid,
+            "emotion": EMOTIONS[best],
+            "confidence": round(float(distribution[best]), 4),
+            "distribution": {name: round(float(p), 4) for name, p in zip(EMOTIONS, distribution)},
+            "timestamp": now,
+        })
+
+
+_default_bus: EmotionBus | None = None
+
+
+def get_bus() -> EmotionBus:
+    """The process-wide bus shared by the worker and any agent sessions running in the same process"""
+    global _default_bus
+    if _default_bus is None:
+        _default_bus = EmotionBus()
+    return _default_bus
+
+
+def to_message(update: dict) -> interface_pb2.EmotionUpdate:
+    return interface_pb2.EmotionUpdate(
+        uid=update["uid"],
+        emotion=update["emotion"],
+        confidence=update["confidence"],
+        distribution=update["distribution"],
+        timestamp=update["timestamp"],
+    )
+
+
+def from_message(message: interface_pb2.EmotionUpdate) -> dict:
+    return {
+        "uid": message.uid,
+        "emotion": message.emotion,
+        "confidence": message.confidence,
+        "distribution": dict(message.distribution),
+        "timestamp": message.timestamp,
+    }
+
+
+async def remote_updates(address: str, uid: str, retry_seconds: float = 2.0):
+    """
+    Updates for `uid` (dicts, as published on the bus) from the worker or shard router at
+    `address`, over its SubscribeEmotions stream. The stream is reopened whenever it ends or
+    fails - worker restart, rebalance, displacement - so this only stops when cancelled, or
+    if the worker has the bus disabled.
+    """
+    async with grpc.aio.insecure_channel(address) as channel:
+        stub = interface_pb2_grpc.EmotionServiceStub(channel)
+        while True:
+            try:
+                async for message in stub.SubscribeEmotions(interface_pb2.EmotionSubscription(uid=uid)):
+                    yield from_message(message)
+            except grpc.aio.AioRpcError as e:
+                if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                    logger.warning(f"Emotion updates unavailable from {address}: {e.details()}")
+                    return
+                logger.debug(f"Emotion stream for {uid} from {address} failed: {e.code()}")
+            await asyncio.sleep(retry_seconds)
@@ -0,0 +1,164 @@
+"""
+Cross-process check of the SubscribeEmotions stream.
+
+Starts the worker (service.py) as a separate process, subscribes to a uid from this process
+the way a live agent session does (emotion_bus.remote_updates), sends encrypted frames for
+that uid and checks that the smoothed updates arrive. The worker is then restarted to check
+that the subscriber reconnects on its own. The worker loads a throwaway (untrained) CNN
+written to the temp directory, since only delivery is checked. Exits non-zero on failure.
+
+Usage:
+    python emotion_stream_check.py --port 50161 --frames 4
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import grpc
+import numpy as np
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+from PIL import Image
+
+from emotion_bus import EMOTIONS, interface_pb2, interface_pb2_grpc, remote_updates
+
+KEY = "11" * 32
+
+
+def encrypt_frame(seed: int, key: str = KEY) -> bytes:
+    """Random 64x64 PNG in the client's envelope: IV + AES-256-CBC of {"image": <base64>}"""
+    pixels = np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG")
+    payload = json.dumps({"image": base64.b64encode(buffer.getvalue()).decode()}).encode()
+    padder = padding.PKCS7(128).padder()
+    data = padder.update(payload) + padder.finalize()
+    iv = os.urandom(16)
+    encryptor = Cipher(algorithms.AES(bytes.fromhex(key)), modes.CBC(iv)).encryptor()
+    return iv + encryptor.update(data) + encryptor.finalize()
+
+
+def write_model(data_dir: str) -> str:
+    """Untrained CNN checkpoint for the worker to load; the predictions don't matter here"""
+    import torch
+
+    from model_def import CNN
+
+    path = os.path.join(data_dir, "cnn.pth")
+    torch.save(CNN().state_dict(), path)
+    return path
+
+
+def start_worker(port: int, data_dir: str, log) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        MODEL_PATH=os.path.join(data_dir, "cnn.pth"),
+        EMOTION_PORT=str(port),
+        EMOTION_BUS="1",
+        WORKER_PROCESSES="1",
+        SPOOL_PATH=os.path.join(data_dir, "spool.jsonl"),
+        RESULT_STORE_DIR=os.path.join(data_dir, "results"),
+        KEYS_DB_PATH=os.path.join(data_dir, "keys.db"),
+    )
+    service = os.path.join(os.path.dirname(os.path.abspath(__file__)), "service.py")
+    return subprocess.Popen([sys.executable, service], env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_serving(address: str, timeout: float):
+    async with grpc.aio.insecure_channel(address) as channel:
+        health = health_pb2_grpc.HealthStub(channel)
+        deadline = asyncio.get_running_loop().time() + timeout
+        while asyncio.get_running_loop().time() < deadline:
+            try:
+                response = await health.Check(health_pb2.HealthCheckRequest(), timeout=1.0)
+                if response.status == health_pb2.HealthCheckResponse.SERVING:
+                    return
+            except grpc.aio.AioRpcError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"worker at {address} not serving after {timeout:.0f}s")
+
+
+async def send_frames(address: str, uid: str, frames: int, seed: int):
+    async with grpc.aio.insecure_channel(address) as channel:
+        stub = interface_pb2_grpc.EmotionServiceStub(channel)
+        await stub.SendDecryptionKey(interface_pb2.KeyRequest(uid=uid, key=KEY))
+        for i in range(frames):
+            await stub.SendEncryptedImage(interface_pb2.ImageRequest(uid=uid, encrypted_image=encrypt_frame(seed + i)))
+
+
+async def expect_updates(received: list, count: int, timeout: float) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while len(received) < count and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.1)
+    return len(received) >= count
+
+
+async def check(port: int, frames: int, timeout: float) -> bool:
+    address = f"localhost:{port}"
+    uid = "stream-check"
+    received = []
+
+    async def consume():
+        async for update in remote_updates(address, uid, retry_seconds=0.5):
+            received.append(update)
+
+    with tempfile.TemporaryDirectory() as data_dir, open(os.path.join(data_dir, "worker.log"), "w+") as log:
+        write_model(data_dir)
+        worker = start_worker(port, data_dir, log)
+        consumer = None
+        try:
+            await wait_serving(address, timeout)
+            consumer = asyncio.create_task(consume())
+            await asyncio.sleep(0.5)  # let the subscription open before the first frame
+            await send_frames(address, uid, frames, seed=0)
+            ok = await expect_updates(received, frames, timeout)
+            print(f"Worker pid {worker.pid} -> this process (pid {os.getpid()}): {len(received)} updates")
+
+            # Restart the worker: the same subscriber must reconnect and keep receiving.
+            worker.terminate()
+            worker.wait(timeout)
+            before = len(received)
+            worker = start_worker(port, data_dir, log)
+            await wait_serving(address, timeout)
+            await asyncio.sleep(1.5)  # a retry interval or two for the stream to reopen
+            await send_frames(address, uid, frames, seed=100)
+            ok = await expect_updates(received, before + frames, timeout) and ok
+            print(f"After restart (pid {worker.pid}): {len(received) - before} updates")
+        finally:
+            if consumer is not None:
+                consumer.cancel()
+            worker.terminate()
+            worker.wait(timeout)
+            if not received:
+                log.seek(0)
+                print(log.read()[-2000:])
+
+    for update in received:
+        total = sum(update["distribution"].values())
+        if update["uid"] != uid or update["emotion"] not in EMOTIONS or abs(total - 1.0) > 0.01:
+            print(f"Malformed update: {update}")
+            ok = False
+    if received:
+        print(f"Last update: {received[-1]['emotion']} ({received[-1]['confidence']:.2f})")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check emotion updates reach a subscriber in another process")
+    parser.add_argument("--port", type=int, default=50161)
+    parser.add_argument("--frames", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    ok = asyncio.run(check(args.port, args.frames, args.timeout))
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,145 @@
+import io
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+try:
+    import cv2
+except ImportError:  # optional: without OpenCV frames go to the model uncropped
+    cv2 = None
+
+# JPEG can be decoded at 1/1, 1/2, 1/4 or 1/8 scale for a fraction of the cost
+DRAFT_SCALES = (1 / 8, 1 / 4, 1 / 2, 1.0)
+
+
+class FaceCropper:
+    """
+    Face localization ahead of the model, for frames where the face is a small part of the image.
+
+    The frame is decoded in greyscale at reduced resolution (JPEG draft mode) to at most
+    `detect_width` pixels wide, a Haar cascade finds the largest face, and the crop (plus
+    `margin` on each side, in the model's input `mode`) is what the model sees instead of the
+    whole downscaled frame.
+    The box is cached per uid: for the next `redetect_every` frames within `ttl_seconds` no
+    detection runs, and the frame is only decoded at the smallest scale that still gives a
+    face of `min_crop` pixels. After that the face is searched again only within
+    `track_margin` of the cached box. crop() takes the encoded frame bytes and decodes its own
+    copies, and returns None when no face is found, so callers fall back to the full frame.
+    """
+
+    def __init__(self, detect_width: int = 640, margin: float = 0.2, track_margin: float = 0.5, min_crop: int = 48,
+                 redetect_every: int = 5, ttl_seconds: float = 2.0, max_uids: int = 10000,
+                 cascade_path: str | None = None, mode: str = "L"):
+        if cv2 is None:
+            raise ImportError("FaceCropper needs OpenCV (opencv-python-headless)")
+        self.detect_width = detect_width
+        self.margin = margin
+        self.track_margin = track_margin
+        self.min_crop = min_crop
+        self.redetect_every = redetect_every
+        self.ttl_seconds = ttl_seconds
+        self.max_uids = max_uids
+        self.mode = mode
+        cascade_path = cascade_path or cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise FileNotFoundError(f"Could not load face cascade from {cascade_path}")
+        # uid -> [expires_at, frames since detection, frame size, box (x0, y0, x1, y1) in frame pixels]
+        self._boxes = OrderedDict()
+        self.stats = {"detections": 0, "cached": 0, "no_face": 0, "seconds": 0.0}
+
+    @staticmethod
+    def _decode(data: bytes, size, scale: float, mode: str) -> Image.Image:
+        """
+        Frame decoded in `mode` at (about) `scale`; draft() is a no-op for non-JPEG images.
+        Each decode opens its own image, since draft() changes the image it is called on.
+        """
+        image = Image.open(io.BytesIO(data))
+        image.draft(mode, (max(1, int(size[0] * scale)), max(1, int(size[1] * scale))))
+        return image.convert(mode)
+
+    def _draft_scale(self, box) -> float:
+        """Smallest decode scale that keeps `box` at least min_crop pixels wide"""
+        return next((s for s in DRAFT_SCALES if (box[2] - box[0]) * s >= self.min_crop), 1.0)
+
+    def _expand(self, box, size, margin: float):
+        x0, y0, x1, y1 = box
+        pad_x, pad_y = (x1 - x0) * margin, (y1 - y0) * margin
+        return (max(0.0, x0 - pad_x), max(0.0, y0 - pad_y),
+                min(float(size[0]), x1 + pad_x), min(float(size[1]), y1 + pad_y))
+
+    @staticmethod
+    def _crop(decoded: Image.Image, box, frame_width: int) -> Image.Image:
+        ratio = decoded.width / frame_width
+        return decoded.crop(tuple(round(v * ratio) for v in box))
+
+    def _detect(self, data: bytes, size, scale: float, region, max_width: int):
+        """
+        Largest face inside `region` (frame pixels) of the frame decoded at `scale`, searched
+        at most `max_width` pixels wide. Returns (box in frame pixels or None, decoded frame).
+        """
+        grey = self._decode(data, size, scale, "L")
+        search = self._crop(grey, region, size[0])
+        if search.width > max_width:
+            search = search.resize((max_width, round(search.height * max_width / search.width)))
+        faces = self.cascade.detectMultiScale(np.asarray(search), scaleFactor=1.1, minNeighbors=5,
+                                              minSize=(24, 24))
+        self.stats["detections"] += 1
+        if len(faces) == 0:
+            return None, grey
+        x, y, w, h = (float(v) for v in max(faces, key=lambda f: f[2] * f[3]))
+        to_frame = (region[2] - region[0]) / search.width
+        return (region[0] + x * to_frame, region[1] + y * to_frame,
+                region[0] + (x + w) * to_frame, region[1] + (y + h) * to_frame), grey
+
+    def crop(self, uid: str, data: bytes, size):
+        """Face crop of the encoded frame `data` (`size` pixels) in self.mode, or None if no face is found"""
+        start = time.perf_counter()
+        now = time.monotonic()
+        while self._boxes:
+            _, entry = next(iter(self._boxes.items()))
+            if entry[0] > now and len(self._boxes) <= self.max_uids:
+                break
+            self._boxes.popitem(last=False)
+
+        entry = self._boxes.pop(uid, None)
+        if entry is not None and entry[2] != size:
+            entry = None
+        if entry is not None and entry[1] < self.redetect_every:
+            entry[1] += 1
+            box = entry[3]
+            face = self._crop(self._decode(data, size, self._draft_scale(box), self.mode), box, size[0])
+            self._boxes[uid] = entry
+            self.stats["cached"] += 1
+        else:
+            if entry is not None:
+                # Re-detect around the last box, scaled so the box is twice min_crop wide: ~200
+                # pixels square instead of the whole frame. If the face moved out of it, this frame
+                # goes to the model whole and the next one gets a full-frame search.
+                region = self._expand(entry[3], size, self.track_margin)
+                max_width = round(2 * self.min_crop * (region[2] - region[0]) / (entry[3][2] - entry[3][0]))
+                box, grey = self._detect(data, size, self._draft_scale(entry[3]), region, max_width)
+            else:
+                box, grey = self._detect(data, size, min(1.0, self.detect_width / size[0]),
+                                         (0.0, 0.0, float(size[0]), float(size[1])), self.detect_width)
+            if box is None:
+                self.stats["no_face"] += 1
+                self.stats["seconds"] += time.perf_counter() - start
+                return None
+            box = self._expand(box, size, self.margin)
+            self._boxes[uid] = [now + self.ttl_seconds, 0, size, box]
+            # Detection only needs grey; other modes decode again at the scale the crop needs
+            decoded = grey if self.mode == "L" else self._decode(data, size, self._draft_scale(box), self.mode)
+            face = self._crop(decoded, box, size[0])
+        self.stats["seconds"] += time.perf_counter() - start
+        return face
+
+    def summary(self) -> str:
+        frames = self.stats["detections"] + self.stats["cached"]
+        per_frame = self.stats["seconds"] / frames * 1000 if frames else 0.0
+        return (
+            f"{self.stats['detections']} detections, {self.stats['cached']} cached crops, "
+            f"{self.stats['no_face']} frames without a face, {per_frame:.1f} ms/frame"
+        )
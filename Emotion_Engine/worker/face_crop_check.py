@@ -0,0 +1,90 @@
+"""
+Check that FaceCropper leaves the frame it is given alone.
+
+Encodes a 1920x1080 RGB JPEG without a face and runs it through the cropper the way
+RequestQueue does (crop(uid, bytes, size) next to the opened frame): the crop must be None
+and the frame must still be RGB at full size, pixel for pixel the same as a fresh decode.
+With --face, the given face photo is pasted into the frame and the crop must come back in
+the cropper's mode (RGB and L), over a detection and a cached frame, with the frame again
+untouched. Exits non-zero on failure.
+
+Usage:
+    python face_crop_check.py --face portrait.png
+"""
+
+import argparse
+import io
+import sys
+
+import numpy as np
+from PIL import Image
+
+from face_crop import FaceCropper
+
+FRAME_SIZE = (1920, 1080)
+
+
+def encode_frame(face: Image.Image | None = None, face_width: int = 700) -> bytes:
+    """Smooth gradient frame (no face) as a JPEG, optionally with `face` pasted in the middle"""
+    x = np.linspace(0, 255, FRAME_SIZE[0], dtype=np.float32)
+    y = np.linspace(0, 255, FRAME_SIZE[1], dtype=np.float32)[:, None]
+    pixels = np.stack([np.broadcast_to(x, (FRAME_SIZE[1], FRAME_SIZE[0])),
+                       np.broadcast_to(y, (FRAME_SIZE[1], FRAME_SIZE[0])),
+                       np.full((FRAME_SIZE[1], FRAME_SIZE[0]), 128, np.float32)], axis=-1)
+    frame = Image.fromarray(pixels.astype(np.uint8), "RGB")
+    if face is not None:
+        face = face.convert("RGB")
+        face = face.resize((face_width, round(face.height * face_width / face.width)))
+        frame.paste(face, ((FRAME_SIZE[0] - face.width) // 2, (FRAME_SIZE[1] - face.height) // 2))
+    buffer = io.BytesIO()
+    frame.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def crop_frame(cropper: FaceCropper, uid: str, data: bytes):
+    """Crop like RequestQueue.process_request; returns (crop, frame) with the frame fully loaded"""
+    frame = Image.open(io.BytesIO(data))
+    face = cropper.crop(uid, data, frame.size)
+    frame.load()
+    return face, frame
+
+
+def untouched(frame: Image.Image, data: bytes) -> bool:
+    reference = Image.open(io.BytesIO(data)).convert("RGB")
+    return (frame.mode, frame.size) == ("RGB", FRAME_SIZE) and np.array_equal(np.asarray(frame), np.asarray(reference))
+
+
+def check(face_path: str | None) -> bool:
+    ok = True
+    cropper = FaceCropper(mode="RGB")
+    data = encode_frame()
+    face, frame = crop_frame(cropper, "no-face", data)
+    print(f"No face: crop={face}, frame {frame.mode} {frame.size}")
+    if face is not None or not untouched(frame, data):
+        print("  frame changed or a face was found")
+        ok = False
+
+    if face_path is None:
+        print("No --face image given; skipping the face checks")
+        return ok
+    data = encode_frame(Image.open(face_path))
+    for mode in ("RGB", "L"):
+        cropper = FaceCropper(mode=mode, min_crop=224 if mode == "RGB" else 48)
+        for attempt in ("detected", "cached"):
+            face, frame = crop_frame(cropper, "face", data)
+            print(f"{mode} {attempt}: crop={None if face is None else (face.mode, face.size)}, "
+                  f"frame {frame.mode} {frame.size}")
+            if face is None or face.mode != mode or not untouched(frame, data):
+                print("  expected a crop in the cropper's mode and an untouched frame")
+                ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the face cropper does not modify the frame")
+    parser.add_argument("--face", help="photo with a frontal face, for the crop checks")
+    args = parser.parse_args()
+
+    ok = check(args.face)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,140 @@
+"""
+Local stand-in for Supabase's REST endpoint, for testing and benchmarking the result sink.
+
+Accepts POST /rest/v1/<table> with the `user_emotion` row schema (userId, Emotion,
+TimeStamp), answers 201 after an optional simulated latency, and counts what it received.
+
+Usage:
+    python fake_sink_server.py serve --port 54321 --latency 0.02
+        SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=test python service.py
+    python fake_sink_server.py benchmark --rows 5000 --latency 0.02 --concurrency 1 8 32
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+USER_EMOTION_FIELDS = {"userId", "Emotion", "TimeStamp"}
+
+
+class FakeSinkServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # the default backlog of 5 resets connections under concurrent load
+
+    def __init__(self, port: int = 0, latency: float = 0.0, api_key: str | None = None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.api_key = api_key
+        self.rows = []
+        self.rejected = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+
+    def _reply(self, status: int, body: dict | None = None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.api_key is not None and self.headers.get("apikey") != self.server.api_key:
+            return self._reply(401, {"message": "Invalid API key"})
+        table = self.path.rsplit("/", 1)[-1]
+        try:
+            row = json.loads(body)
+        except ValueError:
+            row = None
+        if not self.path.startswith("/rest/v1/") or not isinstance(row, dict) or (
+                table == "user_emotion" and set(row) != USER_EMOTION_FIELDS):
+            with self.server._lock:
+                self.server.rejected += 1
+            return self._reply(400, {"message": f"Unexpected row for {table}: {row}"})
+        with self.server._lock:
+            self.server.rows.append((table, row))
+        self._reply(201)
+
+    def log_message(self, format, *args):
+        pass
+
+
+async def _benchmark_run(server: FakeSinkServer, rows: int, concurrency: int) -> dict:
+    from supabase_client import SupabaseSink
+
+    sink = SupabaseSink(server.url, "test", max_connections=concurrency, max_keepalive=concurrency,
+                        max_concurrency=concurrency)
+    latencies = []
+
+    async def one(i: int):
+        start = time.perf_counter()
+        await sink.save_user_emotion(f"user{i % 100}", "Happy", "2025-01-01T00:00:00")
+        latencies.append(time.perf_counter() - start)
+
+    connections = server.connections
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(rows)))
+    elapsed = time.perf_counter() - start
+    await sink.aclose()
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "rows_per_s": rows / elapsed,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "failed": sink.stats["failed"],
+        "connections": server.connections - connections,
+    }
+
+
+def benchmark(rows: int, latency: float, concurrency_levels):
+    server = FakeSinkServer(latency=latency).start()
+    print(f"Fake sink at {server.url}, {latency * 1000:.0f} ms per insert")
+    for concurrency in concurrency_levels:
+        result = asyncio.run(_benchmark_run(server, rows, concurrency))
+        print(f"concurrency {result['concurrency']:>3}: {result['rows_per_s']:8.0f} rows/s, "
+              f"p95 {result['p95_ms']:7.1f} ms (incl. queueing), {result['failed']} failed, "
+              f"{result['connections']} connections opened")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Supabase REST endpoint for the result sink")
+    parser.add_argument("command", choices=("serve", "benchmark"))
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per insert")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = FakeSinkServer(args.port, args.latency)
+        print(f"Fake sink listening on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print(f"Received {len(server.rows)} rows, rejected {server.rejected}")
+    else:
+        benchmark(args.rows, args.latency, args.concurrency)
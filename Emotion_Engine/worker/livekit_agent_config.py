@@ -8,12 +8,15 @@ with LiveKit Agents SDK v1.2+. Copy this as a template for your deployment.
 import asyncio
 import logging
 import os
+import time
 from dotenv import load_dotenv
 
 from livekit import agents, rtc
 from livekit.agents import AgentServer, AgentSession, Agent, room_io
 from livekit.plugins import google, silero
 
+from emotion_bus import remote_updates
+
 # Load environment variables
 load_dotenv()
 load_dotenv(".env.local")
@@ -33,6 +36,12 @@ LIVEKIT_URL = os.getenv('LIVEKIT_URL', 'wss://emotech-38dj94si.livekit.cloud')
 LIVEKIT_API_KEY = os.getenv('LIVEKIT_API_KEY', 'APISsXCJFjf8JW4')
 LIVEKIT_API_SECRET = os.getenv('LIVEKIT_API_SECRET', 'a4p9grtgakKGIqJqeMDGcSocsVVHeifYh53QMqzG00RA')
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY', '')
+# Idle job processes kept prewarmed (VAD loaded) so a new student never waits for a cold one
+AGENT_IDLE_PROCESSES = int(os.getenv('AGENT_IDLE_PROCESSES', '2'))
+# Minimum time between instruction updates driven by the student's facial emotion
+EMOTION_UPDATE_SECONDS = float(os.getenv('EMOTION_UPDATE_SECONDS', '15'))
+# Emotion worker (or shard router) whose SubscribeEmotions stream drives those updates
+EMOTION_WORKER_ADDRESS = os.getenv('EMOTION_WORKER_ADDRESS', 'localhost:50051')
 
 # Validate required configuration
 if not GOOGLE_API_KEY:
@@ -122,43 +131,151 @@ class WellnessAssistantAgent(Agent):
         super().__init__(instructions=SYSTEM_PROMPT)
 
 
-# Create the agent server
-server = AgentServer()
+# ============================================================================
+# PREWARM AND SESSION SETUP
+# ============================================================================
+
+def prewarm(proc: agents.JobProcess):
+    """Load the VAD once per job process, before any job is assigned to it"""
+    start = time.perf_counter()
+    proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["vad_load_seconds"] = time.perf_counter() - start
+    logger.info(f"Prewarmed VAD in {proc.userdata['vad_load_seconds'] * 1000:.0f} ms")
+
+
+def get_vad(proc: agents.JobProcess):
+    """The process's prewarmed VAD; loaded (and kept) here if prewarm didn't run"""
+    if "vad" not in proc.userdata:
+        logger.warning("VAD was not prewarmed; loading it inside the session")
+        proc.userdata["vad"] = silero.VAD.load()
+    return proc.userdata["vad"]
+
+
+def create_session(vad) -> AgentSession:
+    """An agent session with the Gemini Realtime Model and the shared VAD"""
+    return AgentSession(
+        llm=google.beta.realtime.RealtimeModel(
+            model="gemini-2.0-flash-exp",
+            voice="Puck",  # Options: Puck, Charon, Kore, Fenrir, Aoide
+            temperature=0.7,
+        ),
+        vad=vad,  # Voice Activity Detection
+    )
+
+
+class SessionLatency:
+    """
+    Setup timeline of one session, in ms since the job started.
+
+    The clock starts when the entrypoint runs, i.e. as soon as the job is assigned to this
+    process; `first_audio` is when the agent first enters the "speaking" state.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks = {}
+
+    def mark(self, name: str):
+        self.marks.setdefault(name, (time.perf_counter() - self.started) * 1000)
+
+    def watch(self, session):
+        def on_state_changed(event):
+            if event.new_state == "speaking" and "first_audio" not in self.marks:
+                self.mark("first_audio")
+                logger.info(f"Session setup latency: {self.summary()}")
+
+        session.on("agent_state_changed", on_state_changed)
+
+    def summary(self) -> str:
+        return ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.marks.items())
+
+
+async def start_wellness_session(room, proc: agents.JobProcess, latency: SessionLatency,
+                                 session_factory=create_session) -> AgentSession:
+    """Start the agent in `room` and request the greeting; returns the running session"""
+    vad = get_vad(proc)
+    latency.mark("vad_ready")
+    session = session_factory(vad)
+    latency.watch(session)
+
+    # Start the session
+    await session.start(
+        room=room,
+        agent=WellnessAssistantAgent(),
+        room_options=room_io.RoomOptions(
+            audio_input=room_io.AudioInputOptions(),
+        ),
+    )
+    latency.mark("session_started")
+
+    # Generate an initial greeting
+    await session.generate_reply(
+        instructions="Warmly greet the user and ask how they're feeling today. Be empathetic."
+    )
+    latency.mark("greeting_requested")
+    return session
+
+
+# ============================================================================
+# LIVE EMOTION CONTEXT
+# ============================================================================
+
+def emotion_instructions(update: dict) -> str:
+    """SYSTEM_PROMPT plus a note on the student's current facial emotion"""
+    return (
+        f"{SYSTEM_PROMPT}\n"
+        f"Live context: the student's facial expression currently reads as {update['emotion']} "
+        f"(confidence {update['confidence']:.0%}). Let it inform your tone gently; don't mention "
+        f"that you can see their expression unless they bring it up.\n"
+    )
+
+
+async def follow_emotions(agent: Agent, uid: str, address: str = EMOTION_WORKER_ADDRESS,
+                          min_interval: float = EMOTION_UPDATE_SECONDS, updates=None):
+    """
+    Keep `agent`'s instructions in line with the emotion worker's smoothed results for `uid`.
+
+    Updates are streamed from the worker's SubscribeEmotions RPC at `address` (the agent's
+    job processes and the worker are separate processes), or taken from `updates`, any async
+    iterator of update dicts; the instructions change only when the dominant emotion does,
+    at most once per `min_interval` seconds.
+    """
+    updates = updates if updates is not None else remote_updates(address, uid)
+    current = None
+    last_update = 0.0
+    async for update in updates:
+        if update["emotion"] == current or time.monotonic() - last_update < min_interval:
+            continue
+        await agent.update_instructions(emotion_instructions(update))
+        current = update["emotion"]
+        last_update = time.monotonic()
+        logger.info(f"Updated instructions for {uid}: {current} ({update['confidence']:.2f})")
+
+
+async def follow_participant_emotions(ctx: agents.JobContext, session: AgentSession):
+    """Follow the emotions of the student in the room; their identity is their uid"""
+    participant = await ctx.wait_for_participant()
+    await follow_emotions(session.current_agent, participant.identity)
+
+
+# Create the agent server; idle processes are prewarmed ahead of incoming jobs
+server = AgentServer(setup_fnc=prewarm, num_idle_processes=AGENT_IDLE_PROCESSES)
 
 
 @server.rtc_session()
 async def wellness_agent(ctx: agents.JobContext):
     """Main entry point for the wellness agent using Gemini Realtime"""
-    
+    latency = SessionLatency()
+
     logger.info(f"Starting LiveKit agent")
     logger.info(f"  Room: {ctx.room.name}")
     
     try:
-        # Create an agent session with Gemini Realtime Model
-        session = AgentSession(
-            llm=google.beta.realtime.RealtimeModel(
-                model="gemini-2.0-flash-exp",
-                voice="Puck",  # Options: Puck, Charon, Kore, Fenrir, Aoide
-                temperature=0.7,
-            ),
-            vad=silero.VAD.load(),  # Voice Activity Detection
-        )
-        
-        # Start the session
-        await session.start(
-            room=ctx.room,
-            agent=WellnessAssistantAgent(),
-            room_options=room_io.RoomOptions(
-                audio_input=room_io.AudioInputOptions(),
-            ),
-        )
-        
-        # Generate an initial greeting
-        await session.generate_reply(
-            instructions="Warmly greet the user and ask how they're feeling today. Be empathetic."
-        )
-        
+        session = await start_wellness_session(ctx.room, ctx.proc, latency)
         logger.info("Wellness agent started successfully")
+
+        emotions = asyncio.create_task(follow_participant_emotions(ctx, session))
+        session.on("close", lambda _: emotions.cancel())
         
     except Exception as e:
         logger.error(f"Error in agent: {e}", exc_info=True)
@@ -195,7 +312,8 @@ DEPLOYMENT_NOTES = """
    python livekit_agent_config.py start
 
 ## Features:
-- Voice Activity Detection (VAD) using Silero
+- Voice Activity Detection (VAD) using Silero, loaded once per prewarmed job process
+  (AGENT_IDLE_PROCESSES idle processes are kept ready)
 - Gemini Realtime API for speech-to-speech conversations
 - Automatic interruption handling
 - Mental health focused prompting
@@ -206,6 +324,8 @@ DEPLOYMENT_NOTES = """
 
 ## Monitoring:
 - Check logs for connection status and errors
+- "Session setup latency" logs the time from job start to the first spoken reply
+- agent_latency_harness.py measures setup latency locally with a fake room and LLM
 - Monitor Gemini API usage in Google Cloud Console
 - Track session duration and user engagement
 """
@@ -1,55 +1,97 @@
 # model_loader.py
-from collections.abc import Callable
 import io
-import torch
+import os
+import sys
 import asyncio
-import torchvision.transforms as transforms
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 
-infer_transform: Callable[[Image.Image], torch.Tensor] = transforms.Compose([
-    transforms.Resize((48, 48)),
-    transforms.Grayscale(num_output_channels=1),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.5], std=[0.5])
-])
-
-EMOTIONS = [
-"Angry",
-"Disgust",
-"Fear",
-"Happy",
-"Sad",
-"Surprise",
-"Neutral"
-]
+# Add the Emotion_Engine directory to path to import the shared inference core
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-class EmotionRecognitionModel:
-    def __init__(self, path, version:str=""):
-        self.path = path
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.version = version
-        self.model = None
+from inference_core import EMOTIONS, InferenceEngine, configure_runtime, create_backend, describe_layout, select_device
 
-    async def load(self):
-        loop = asyncio.get_running_loop()
 
-        def _load():
-            from model_def import CNN
-            model = CNN()
-            state = torch.load(self.path, map_location="cpu")
-            model.load_state_dict(state)
-            model.to(self.device)
-            model.eval()
-            return model
+class EmotionRecognitionModel:
+    """
+    Emotion model behind the gRPC worker.
 
-        self.model = await loop.run_in_executor(None, _load)
+    `backend` selects an inference_core backend: "cnn" (the 48x48 CNN at `path`, default)
+    or one of the SigLIP backends ("siglip", "siglip-int8", "siglip-student"), configured
+    through `backend_options`. Whatever the backend, probabilities are indexed like EMOTIONS.
 
+    load() applies the runtime layout (CPU pinning and thread pools, see
+    inference_core.configure_runtime) and runs inference on a dedicated executor sized to it,
+    instead of the event loop's default executor. With `mmap_weights` the CNN weights are
+    mapped read-only from `path` rather than copied, so pre-forked workers share them.
+    """
 
+    def __init__(self, path, version:str="", backend: str = "cnn", backend_options: dict | None = None,
+                 max_batch_size: int = 16, cache_size: int = 0, mmap_weights: bool = False):
+        self.path = path
+        self.device = select_device()
+        self.version = version
+        self.backend = backend
+        self.backend_options = backend_options or {}
+        self.max_batch_size = max_batch_size
+        self.cache_size = cache_size
+        self.mmap_weights = mmap_weights
+        self.engine: InferenceEngine | None = None
+        self.layout: dict | None = None
+        self.executor: ThreadPoolExecutor | None = None
+
+    @property
+    def thumbnail_input(self) -> bool:
+        """True if the model only sees a 48x48 greyscale copy of the frame anyway."""
+        return self.backend == "cnn"
+
+    def apply_runtime(self, **runtime) -> ThreadPoolExecutor:
+        """(Re)apply the runtime layout and give inference a fresh executor.
+
+        Call it from the thread that will run the event loop, so threads started later inherit
+        the CPU pinning - and again in each worker forked from a loaded model, whose executor
+        threads did not survive the fork. `runtime` is passed to configure_runtime.
+        """
+        self.layout = configure_runtime(**runtime)
+        print(f"Runtime layout: {describe_layout(self.layout)}")
+        executor = ThreadPoolExecutor(max_workers=self.layout["executor_workers"], thread_name_prefix="inference")
+        self.executor = executor
+        if self.engine is not None:
+            self.engine.executor = executor
+        return executor
+
+    def release_executor(self):
+        """Stop the inference threads, e.g. in a parent about to fork() its workers."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if self.engine is not None:
+            self.engine.executor = None
+
+    async def load(self, **runtime):
+        loop = asyncio.get_running_loop()
+        executor = self.apply_runtime(**runtime)
 
-    async def predict(self, data, showClassName:bool=False):
-        if self.model is None:
-            raise RuntimeError("Model not loaded")
-        
+        def _load():
+            if self.backend == "cnn":
+                from model_def import CNN
+                backend = create_backend("cnn", path=self.path, model_cls=CNN, device=self.device,
+                                         mmap=self.mmap_weights)
+            else:
+                backend = create_backend(self.backend, device=self.device, **self.backend_options)
+            return InferenceEngine(backend, self.max_batch_size, self.cache_size, executor)
+
+        self.engine = await loop.run_in_executor(executor, _load)
+        self.device = self.engine.backend.device
+        print(f"Loaded {self.backend} model on {self.device}")
+
+    async def warmup(self, runs: int = 2):
+        """Run a few dummy predictions so the first real frame doesn't pay for lazy init."""
+        blank = Image.new("L", (48, 48), color=128)
+        for _ in range(runs):
+            await self.predict(blank)
+
+    def _to_image(self, data) -> Image.Image:
         if isinstance(data, Image.Image):
             img = data
 
@@ -61,26 +103,24 @@ class EmotionRecognitionModel:
 
         else:
             raise TypeError("data must be PIL.Image, bytes, or filepath string")
+        return img
 
+    async def predict_proba_batch(self, data):
+        """Class probabilities (N x len(EMOTIONS), numpy float32) for a list of images."""
+        if self.engine is None:
+            raise RuntimeError("Model not loaded")
+        return await self.engine.predict_proba_async([self._to_image(d) for d in data])
 
-        tensor: torch.Tensor = infer_transform(img)
-        tensor = tensor.unsqueeze(0).to(self.device)
-
-        loop = asyncio.get_running_loop()
-
-        def _predict():
-            with torch.no_grad():
-                if self.model is None:
-                    raise RuntimeError("Model not loaded")
-                output = self.model(tensor)
-                return output.argmax(dim=1).item()
+    async def predict_proba(self, data):
+        """Class probabilities (numpy float32, indexed like EMOTIONS) for one image."""
+        return (await self.predict_proba_batch([data]))[0]
 
+    async def predict(self, data, showClassName:bool=False):
+        class_id = int((await self.predict_proba(data)).argmax())
         if showClassName is True:
-            class_id = await loop.run_in_executor(None, _predict)
             return self.toClassName(class_id)
         else:
-            return await loop.run_in_executor(None, _predict)
+            return class_id
 
     def toClassName(self, class_id: int) -> str:
         return EMOTIONS[class_id]
-
@@ -0,0 +1,105 @@
+import os
+import signal
+import time
+
+
+def process_memory(pid: int) -> dict:
+    """RSS / PSS / shared / private memory of `pid` in MB (Linux smaps_rollup; empty elsewhere)
+
+    PSS splits each shared page between the processes mapping it, so the PSS of all workers
+    adds up to what they really cost the host, unlike their RSS.
+    """
+    fields = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+              "Private_Clean": "private", "Private_Dirty": "private"}
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    key = fields[name]
+                    memory[key] = memory.get(key, 0.0) + int(rest.split()[0]) / 1024
+    except OSError:
+        pass
+    return memory
+
+
+def format_memory(pids) -> str:
+    lines = []
+    total_pss = 0.0
+    for pid in pids:
+        memory = process_memory(pid)
+        if not memory:
+            continue
+        total_pss += memory.get("pss", 0.0)
+        lines.append(
+            f"  pid {pid}: rss {memory.get('rss', 0):.0f} MB, pss {memory.get('pss', 0):.0f} MB, "
+            f"shared {memory.get('shared', 0):.0f} MB, private {memory.get('private', 0):.0f} MB"
+        )
+    lines.append(f"  total pss {total_pss:.0f} MB")
+    return "\n".join(lines)
+
+
+class PreforkSupervisor:
+    """
+    Forks `count` workers from an already loaded (and warmed-up) parent and looks after them.
+
+    Whatever the parent loaded before forking - the torch runtime, the model and its weights -
+    is shared copy-on-write with every worker instead of being loaded once per process.
+    `target(index)` runs in each child, whose exit code is its return value. SIGTERM / SIGINT
+    are forwarded to the workers, which drain as usual; memory per process is reported every
+    `report_seconds`.
+    """
+
+    def __init__(self, count: int, target, report_seconds: float = 60.0):
+        self.count = count
+        self.target = target
+        self.report_seconds = report_seconds
+        self.children = {}  # pid -> worker index
+        self._stopping = False
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                code = self.target(index) or 0
+            finally:
+                os._exit(code)
+        self.children[pid] = index
+        print(f"Started worker {index} (pid {pid})")
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> int:
+        for index in range(self.count):
+            self._spawn(index)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        next_report = time.monotonic() + min(self.report_seconds, 15.0)  # first report once workers are up
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if time.monotonic() >= next_report:
+                    print(f"Worker memory (parent pid {os.getpid()}):\n{format_memory([os.getpid(), *self.children])}")
+                    next_report = time.monotonic() + self.report_seconds
+                time.sleep(0.5)
+                continue
+            index = self.children.pop(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if self._stopping:
+                print(f"Worker {index} (pid {pid}) exited with {code}")
+            else:
+                print(f"Worker {index} (pid {pid}) died with {code}; restarting")
+                time.sleep(1.0)  # don't spin if it dies on startup
+                self._spawn(index)
+        return 0
@@ -1,64 +1,302 @@
 import asyncio
+import base64
+import io
+import json
+import os
+import time
+from PIL import Image
 from rich.console import Console
 from rich.panel import Panel
 from storage import KeyStorage
-from decryption import decrypt_image
+from decryption import decrypt_image_bytes
 from model_loader import EmotionRecognitionModel
+from dedup import DedupIndex, make_thumbnail
+from scheduler import PriorityScheduler
+from result_store import ResultStore
+from risk import RiskDetector, RiskSink
+from emotion_bus import EmotionBus
+from face_crop import FaceCropper
 # from .external_client import send_result # Circular import risk? No, external_client is separate.
 import datetime
 
 class RequestQueue:
-    def __init__(self, model: EmotionRecognitionModel, storage: KeyStorage):
+    def __init__(self, model: EmotionRecognitionModel, storage: KeyStorage, spool_path: str = "spool.jsonl",
+                 dedup: DedupIndex | None = None, result_store: ResultStore | None = None,
+                 risk: RiskDetector | None = None, risk_sink: RiskSink | None = None,
+                 bus: EmotionBus | None = None, face_cropper: FaceCropper | None = None):
         self.console = Console()
-        self.queue = asyncio.Queue()
+        self.queue = PriorityScheduler(on_expired=self._on_expired)
         self.model = model
         self.storage = storage
+        self.dedup = dedup
+        self.result_store = result_store
+        self.risk = risk
+        self.risk_sink = risk_sink
+        self.bus = bus
+        self.face_cropper = face_cropper
         self.running = False
+        # Cleared by drain(); the RPC handler refuses new frames once intake stops.
+        self.accepting = True
+        self.spool_path = spool_path
+        self.pending_writes: set[asyncio.Task] = set()
+        self._current = None
+        self._worker_task = None
+        self._drain_lock = asyncio.Lock()
+        # Key lookup + decryption cost per frame; what admission saves for each rejected frame
+        self.stats = {"decrypted": 0, "decrypt_seconds": 0.0}
 
-    async def enqueue(self, uid: str, encrypted_image: bytes):
-        await self.queue.put((uid, encrypted_image))
+    async def enqueue(self, uid: str, encrypted_image: bytes, priority: str | None = None, source: str = "") -> bool:
+        if not self.accepting:
+            return False
+        # Priority and source travel with the frame so a spooled frame is restored into the same class.
+        await self.queue.put((uid, encrypted_image, priority, source), priority=priority, source=source or uid)
+        return True
+
+    def _on_expired(self, item, priority: str):
+        uid, encrypted_image, _, _ = item
+        print(f"Dropping expired {priority} frame for {uid}")
+        if self.dedup:
+            self._forget(uid, self.dedup.fingerprint(encrypted_image))
 
     async def start_worker(self):
         self.running = True
+        self._worker_task = asyncio.current_task()
         print("Worker started")
         while self.running:
+            item = await self.queue.get()
+            if item is None:
+                # Queue closed by drain() and everything queued has been handled.
+                break
+            self._current = item
+            uid, encrypted_image, _, _ = item
             try:
-                uid, encrypted_image = await self.queue.get()
                 await self.process_request(uid, encrypted_image)
-                self.queue.task_done()
             except Exception as e:
                 print(f"Worker error: {e}")
+            finally:
+                self._current = None
+                self.queue.task_done()
+        self.running = False
+        print("Worker stopped")
 
     async def process_request(self, uid: str, encrypted_image: bytes):
         print(f"Processing request for {uid}")
-        
+        digest = self.dedup.fingerprint(encrypted_image) if self.dedup else None
+
         # 1. Get Key
+        start = time.perf_counter()
         key = self.storage.get_key(uid)
         if not key:
             print(f"Key not found for {uid}")
+            self._forget(uid, digest)
             return
 
         # 2. Decrypt
         try:
-            image = decrypt_image(encrypted_image, key)
+            data = decrypt_image_bytes(encrypted_image, key)
+            image = Image.open(io.BytesIO(data))
         except Exception as e:
             print(f"Decryption failed for {uid}: {e}")
+            self._forget(uid, digest)
             return
+        self.stats["decrypted"] += 1
+        self.stats["decrypt_seconds"] += time.perf_counter() - start
+
+        if self.face_cropper:
+            # Only the face region is decoded and downscaled; frames without a face go in whole.
+            # Runs on the inference executor like predict_proba, so RPCs are served meanwhile; the
+            # single worker loop means one crop at a time, which FaceCropper's box cache relies on.
+            loop = asyncio.get_running_loop()
+            face = await loop.run_in_executor(self.model.executor, self.face_cropper.crop, uid, data, image.size)
+            if face is not None:
+                image = face
 
-        # 3. Predict
+        # 3. Predict (or reuse the last result if the frame is a near-duplicate)
         try:
-            # model.predict is async
-            # model.predict is async
-            class_name = await self.model.predict(image, showClassName=True)
-            self.console.print(Panel(f"[bold green]EMOTION DETECTED: {class_name}[/bold green]", title=f"Prediction for {uid}", expand=False))
+            prior = None
+            near_dup = self.dedup is not None and self.dedup.near_dup_threshold > 0
+            if near_dup:
+                thumbnail = make_thumbnail(image)
+                if self.model.thumbnail_input:
+                    # The CNN only sees 48x48 grey anyway, so predict on the thumbnail we compare.
+                    image = thumbnail
+                prior = self.dedup.lookup_near(uid, thumbnail)
+            if prior is not None:
+                class_id, probs = prior
+                class_name = self.model.toClassName(class_id)
+                print(f"Near-duplicate frame for {uid}, reusing {class_name}")
+            else:
+                # model.predict_proba is async
+                probs = await self.model.predict_proba(image)
+                class_id = int(probs.argmax())
+                class_name = self.model.toClassName(class_id)
+                self.console.print(Panel(f"[bold green]EMOTION DETECTED: {class_name}[/bold green]", title=f"Prediction for {uid}", expand=False))
+                if near_dup:
+                    self.dedup.remember_thumbnail(uid, thumbnail, (class_id, probs))
         except Exception as e:
             print(f"Prediction failed for {uid}: {e}")
+            self._forget(uid, digest)
             return
 
+        if self.dedup:
+            self.dedup.resolve(uid, digest, class_name)
+        if self.result_store:
+            self.result_store.append(uid, class_id, probs)
+        if self.bus:
+            # Live sessions for this uid (SubscribeEmotions) get the smoothed state pushed to them
+            self.bus.publish_prediction(uid, probs)
+        if self.risk:
+            event = self.risk.observe(uid, probs)
+            if event is not None and self.risk_sink is not None:
+                self._background(self.risk_sink.emit(event))
+
         # 4. Send Result
+        # The write runs in the background so a slow sink doesn't hold up the next frame;
+        # drain() waits for whatever is still pending.
+        timestamp = datetime.datetime.now().isoformat()
+        self._background(self._send_result(uid, class_name, timestamp))
+
+    def _background(self, coro):
+        task = asyncio.create_task(coro)
+        self.pending_writes.add(task)
+        task.add_done_callback(self.pending_writes.discard)
+
+    def decrypt_cost(self) -> float:
+        """Mean seconds per frame spent on key lookup and decryption"""
+        return self.stats["decrypt_seconds"] / self.stats["decrypted"] if self.stats["decrypted"] else 0.0
+
+    def _forget(self, uid: str, digest):
+        if self.dedup and digest is not None:
+            self.dedup.forget(uid, digest)
+
+    async def _send_result(self, uid: str, class_name: str, timestamp: str):
         try:
             from supabase_client import save_user_emotion
-            timestamp = datetime.datetime.now().isoformat()
             await save_user_emotion(uid, class_name, timestamp)
         except Exception as e:
             print(f"Failed to send result for {uid}: {e}")
+
+    async def flush_writes(self, timeout: float) -> int:
+        """Wait up to `timeout` seconds for background sink writes. Returns how many were still pending."""
+        pending = set(self.pending_writes)
+        if not pending:
+            return 0
+        _, not_done = await asyncio.wait(pending, timeout=timeout)
+        if not_done:
+            print(f"{len(not_done)} result writes still pending after flush timeout")
+        return len(not_done)
+
+    async def drain(self, deadline: float) -> dict:
+        """
+        Stop intake, let the worker finish queued frames for up to `deadline` seconds,
+        spool whatever is left (including an interrupted in-flight frame) and flush sink writes.
+        Frames that could not be spooled are reported as "lost", not processed.
+        """
+        async with self._drain_lock:
+            self.accepting = False
+            loop = asyncio.get_running_loop()
+            stop_at = loop.time() + deadline
+            # The in-flight frame counts too: it is either finished or spooled below.
+            queued = self.queue.qsize() + (self._current is not None)
+            expired_before = self._expired_count()
+            print(f"Draining {queued} queued frames (deadline {deadline:.1f}s)")
+
+            leftovers = []
+            worker = self._worker_task
+            if worker is not None and not worker.done():
+                # Once closed, the worker exits as soon as the queued frames are done.
+                self.queue.close()
+                try:
+                    await asyncio.wait_for(asyncio.shield(worker), timeout=max(0.0, stop_at - loop.time()))
+                except asyncio.TimeoutError:
+                    if self._current is not None:
+                        leftovers.append(self._current)
+                    worker.cancel()
+                    try:
+                        await worker
+                    except asyncio.CancelledError:
+                        pass
+            self.running = False
+
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                self.queue.task_done()
+                leftovers.append(item)
+
+            lost = self._spool(leftovers)
+            spooled = len(leftovers) - lost
+            # Frames the scheduler dropped past their deadline were neither processed nor spooled.
+            expired = self._expired_count() - expired_before
+            # Give pending writes at least a short grace period even if the deadline is spent.
+            unflushed = await self.flush_writes(max(1.0, stop_at - loop.time()))
+            summary = {
+                "processed": queued - spooled - lost - expired,
+                "expired": expired,
+                "spooled": spooled,
+                "lost": lost,
+                "unflushed_writes": unflushed,
+            }
+            print(f"Drain complete: {summary}")
+            return summary
+
+    def _expired_count(self) -> int:
+        return sum(stats["expired"] for stats in self.queue.stats.values())
+
+    def _spool(self, items) -> int:
+        """Append `items` to the spool file; returns how many frames were lost (0 or all of them)"""
+        if not items:
+            return 0
+        try:
+            lines = "".join(json.dumps({
+                "uid": uid,
+                "encrypted_image": base64.b64encode(encrypted_image).decode("ascii"),
+                "priority": priority,
+                "source": source,
+            }) + "\n" for uid, encrypted_image, priority, source in items)
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            print(f"Spooled {len(items)} frames to {self.spool_path}")
+            return 0
+        except Exception as e:
+            print(f"Failed to spool {len(items)} frames, they are lost: {e}")
+            return len(items)
+
+    async def restore_spool(self) -> int:
+        """
+        Re-queue frames spooled by a previous drain. The whole file is parsed and removed before
+        anything is queued, so a bad line or a crash mid-restore can't queue frames twice on the
+        next start. Lines that don't parse are kept in `<spool>.bad`.
+        """
+        if not os.path.exists(self.spool_path):
+            return 0
+        entries, bad = [], []
+        try:
+            with open(self.spool_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                        # Spools written before priority/source were recorded restore as normal class, per uid.
+                        entries.append((entry["uid"], base64.b64decode(entry["encrypted_image"]),
+                                        entry.get("priority"), entry.get("source", "")))
+                    except (ValueError, KeyError, TypeError) as e:
+                        print(f"Skipping bad spool line: {e}")
+                        bad.append(line if line.endswith("\n") else line + "\n")
+            if bad:
+                with open(self.spool_path + ".bad", "a", encoding="utf-8") as f:
+                    f.writelines(bad)
+            os.remove(self.spool_path)
+        except OSError as e:
+            print(f"Failed to restore spool {self.spool_path}: {e}")
+            return 0
+        for uid, encrypted_image, priority, source in entries:
+            await self.queue.put((uid, encrypted_image, priority, source), priority=priority, source=source or uid)
+        if entries:
+            print(f"Restored {len(entries)} spooled frames")
+        if bad:
+            print(f"Kept {len(bad)} unreadable spool lines in {self.spool_path}.bad")
+        return len(entries)
@@ -0,0 +1,134 @@
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NUM_CLASSES = 7
+
+# Fixed-width, packed record: 28 bytes per prediction.
+RECORD_DTYPE = np.dtype([
+    ("uid_idx", "<u4"),
+    ("ts", "<f8"),  # unix seconds
+    ("class_id", "u1"),
+    ("probs", "<f2", (NUM_CLASSES,)),
+    ("_pad", "u1"),
+])
+
+
+class ResultStore:
+    """
+    Memory-mapped ring store of recent predictions per uid.
+
+    Each uid gets a fixed ring of `slots_per_uid` records inside one preallocated file, so
+    append is O(1) (write at the ring head) and a range scan is a slice plus a binary search
+    on the timestamps. The uid -> ring index mapping lives in a small SQLite file next to the
+    data, and ring heads/counts are memory-mapped too, so the store survives restarts.
+    With the defaults (32768 uids x 256 slots) the data file is ~235 MB for ~8.4M predictions.
+    Once every ring is taken, a new uid reclaims the ring of the least recently written uid.
+    """
+
+    def __init__(self, directory: str, max_uids: int = 32768, slots_per_uid: int = 256):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.db")
+        self.max_uids, self.slots_per_uid = self._init_index(max_uids, slots_per_uid)
+
+        self.records = self._open_memmap("records.dat", RECORD_DTYPE, (self.max_uids, self.slots_per_uid))
+        # [uid_idx] -> (next write slot, number of valid records)
+        self.heads = self._open_memmap("heads.dat", np.dtype("<u4"), (self.max_uids, 2))
+        # uid -> ring index, least recently written first
+        self.uid_index = self._load_uids()
+        self.stats = {"evicted": 0}
+
+    def _init_index(self, max_uids: int, slots_per_uid: int):
+        with sqlite3.connect(self.index_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS uids (uid TEXT PRIMARY KEY, idx INTEGER NOT NULL)")
+            cursor.execute("INSERT OR IGNORE INTO meta VALUES ('max_uids', ?), ('slots_per_uid', ?)", (max_uids, slots_per_uid))
+            conn.commit()
+            meta = dict(cursor.execute("SELECT name, value FROM meta").fetchall())
+        # An existing store keeps its original geometry.
+        return meta["max_uids"], meta["slots_per_uid"]
+
+    def _open_memmap(self, name: str, dtype: np.dtype, shape: tuple):
+        path = os.path.join(self.directory, name)
+        mode = "r+" if os.path.exists(path) else "w+"
+        return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+    def _last_written(self, idx: int) -> float:
+        head, count = (int(v) for v in self.heads[idx])
+        if count == 0:
+            return 0.0
+        return float(self.records[idx, (head - 1) % self.slots_per_uid]["ts"])
+
+    def _load_uids(self) -> OrderedDict:
+        with sqlite3.connect(self.index_path) as conn:
+            rows = conn.execute("SELECT uid, idx FROM uids").fetchall()
+        # Rebuild the write order from each ring's newest record.
+        rows.sort(key=lambda row: self._last_written(row[1]))
+        return OrderedDict(rows)
+
+    def _uid_idx(self, uid: str, create: bool):
+        idx = self.uid_index.get(uid)
+        if idx is None and create:
+            with sqlite3.connect(self.index_path) as conn:
+                if len(self.uid_index) < self.max_uids:
+                    idx = len(self.uid_index)
+                else:
+                    evicted, idx = self.uid_index.popitem(last=False)
+                    conn.execute("DELETE FROM uids WHERE uid = ?", (evicted,))
+                    self.heads[idx] = (0, 0)
+                    if not self.stats["evicted"]:
+                        logger.warning("Result store full (%d uids); reclaiming the least recently written rings",
+                                       self.max_uids)
+                    self.stats["evicted"] += 1
+                    logger.debug("Result store full; reclaimed ring %d from %s for %s", idx, evicted, uid)
+                conn.execute("INSERT INTO uids (uid, idx) VALUES (?, ?)", (uid, idx))
+                conn.commit()
+            self.uid_index[uid] = idx
+        return idx
+
+    def append(self, uid: str, class_id: int, probs, timestamp: float | None = None) -> bool:
+        idx = self._uid_idx(uid, create=True)
+        self.uid_index.move_to_end(uid)
+        head, count = self.heads[idx]
+        record = self.records[idx, head]
+        record["uid_idx"] = idx
+        record["ts"] = time.time() if timestamp is None else timestamp
+        record["class_id"] = class_id
+        record["probs"] = probs
+        self.heads[idx, 0] = (head + 1) % self.slots_per_uid
+        self.heads[idx, 1] = min(count + 1, self.slots_per_uid)
+        return True
+
+    def scan(self, uid: str, start: float | None = None, end: float | None = None) -> np.ndarray:
+        """Records for `uid` in time order, optionally limited to start <= ts < end."""
+        idx = self._uid_idx(uid, create=False)
+        if idx is None:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        head, count = (int(v) for v in self.heads[idx])
+        ring = self.records[idx]
+        if count < self.slots_per_uid:
+            rows = np.array(ring[:count])
+        else:
+            rows = np.concatenate([ring[head:], ring[:head]])
+        lo = 0 if start is None else np.searchsorted(rows["ts"], start, side="left")
+        hi = len(rows) if end is None else np.searchsorted(rows["ts"], end, side="left")
+        return rows[lo:hi]
+
+    def latest(self, uid: str):
+        """Most recent record for `uid`, or None."""
+        idx = self._uid_idx(uid, create=False)
+        if idx is None or self.heads[idx, 1] == 0:
+            return None
+        return self.records[idx, (int(self.heads[idx, 0]) - 1) % self.slots_per_uid].copy()
+
+    def flush(self):
+        self.records.flush()
+        self.heads.flush()
@@ -0,0 +1,197 @@
+import datetime
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Add the Emotion_Engine directory to path to import the shared inference core
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from inference_core import EMOTIONS
+
+NEGATIVE_EMOTIONS = ("Sad", "Fear", "Angry")
+NEGATIVE_IDX = [EMOTIONS.index(name) for name in NEGATIVE_EMOTIONS]
+
+# Counselor portal riskLevel, lowest score (0-100) first
+RISK_LEVELS = (("MODERATE", 0.0), ("HIGH", 65.0), ("CRITICAL", 80.0))
+LEVEL_RANK = {name: rank for rank, (name, _) in enumerate(RISK_LEVELS)}
+
+TRIGGER_SUSTAINED = "EMOTION_SUSTAINED_NEGATIVE"
+TRIGGER_SHIFT = "EMOTION_NEGATIVE_SHIFT"
+
+
+def risk_level(score: float) -> str:
+    level = RISK_LEVELS[0][0]
+    for name, floor in RISK_LEVELS:
+        if score >= floor:
+            level = name
+    return level
+
+
+class _RiskState:
+    """Constant-size state for one uid."""
+
+    __slots__ = ("probs", "cusum", "samples", "last_seen", "last_alert", "last_level")
+
+    def __init__(self):
+        self.probs = None  # time-decayed mean of the predicted distribution
+        self.cusum = 0.0
+        self.samples = 0
+        self.last_seen = None
+        self.last_alert = None
+        self.last_level = None
+
+
+class RiskDetector:
+    """
+    Streaming detector for sustained negative affect, fed one prediction at a time.
+
+    For every uid it keeps an exponentially time-decayed emotion distribution and a
+    one-sided CUSUM over the negative mass (Sad + Fear + Angry), so state is O(1) per uid
+    and an event is raised within a few frames of the signal appearing:
+
+    - EMOTION_SUSTAINED_NEGATIVE: the decayed negative mass stays above `sustained_threshold`
+    - EMOTION_NEGATIVE_SHIFT: the CUSUM of (negative - baseline - slack) exceeds `cusum_threshold`
+
+    Events for a uid are debounced for `cooldown_seconds` unless the risk level goes up.
+    Uids idle for `idle_seconds` (or beyond `max_uids`) are forgotten.
+    """
+
+    def __init__(self, half_life_seconds: float = 30.0, sustained_threshold: float = 0.6,
+                 baseline: float = 0.3, slack: float = 0.1, cusum_threshold: float = 4.0,
+                 min_samples: int = 5, cooldown_seconds: float = 600.0, idle_seconds: float = 3600.0,
+                 max_uids: int = 100000):
+        self.half_life_seconds = half_life_seconds
+        self.sustained_threshold = sustained_threshold
+        self.baseline = baseline
+        self.slack = slack
+        self.cusum_threshold = cusum_threshold
+        self.min_samples = min_samples
+        self.cooldown_seconds = cooldown_seconds
+        self.idle_seconds = idle_seconds
+        self.max_uids = max_uids
+        self._states = OrderedDict()  # uid -> _RiskState, least recently seen first
+        self.stats = {"observed": 0, "events": 0, "debounced": 0}
+
+    def _evict(self, now: float):
+        while self._states:
+            uid, state = next(iter(self._states.items()))
+            if now - state.last_seen < self.idle_seconds and len(self._states) <= self.max_uids:
+                break
+            self._states.popitem(last=False)
+
+    def observe(self, uid: str, probs, now: float | None = None):
+        """Fold in one prediction (probabilities indexed like EMOTIONS). Returns an event dict or None."""
+        now = time.time() if now is None else now
+        probs = np.asarray(probs, dtype=np.float64)
+        state = self._states.get(uid)
+        if state is None:
+            state = self._states[uid] = _RiskState()
+        else:
+            self._states.move_to_end(uid)
+        self.stats["observed"] += 1
+
+        negative = float(probs[NEGATIVE_IDX].sum())
+        if state.probs is None:
+            state.probs = probs.copy()
+        else:
+            alpha = 1.0 - 0.5 ** (max(now - state.last_seen, 0.0) / self.half_life_seconds)
+            state.probs += alpha * (probs - state.probs)
+        state.cusum = max(0.0, state.cusum + negative - self.baseline - self.slack)
+        state.samples += 1
+        state.last_seen = now
+        self._evict(now)
+
+        if state.samples < self.min_samples:
+            return None
+        sustained = float(state.probs[NEGATIVE_IDX].sum())
+        if sustained >= self.sustained_threshold:
+            trigger = TRIGGER_SUSTAINED
+        elif state.cusum >= self.cusum_threshold:
+            trigger = TRIGGER_SHIFT
+        else:
+            return None
+
+        score = round(100.0 * max(sustained, negative if trigger == TRIGGER_SHIFT else 0.0), 1)
+        level = risk_level(score)
+        if (state.last_alert is not None and now - state.last_alert < self.cooldown_seconds
+                and LEVEL_RANK[level] <= LEVEL_RANK[state.last_level]):
+            self.stats["debounced"] += 1
+            return None
+
+        state.last_alert = now
+        state.last_level = level
+        state.cusum = 0.0
+        self.stats["events"] += 1
+        return {
+            "uid": uid,
+            "riskScore": score,
+            "riskLevel": level,
+            "triggerType": trigger,
+            "emotionSnapshot": {name: round(float(p), 4) for name, p in zip(EMOTIONS, state.probs)},
+            "timestamp": datetime.datetime.fromtimestamp(now, datetime.timezone.utc).isoformat(),
+        }
+
+    def reset(self, uid: str):
+        self._states.pop(uid, None)
+
+
+class RiskSink:
+    """Where escalation events go. Subclasses override emit()."""
+
+    async def emit(self, event: dict) -> bool:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class LogSink(RiskSink):
+    async def emit(self, event: dict) -> bool:
+        print(f"Risk escalation for {event['uid']}: {event['riskLevel']} {event['riskScore']} ({event['triggerType']})")
+        return True
+
+
+class WebhookSink(RiskSink):
+    """
+    POSTs events to the counselor portal's /api/webhooks/risk-escalation endpoint.
+
+    The portal needs a student name and email the worker doesn't have; `student_lookup`
+    (uid -> (name, email)) can supply them, otherwise the uid stands in for the name.
+    """
+
+    def __init__(self, url: str, api_key: str, timeout: float = 5.0, student_lookup=None):
+        import httpx
+
+        self.url = url
+        self.student_lookup = student_lookup
+        self.client = httpx.AsyncClient(timeout=timeout, headers={"x-api-key": api_key})
+
+    def payload(self, event: dict) -> dict:
+        name, email = self.student_lookup(event["uid"]) if self.student_lookup else (event["uid"], "")
+        return {
+            "studentId": event["uid"],
+            "studentName": name,
+            "studentEmail": email,
+            "riskScore": event["riskScore"],
+            "riskLevel": event["riskLevel"],
+            "triggerType": event["triggerType"],
+            "emotionSnapshot": event["emotionSnapshot"],
+            "timestamp": event["timestamp"],
+        }
+
+    async def emit(self, event: dict) -> bool:
+        try:
+            response = await self.client.post(self.url, json=self.payload(event))
+            if response.status_code >= 400:
+                print(f"Risk webhook rejected event for {event['uid']}: {response.status_code} {response.text}")
+                return False
+            return True
+        except Exception as e:
+            print(f"Risk webhook failed for {event['uid']}: {e}")
+            return False
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,329 @@
+import asyncio
+import bisect
+import hashlib
+import os
+import signal
+import sys
+
+import grpc
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+
+# Add proto directory to path to import generated files
+sys.path.append(os.path.join(os.path.dirname(__file__), '../proto'))
+
+import interface_pb2
+import interface_pb2_grpc
+
+from storage import KeyStorage
+
+ROUTER_PORT = int(os.getenv("ROUTER_PORT", "50050"))
+# Comma-separated host:port list of emotion worker nodes (service.py instances)
+EMOTION_NODES = [n.strip() for n in os.getenv("EMOTION_NODES", "localhost:50051").split(",") if n.strip()]
+VIRTUAL_NODES = int(os.getenv("ROUTER_VIRTUAL_NODES", "64"))
+HEALTH_CHECK_INTERVAL = float(os.getenv("ROUTER_HEALTH_INTERVAL", "2"))
+FORWARD_TIMEOUT = float(os.getenv("ROUTER_FORWARD_TIMEOUT", "5"))
+# Key pushes in flight at once while rebalancing
+REBALANCE_CONCURRENCY = int(os.getenv("ROUTER_REBALANCE_CONCURRENCY", "32"))
+
+SERVICE_NAME = interface_pb2.DESCRIPTOR.services_by_name["EmotionService"].full_name
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes, so a join/leave only moves ~1/N of the uids."""
+
+    def __init__(self, nodes=(), virtual_nodes: int = VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.nodes = set()
+        self._points = []  # sorted hashes
+        self._owners = []  # node for each point
+        for node in nodes:
+            self.add(node)
+
+    def _rebuild(self):
+        ring = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(self.virtual_nodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def add(self, node: str):
+        if node not in self.nodes:
+            self.nodes.add(node)
+            self._rebuild()
+
+    def remove(self, node: str):
+        if node in self.nodes:
+            self.nodes.discard(node)
+            self._rebuild()
+
+    def copy(self) -> "HashRing":
+        return HashRing(self.nodes, self.virtual_nodes)
+
+    def owner(self, uid: str):
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(uid)) % len(self._points)
+        return self._owners[index]
+
+
+class ShardRouter(interface_pb2_grpc.EmotionServiceServicer):
+    """
+    EmotionService front end that shards uids across worker nodes.
+
+    Keys and frames for a uid always go to the same node, so each node's local KeyStorage
+    and in-memory queue stay consistent. The router keeps its own copy of every key (any
+    KeyStorage-compatible store) so that when nodes join or leave it can re-send keys for
+    the uids that moved to their new owner. Until a moved uid's key has reached the new
+    owner, its frames keep going to the previous owner if that node is still up.
+    """
+
+    def __init__(self, nodes, key_store, health_servicer=None):
+        self.configured_nodes = list(nodes)
+        self.key_store = key_store
+        self.health_servicer = health_servicer
+        self.ring = HashRing()
+        self._channels = {}
+        self._stubs = {}
+        self._rebalance_lock = asyncio.Lock()
+        # uid -> (previous owner, new owner) while the key is on its way to the new owner
+        self._handoff = {}
+        self._transfers: set[asyncio.Task] = set()
+        self._in_transit = set()  # uids with a key push in flight
+        self._streams = {}  # proxied SubscribeEmotions call -> (uid, node)
+        self._transfer_slots = asyncio.Semaphore(REBALANCE_CONCURRENCY)
+
+    def _stub(self, node: str):
+        if node not in self._stubs:
+            # Short reconnect backoff so a restarted node is noticed within a few health checks.
+            self._channels[node] = grpc.aio.insecure_channel(node, options=[
+                ("grpc.initial_reconnect_backoff_ms", 500),
+                ("grpc.max_reconnect_backoff_ms", 2000),
+            ])
+            self._stubs[node] = interface_pb2_grpc.EmotionServiceStub(self._channels[node])
+        return self._stubs[node]
+
+    async def add_node(self, node: str):
+        async with self._rebalance_lock:
+            if node in self.ring.nodes:
+                return
+            old_ring = self.ring.copy()
+            self.ring.add(node)
+            print(f"Node joined: {node} ({len(self.ring.nodes)} active)")
+            await self._rebalance(old_ring)
+
+    async def remove_node(self, node: str):
+        async with self._rebalance_lock:
+            if node not in self.ring.nodes:
+                return
+            old_ring = self.ring.copy()
+            self.ring.remove(node)
+            print(f"Node left: {node} ({len(self.ring.nodes)} active)")
+            await self._rebalance(old_ring)
+
+    async def _rebalance(self, old_ring: HashRing):
+        """
+        Record a handoff for every uid whose owner changed and start pushing their keys.
+        Called with the ring already swapped; the pushes run concurrently in the background,
+        so the lock (and _forward's remove_node) never waits on a slow node.
+        """
+        moves = []
+        for uid, _ in self.key_store.items():
+            new_owner = self.ring.owner(uid)
+            if new_owner is None or new_owner == old_ring.owner(uid):
+                continue
+            # A uid already mid-handoff keeps the node that actually holds its key as fallback.
+            previous, _ = self._handoff.get(uid, (old_ring.owner(uid), None))
+            self._handoff[uid] = (previous, new_owner)
+            moves.append((uid, new_owner))
+        await self._update_health()
+        self._start_transfers(moves)
+        self._end_moved_streams()
+
+    def _start_transfers(self, moves):
+        if not moves:
+            return
+        task = asyncio.create_task(self._transfer_keys(moves))
+        self._transfers.add(task)
+        task.add_done_callback(self._transfers.discard)
+
+    def retry_handoffs(self):
+        """Re-push keys for handoffs whose earlier push failed"""
+        self._start_transfers([
+            (uid, node) for uid, (_, node) in self._handoff.items() if uid not in self._in_transit
+        ])
+
+    async def _transfer_keys(self, moves):
+        results = await asyncio.gather(*(self._transfer_key(uid, node) for uid, node in moves))
+        print(f"Rebalanced {sum(results)}/{len(moves)} keys")
+
+    async def _transfer_key(self, uid: str, node: str) -> bool:
+        self._in_transit.add(uid)
+        try:
+            async with self._transfer_slots:
+                if self._handoff.get(uid, (None, None))[1] != node:
+                    return False  # superseded by a later rebalance or a fresh key from the client
+                # Read the key now, not when the move was planned, in case the client rotated it.
+                key = self.key_store.get_key(uid)
+                try:
+                    await self._stub(node).SendDecryptionKey(
+                        interface_pb2.KeyRequest(uid=uid, key=key), timeout=FORWARD_TIMEOUT
+                    )
+                except grpc.aio.AioRpcError as e:
+                    # Frames keep going to the previous owner while it is up; monitor_nodes
+                    # retries the push on its next round.
+                    print(f"Failed to move key for {uid} to {node}: {e.code()}")
+                    return False
+                if self._handoff.get(uid, (None, None))[1] == node:
+                    del self._handoff[uid]
+                    self._end_moved_streams()
+                return True
+        finally:
+            self._in_transit.discard(uid)
+
+    def _end_moved_streams(self):
+        """End emotion streams whose uid now routes elsewhere; subscribers reconnect to the new node"""
+        for call, (uid, node) in list(self._streams.items()):
+            if self._route(uid) != node:
+                call.cancel()
+
+    def _route(self, uid: str):
+        """Owner for a frame: the previous owner while the uid's key is still in transit"""
+        handoff = self._handoff.get(uid)
+        if handoff is not None and handoff[0] in self.ring.nodes:
+            return handoff[0]
+        return self.ring.owner(uid)
+
+    async def _update_health(self):
+        if self.health_servicer is None:
+            return
+        status = (
+            health_pb2.HealthCheckResponse.SERVING
+            if self.ring.nodes
+            else health_pb2.HealthCheckResponse.NOT_SERVING
+        )
+        for name in ("", SERVICE_NAME):
+            await self.health_servicer.set(name, status)
+
+    async def monitor_nodes(self):
+        """Track node membership from each node's gRPC health status."""
+        while True:
+            for node in self.configured_nodes:
+                self._stub(node)
+                try:
+                    response = await health_pb2_grpc.HealthStub(self._channels[node]).Check(
+                        health_pb2.HealthCheckRequest(service=SERVICE_NAME), timeout=FORWARD_TIMEOUT
+                    )
+                    serving = response.status == health_pb2.HealthCheckResponse.SERVING
+                except grpc.aio.AioRpcError:
+                    serving = False
+                if serving:
+                    await self.add_node(node)
+                else:
+                    await self.remove_node(node)
+            self.retry_handoffs()
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+    async def _forward(self, method: str, request, context):
+        # A node that is draining answers UNAVAILABLE; take it out and retry on the new owner.
+        for _ in range(2):
+            node = self.ring.owner(request.uid) if method == "SendDecryptionKey" else self._route(request.uid)
+            if node is None:
+                await context.abort(grpc.StatusCode.UNAVAILABLE, "No emotion worker nodes available")
+            try:
+                return await getattr(self._stub(node), method)(request, timeout=FORWARD_TIMEOUT)
+            except grpc.aio.AioRpcError as e:
+                if e.code() != grpc.StatusCode.UNAVAILABLE:
+                    await context.abort(e.code(), e.details() or "")
+                print(f"Node {node} unavailable for {method}, removing from ring")
+                await self.remove_node(node)
+        await context.abort(grpc.StatusCode.UNAVAILABLE, "Owner node unavailable")
+
+    async def SendDecryptionKey(self, request, context):
+        self.key_store.save_key(request.uid, request.key)
+        response = await self._forward("SendDecryptionKey", request, context)
+        # The new owner has the current key now; the previous owner's copy may be stale.
+        self._handoff.pop(request.uid, None)
+        return response
+
+    async def SendEncryptedImage(self, request, context):
+        return await self._forward("SendEncryptedImage", request, context)
+
+    async def Predict(self, request, context):
+        return await self._forward("Predict", request, context)
+
+    async def SubscribeEmotions(self, request, context):
+        """Proxy the stream from the node the uid's frames go to"""
+        node = self._route(request.uid)
+        if node is None:
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "No emotion worker nodes available")
+        call = self._stub(node).SubscribeEmotions(request)
+        self._streams[call] = (request.uid, node)
+        try:
+            async for update in call:
+                yield update
+        except asyncio.CancelledError:
+            if not call.cancelled():
+                raise  # the subscriber went away
+            # Cancelled by _end_moved_streams: end normally so the subscriber reconnects
+        except grpc.aio.AioRpcError as e:
+            await context.abort(e.code(), e.details() or "")
+        finally:
+            self._streams.pop(call, None)
+            call.cancel()
+
+    async def Drain(self, request, context):
+        """Drain every active node."""
+        results = await asyncio.gather(
+            *(self._stub(node).Drain(request) for node in sorted(self.ring.nodes)),
+            return_exceptions=True,
+        )
+        messages = []
+        success = True
+        for node, result in zip(sorted(self.ring.nodes), results):
+            if isinstance(result, Exception):
+                success = False
+                messages.append(f"{node}: {result}")
+            else:
+                success = success and result.success
+                messages.append(f"{node}: {result.message}")
+        return interface_pb2.StatusResponse(success=success, message="; ".join(messages))
+
+
+async def serve_router(port: int = ROUTER_PORT, nodes=EMOTION_NODES):
+    key_store = KeyStorage(os.getenv("ROUTER_KEYS_DB_PATH", "router_keys.db"))
+    health_servicer = health.aio.HealthServicer()
+    router = ShardRouter(nodes, key_store, health_servicer)
+    await router._update_health()
+
+    server = grpc.aio.server()
+    interface_pb2_grpc.add_EmotionServiceServicer_to_server(router, server)
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    bound = server.add_insecure_port(f"0.0.0.0:{port}")
+    if bound == 0:
+        raise RuntimeError(f"Failed to bind to port {port} on 0.0.0.0")
+    print(f"Shard router running on port {port} for nodes: {', '.join(nodes)}")
+
+    await server.start()
+    monitor_task = asyncio.create_task(router.monitor_nodes())
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, AttributeError):
+            pass
+    try:
+        await stop_event.wait()
+    finally:
+        monitor_task.cancel()
+        # In-flight forwards finish; the nodes drain on their own SIGTERM.
+        await server.stop(grace=5)
+
+if __name__ == "__main__":
+    asyncio.run(serve_router())
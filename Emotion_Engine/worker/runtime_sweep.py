@@ -0,0 +1,132 @@
+"""
+Sweep worker-process x intra-op thread splits for the CNN on this host.
+
+For every split of `--cores` into P processes x T torch threads (P * T = cores), P pinned
+processes run back-to-back batches of each `--batch-sizes` for `--seconds` and the sweep
+reports aggregate images/s and per-batch latency, i.e. how much to spend on batch
+parallelism (more workers, see WORKER_COUNT) versus intra-op parallelism
+(INFERENCE_THREADS). Use the winning split for the worker's runtime configuration.
+
+Usage:
+    python runtime_sweep.py --cores 32 --batch-sizes 1 8 --seconds 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "models", "model_v1.pth")
+
+
+def _child(args):
+    import torch
+    from PIL import Image
+
+    from inference_core import configure_runtime, create_backend
+    from model_def import CNN
+
+    layout = configure_runtime(args.worker_index, args.worker_count, args.threads, 1)
+    path = args.model
+    if not os.path.exists(path):
+        # Timing doesn't depend on the weights
+        path = os.path.join(tempfile.mkdtemp(), "cnn.pth")
+        torch.save(CNN().state_dict(), path)
+    backend = create_backend("cnn", path=path, model_cls=CNN, device=torch.device("cpu"))
+
+    rng = np.random.default_rng(args.worker_index)
+    images = [Image.fromarray(rng.integers(0, 255, (48, 48), dtype=np.uint8)) for _ in range(args.batch_size)]
+    for _ in range(3):
+        backend.predict_proba(images)
+
+    # All processes start measuring together
+    time.sleep(max(0.0, args.start_at - time.time()))
+    latencies = []
+    stop_at = time.perf_counter() + args.seconds
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        backend.predict_proba(images)
+        latencies.append(time.perf_counter() - start)
+    print(json.dumps({"layout": layout, "batches": len(latencies), "latencies": latencies}))
+
+
+def run_split(processes: int, threads: int, batch_size: int, seconds: float, model: str) -> dict:
+    start_at = time.time() + 10.0  # time for every child to load torch and warm up
+    children = [
+        subprocess.Popen(
+            [sys.executable, __file__, "--child", "--worker-index", str(i), "--worker-count", str(processes),
+             "--threads", str(threads), "--batch-size", str(batch_size), "--seconds", str(seconds),
+             "--start-at", str(start_at), "--model", model],
+            stdout=subprocess.PIPE, text=True,
+        )
+        for i in range(processes)
+    ]
+    results = [json.loads(child.communicate()[0].strip().splitlines()[-1]) for child in children]
+    latencies = np.concatenate([r["latencies"] for r in results]) * 1000
+    return {
+        "processes": processes,
+        "threads": threads,
+        "batch_size": batch_size,
+        "images_per_s": sum(r["batches"] for r in results) * batch_size / seconds,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "cpus": [r["layout"]["cpus"] for r in results],
+    }
+
+
+def splits(cores: int):
+    return [(p, cores // p) for p in range(1, cores + 1) if cores % p == 0]
+
+
+def format_table(rows):
+    lines = [
+        "| processes x threads | batch | images/s | p50 ms | p95 ms | p99 ms |",
+        "|---|---|---|---|---|---|",
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['processes']} x {row['threads']} | {row['batch_size']} | {row['images_per_s']:.0f} | "
+            f"{row['p50_ms']:.1f} | {row['p95_ms']:.1f} | {row['p99_ms']:.1f} |"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark process x thread splits for CNN inference")
+    parser.add_argument("--cores", type=int, default=len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count())
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--model", default=MODEL_PATH)
+    # Internal: one measuring process of a split
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-index", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-count", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--threads", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--batch-size", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, default=0.0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args)
+        sys.exit(0)
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        for processes, threads in splits(args.cores):
+            row = run_split(processes, threads, batch_size, args.seconds, args.model)
+            print(f"{processes} x {threads}, batch {batch_size}: {row['images_per_s']:.0f} images/s "
+                  f"(cpus {' | '.join(row['cpus'])})")
+            rows.append(row)
+    print(format_table(rows))
+    for batch_size in args.batch_sizes:
+        best = max((r for r in rows if r["batch_size"] == batch_size), key=lambda r: r["images_per_s"])
+        print(f"batch {batch_size}: best throughput with WORKER_COUNT={best['processes']} "
+              f"INFERENCE_THREADS={best['threads']}")
@@ -0,0 +1,139 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+# name -> (weight, deadline_seconds). Higher weight gets proportionally more dispatch
+# slots; a frame still waiting after its class deadline is dropped before inference.
+DEFAULT_CLASSES = {
+    "interactive": (8, 2.0),
+    "normal": (4, 10.0),
+    "bulk": (1, 30.0),
+}
+DEFAULT_CLASS = "normal"
+
+
+class _ClassQueue:
+    """Frames of one priority class, round-robined across sources (tenants, mirrors, ...)."""
+
+    def __init__(self, name: str, weight: int, deadline: float):
+        self.name = name
+        self.weight = weight
+        self.deadline = deadline
+        self.current_weight = 0
+        self.size = 0
+        self.sources = OrderedDict()  # source -> deque[(enqueued_at, item)]
+
+    def push(self, source: str, entry):
+        self.sources.setdefault(source, deque()).append(entry)
+        self.size += 1
+
+    def pop(self):
+        source, entries = next(iter(self.sources.items()))
+        entry = entries.popleft()
+        if entries:
+            self.sources.move_to_end(source)
+        else:
+            del self.sources[source]
+        self.size -= 1
+        return entry
+
+
+class PriorityScheduler:
+    """
+    Drop-in replacement for the worker's asyncio.Queue with multiple priority classes.
+
+    Classes are served by smooth weighted round-robin so bulk traffic still makes progress,
+    and within a class each source gets a fair turn. get() skips frames whose class deadline
+    has passed (reporting them via `on_expired`) and returns None once close() has been
+    called and nothing is left.
+    """
+
+    def __init__(self, classes: dict | None = None, default_class: str = DEFAULT_CLASS, on_expired=None):
+        classes = classes or DEFAULT_CLASSES
+        self.classes = {
+            name: _ClassQueue(name, weight, deadline)
+            for name, (weight, deadline) in classes.items()
+        }
+        self.default_class = default_class
+        self.on_expired = on_expired
+        self.stats = {name: {"enqueued": 0, "dispatched": 0, "expired": 0} for name in self.classes}
+        self._size = 0
+        self._unfinished = 0
+        self._closed = False
+        self._not_empty = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def put_nowait(self, item, priority: str | None = None, source: str = ""):
+        cls = self.classes.get(priority or self.default_class) or self.classes[self.default_class]
+        cls.push(source, (time.monotonic(), item))
+        self.stats[cls.name]["enqueued"] += 1
+        self._size += 1
+        self._unfinished += 1
+        self._finished.clear()
+        self._not_empty.set()
+
+    async def put(self, item, priority: str | None = None, source: str = ""):
+        self.put_nowait(item, priority, source)
+
+    def _pick_class(self) -> _ClassQueue:
+        total = 0
+        best = None
+        for cls in self.classes.values():
+            if cls.size == 0:
+                continue
+            cls.current_weight += cls.weight
+            total += cls.weight
+            if best is None or cls.current_weight > best.current_weight:
+                best = cls
+        best.current_weight -= total
+        return best
+
+    def get_nowait(self):
+        """Next frame that is still within its deadline; raises asyncio.QueueEmpty if there is none."""
+        now = time.monotonic()
+        while self._size:
+            cls = self._pick_class()
+            enqueued_at, item = cls.pop()
+            self._size -= 1
+            if now - enqueued_at > cls.deadline:
+                self.stats[cls.name]["expired"] += 1
+                self.task_done()
+                if self.on_expired is not None:
+                    self.on_expired(item, cls.name)
+                continue
+            self.stats[cls.name]["dispatched"] += 1
+            return item
+        raise asyncio.QueueEmpty
+
+    async def get(self):
+        while True:
+            try:
+                return self.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            if self._closed:
+                return None
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+    def task_done(self):
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self):
+        await self._finished.wait()
+
+    def close(self):
+        """Stop waiting for new frames: get() returns None once the remaining ones are served."""
+        self._closed = True
+        self._not_empty.set()
@@ -1,8 +1,12 @@
 import grpc
 from concurrent import futures
 import asyncio
+import signal
 import sys
 import os
+import threading
+
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
 
 # Add proto directory to path to import generated files
 sys.path.append(os.path.join(os.path.dirname(__file__), '../proto'))
@@ -13,14 +17,80 @@ import interface_pb2_grpc
 from storage import KeyStorage
 from request_queue import RequestQueue
 from model_loader import EmotionRecognitionModel
+from dedup import DedupIndex
+from result_store import ResultStore
+from risk import LogSink, RiskDetector, WebhookSink
+from prefork import PreforkSupervisor
+from emotion_bus import get_bus, to_message
+from supabase_client import close_sink
+from admission import Admission
+from face_crop import FaceCropper
 
 # Resolve model path relative to this file so it works regardless of CWD
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "models", "model_v1.pth")
+MODEL_PATH = os.getenv("MODEL_PATH", os.path.join(os.path.dirname(__file__), "..", "models", "model_v1.pth"))
+# inference_core backend: "cnn" (MODEL_PATH) or "siglip" / "siglip-int8" / "siglip-student"
+MODEL_BACKEND = os.getenv("EMOTION_MODEL_BACKEND", "cnn")
+SIGLIP_OPTIONS = {
+    "model_name": os.getenv("SIGLIP_MODEL_NAME", "prithivMLmods/Facial-Emotion-Detection-SigLIP2"),
+    "cache_dir": os.getenv("SIGLIP_CACHE_DIR") or None,
+    "local_files_only": os.getenv("SIGLIP_LOCAL_FILES_ONLY", "0") == "1",
+    "student_path": os.getenv("SIGLIP_STUDENT_PATH", "siglip_student.pt"),
+}
+SPOOL_PATH = os.getenv("SPOOL_PATH", os.path.join(os.path.dirname(__file__), "spool.jsonl"))
+PORT = int(os.getenv("EMOTION_PORT", "50051"))
+DRAIN_DEADLINE_SECONDS = float(os.getenv("DRAIN_DEADLINE_SECONDS", "20"))
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", os.path.join(os.path.dirname(__file__), "results"))
+DEDUP_TTL_SECONDS = float(os.getenv("DEDUP_TTL_SECONDS", "30"))
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "10000"))
+# Mean absolute grey-level difference on the 48x48 thumbnail; 0 disables the near-duplicate check.
+DEDUP_NEAR_THRESHOLD = float(os.getenv("DEDUP_NEAR_THRESHOLD", "0"))
+# Streaming risk detection; events go to the counselor portal webhook if set, else to the log.
+RISK_DETECTION = os.getenv("RISK_DETECTION", "1") == "1"
+RISK_WEBHOOK_URL = os.getenv("RISK_WEBHOOK_URL")
+RISK_WEBHOOK_API_KEY = os.getenv("BACKEND_API_KEY", "")
+RISK_COOLDOWN_SECONDS = float(os.getenv("RISK_COOLDOWN_SECONDS", "600"))
+# Frames larger than this are refused before queueing (gRPC's default receive limit is 4 MiB)
+ADMISSION_MAX_BYTES = int(os.getenv("ADMISSION_MAX_BYTES", str(4 * 1024 * 1024)))
+# Publish smoothed predictions on the emotion bus; agent sessions subscribe over SubscribeEmotions
+EMOTION_BUS = os.getenv("EMOTION_BUS", "1") == "1"
+# Crop frames to the largest face (Haar cascade, box cached per uid) before the model sees them; needs OpenCV
+FACE_CROP = os.getenv("FACE_CROP", "0") == "1"
+FACE_CROP_DETECT_WIDTH = int(os.getenv("FACE_CROP_DETECT_WIDTH", "640"))
+FACE_CROP_REDETECT_FRAMES = int(os.getenv("FACE_CROP_REDETECT_FRAMES", "5"))
+# >1: load the model once, then fork this many workers sharing it on EMOTION_PORT+1..+N, with a
+# shard router on EMOTION_PORT sending each uid to a fixed worker.
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+MEMORY_REPORT_SECONDS = float(os.getenv("MEMORY_REPORT_SECONDS", "60"))
+
+SERVICE_NAME = interface_pb2.DESCRIPTOR.services_by_name["EmotionService"].full_name
+
+# ImageRequest.priority -> scheduler class (see scheduler.DEFAULT_CLASSES)
+PRIORITY_CLASSES = {
+    interface_pb2.PRIORITY_INTERACTIVE: "interactive",
+    interface_pb2.PRIORITY_NORMAL: "normal",
+    interface_pb2.PRIORITY_BULK: "bulk",
+}
+
+
+async def set_serving(health_servicer, serving: bool):
+    """Report readiness for both the overall server ("") and the EmotionService."""
+    status = (
+        health_pb2.HealthCheckResponse.SERVING
+        if serving
+        else health_pb2.HealthCheckResponse.NOT_SERVING
+    )
+    for name in ("", SERVICE_NAME):
+        await health_servicer.set(name, status)
+
 
 class EmotionService(interface_pb2_grpc.EmotionServiceServicer):
-    def __init__(self, queue: RequestQueue, storage: KeyStorage):
+    def __init__(self, queue: RequestQueue, storage: KeyStorage, health_servicer=None,
+                 admission: Admission | None = None):
         self.queue = queue
         self.storage = storage
+        self.health_servicer = health_servicer
+        self.dedup = queue.dedup
+        self.admission = admission
 
     async def SendDecryptionKey(self, request, context):
         uid = request.uid
@@ -36,9 +106,34 @@ class EmotionService(interface_pb2_grpc.EmotionServiceServicer):
         uid = request.uid
         encrypted_image = request.encrypted_image
         print(f"Received encrypted image for {uid}")
-        
-        await self.queue.enqueue(uid, encrypted_image)
-        
+
+        if self.admission:
+            rejection = self.admission.check(request)
+            if rejection is not None:
+                # Could never be decrypted: refuse now rather than after queueing, AES and PIL.
+                code, message = rejection
+                print(f"Rejected frame for {uid}: {message}")
+                await context.abort(code, message)
+
+        digest = None
+        if self.dedup:
+            digest = self.dedup.fingerprint(encrypted_image)
+            duplicate, result = self.dedup.lookup(uid, digest)
+            if duplicate:
+                # Retry of a frame we already have: acknowledge without decrypting or predicting again.
+                return interface_pb2.StatusResponse(
+                    success=True,
+                    message=f"Duplicate frame; prior result: {result}" if result else "Duplicate frame; already queued",
+                )
+            self.dedup.add(uid, digest)
+
+        priority = PRIORITY_CLASSES.get(request.priority)
+        if not await self.queue.enqueue(uid, encrypted_image, priority=priority, source=request.source):
+            if digest is not None:
+                self.dedup.forget(uid, digest)
+            # Draining: tell the client to retry elsewhere instead of silently dropping the frame.
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "Worker is draining; retry on another node")
+
         return interface_pb2.StatusResponse(
             success=True,
             message="Image queued for processing"
@@ -51,41 +146,179 @@ class EmotionService(interface_pb2_grpc.EmotionServiceServicer):
         # Given the requirements, the new flow is SendDecryptionKey -> SendEncryptedImage.
         return interface_pb2.EmotionResponse(uid=request.uid, class_name="Deprecated: Use SendEncryptedImage")
 
-async def serve():
+    async def SubscribeEmotions(self, request, context):
+        bus = self.queue.bus
+        if bus is None:
+            await context.abort(grpc.StatusCode.UNIMPLEMENTED, "Emotion bus is disabled on this worker (EMOTION_BUS=0)")
+        if not request.uid:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "uid is required")
+        subscription = bus.subscribe(request.uid)
+        try:
+            async for update in subscription:
+                yield to_message(update)
+        finally:
+            # Also runs when the subscriber disconnects and gRPC cancels the stream
+            subscription.close()
+
+    async def Drain(self, request, context):
+        deadline = request.deadline_seconds or DRAIN_DEADLINE_SECONDS
+        if self.health_servicer is not None:
+            await set_serving(self.health_servicer, False)
+        summary = await self.queue.drain(deadline)
+        return interface_pb2.StatusResponse(
+            success=summary["spooled"] == 0 and summary["lost"] == 0 and summary["unflushed_writes"] == 0,
+            message=(
+                f"Drained: processed={summary['processed']} expired={summary['expired']} "
+                f"spooled={summary['spooled']} lost={summary['lost']} "
+                f"unflushed_writes={summary['unflushed_writes']}"
+            ),
+        )
+
+def create_model(mmap_weights: bool = False) -> EmotionRecognitionModel:
+    return EmotionRecognitionModel(
+        path=MODEL_PATH,
+        backend=MODEL_BACKEND,
+        backend_options=SIGLIP_OPTIONS if MODEL_BACKEND != "cnn" else None,
+        mmap_weights=mmap_weights,
+    )
+
+
+async def serve(model: EmotionRecognitionModel | None = None, worker_index: int | None = None, port: int = PORT):
+    """
+    Run one worker. Without `model` it loads its own once the port is up; a pre-forked
+    worker gets the parent's loaded model and its index, which selects its CPU slice and
+    keeps its spool and result store apart from its siblings'.
+    """
+    preloaded = model is not None
+    if preloaded:
+        # The parent's executor threads did not survive the fork
+        model.apply_runtime(worker_index=worker_index, worker_count=WORKER_PROCESSES)
+    else:
+        model = create_model()
+    spool_path, result_store_dir = SPOOL_PATH, RESULT_STORE_DIR
+    if worker_index is not None:
+        spool_path = f"{SPOOL_PATH}.{worker_index}"
+        result_store_dir = os.path.join(RESULT_STORE_DIR, f"worker-{worker_index}")
+
     # Initialize components
     storage = KeyStorage()
-    model = EmotionRecognitionModel(path=MODEL_PATH)
-    # We need to load the model. Since model.load is async, we do it here.
-    
-    print("Loading model...")
-    try:
-        await model.load()
-        print("Model loaded.")
-    except Exception as e:
-        print(f"Failed to load model: {e}")
-        print("Continuing anyway - model will fail predictions until loaded")
+    dedup = DedupIndex(DEDUP_TTL_SECONDS, DEDUP_MAX_ENTRIES, DEDUP_NEAR_THRESHOLD)
+    result_store = ResultStore(result_store_dir)
+    risk = RiskDetector(cooldown_seconds=RISK_COOLDOWN_SECONDS) if RISK_DETECTION else None
+    risk_sink = WebhookSink(RISK_WEBHOOK_URL, RISK_WEBHOOK_API_KEY) if RISK_WEBHOOK_URL else LogSink()
+    face_cropper = None
+    if FACE_CROP:
+        # The CNN sees 48x48 grey; SigLIP gets colour crops at its 224 input size
+        face_cropper = FaceCropper(FACE_CROP_DETECT_WIDTH, redetect_every=FACE_CROP_REDETECT_FRAMES,
+                                   min_crop=48 if model.thumbnail_input else 224,
+                                   mode="L" if model.thumbnail_input else "RGB")
+    queue = RequestQueue(model, storage, spool_path=spool_path, dedup=dedup, result_store=result_store,
+                         risk=risk, risk_sink=risk_sink, bus=get_bus() if EMOTION_BUS else None,
+                         face_cropper=face_cropper)
 
-    queue = RequestQueue(model, storage)
-    
-    # Start queue worker
-    worker_task = asyncio.create_task(queue.start_worker())
+    # Health starts NOT_SERVING so load balancers hold traffic until the model is warm.
+    health_servicer = health.aio.HealthServicer()
+    await set_serving(health_servicer, False)
 
     server = grpc.aio.server()
+    admission = Admission(storage, ADMISSION_MAX_BYTES)
     interface_pb2_grpc.add_EmotionServiceServicer_to_server(
-        EmotionService(queue, storage), server
+        EmotionService(queue, storage, health_servicer, admission), server
     )
-    bound = server.add_insecure_port("0.0.0.0:50051")
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    bound = server.add_insecure_port(f"0.0.0.0:{port}")
     if bound == 0:
-        raise RuntimeError("Failed to bind to port 50051 on 0.0.0.0")
-    print("gRPC server running on port 50051")
-    
+        raise RuntimeError(f"Failed to bind to port {port} on 0.0.0.0")
+    print(f"gRPC server running on port {port}")
+
     await server.start()
-    
+
+    # We need to load the model. Since model.load is async, we do it here.
+    ready = preloaded and model.engine is not None
+    if not preloaded:
+        ready = await load_model(model)
+
+    # Start queue worker; frames spooled by a previous drain are re-queued for it.
+    await queue.restore_spool()
+    worker_task = asyncio.create_task(queue.start_worker())
+    if ready:
+        await set_serving(health_servicer, True)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, AttributeError):
+            # Windows: Ctrl+C cancels asyncio.run(), and the finally block below still drains.
+            pass
+
     try:
-        await server.wait_for_termination()
+        await stop_event.wait()
     finally:
-        queue.running = False
-        await worker_task
+        print("Shutting down...")
+        await set_serving(health_servicer, False)
+        await queue.drain(DRAIN_DEADLINE_SECONDS)
+        await server.stop(grace=5)
+        result_store.flush()
+        await close_sink()
+        await risk_sink.close()
+        if risk is not None:
+            print(f"Risk stats: {risk.stats}")
+        print(f"Admission stats: {admission.summary(queue.decrypt_cost())}")
+        if face_cropper is not None:
+            print(f"Face crop stats: {face_cropper.summary()}")
+        if model.engine is not None:
+            print(f"Inference stats: {model.engine.summary()}")
+        if not worker_task.done():
+            worker_task.cancel()
+
+async def load_model(model: EmotionRecognitionModel, **runtime) -> bool:
+    print("Loading model...")
+    try:
+        await model.load(**runtime)
+        await model.warmup()
+        print("Model loaded.")
+        return True
+    except Exception as e:
+        print(f"Failed to load model: {e}")
+        print("Continuing anyway - health reports NOT_SERVING so no traffic is routed here")
+        return False
+
+
+def serve_prefork(workers: int):
+    """
+    Load and warm up the model once, then fork `workers` servers that share it.
+
+    Worker i listens on PORT + 1 + i. One more child runs the shard router on PORT, so
+    clients keep a single address while each uid always reaches the same worker - and with
+    it the same dedup, risk and emotion bus state. (SO_REUSEPORT would balance per
+    connection, and the backend holds a single long-lived channel.)
+    """
+    model = create_model(mmap_weights=True)
+    # Single-threaded in the parent: an OpenMP pool started before fork() is unusable in the children
+    asyncio.run(load_model(model, num_threads=1))
+    # Nothing but the main thread may run at fork(): a thread holding a lock (allocator,
+    # logging, gRPC) would leave that lock held forever in every child.
+    model.release_executor()
+    running = [t.name for t in threading.enumerate() if t is not threading.main_thread()]
+    if running:
+        raise RuntimeError(f"Threads still running before fork: {', '.join(running)}")
+
+    nodes = [f"localhost:{PORT + 1 + index}" for index in range(workers)]
+
+    def run_child(index: int) -> int:
+        if index == workers:
+            from router import serve_router
+            asyncio.run(serve_router(PORT, nodes))
+        else:
+            asyncio.run(serve(model, index, PORT + 1 + index))
+        return 0
+
+    return PreforkSupervisor(workers + 1, run_child, MEMORY_REPORT_SECONDS).run()
+
 
 if __name__ == "__main__":
+    if WORKER_PROCESSES > 1:
+        sys.exit(serve_prefork(WORKER_PROCESSES))
     asyncio.run(serve())
@@ -0,0 +1,165 @@
+"""
+Multi-process check of the shard router.
+
+Starts several worker nodes (service.py) and the router (router.py) as separate local
+processes, each node with its own key store and a throwaway (untrained) CNN. Keys and frames
+for a set of uids go through the router only; which node handled a uid is observed by
+subscribing to SubscribeEmotions on every node directly. Checks that:
+
+- every uid's frames reach one node only, the owner HashRing gives for it, and
+- after one node is stopped, the router moves the keys of that node's uids: their frames are
+  then processed by their new owners (a node without the key would drop them), while the
+  other uids stay where they were.
+
+Exits non-zero on failure.
+
+Usage:
+    python shard_router_check.py --port 50181 --nodes 3 --uids 24
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+import grpc
+
+from emotion_bus import interface_pb2, interface_pb2_grpc, remote_updates
+from emotion_stream_check import KEY, encrypt_frame, start_worker, wait_serving, write_model
+from router import HashRing
+
+HEALTH_INTERVAL = 0.5
+
+
+def start_router(port: int, nodes, data_dir: str, log) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        ROUTER_PORT=str(port),
+        EMOTION_NODES=",".join(nodes),
+        ROUTER_HEALTH_INTERVAL=str(HEALTH_INTERVAL),
+        ROUTER_KEYS_DB_PATH=os.path.join(data_dir, "router_keys.db"),
+    )
+    router = os.path.join(os.path.dirname(os.path.abspath(__file__)), "router.py")
+    return subprocess.Popen([sys.executable, router], env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def send_round(address: str, uids, frames: int, seed: int, keys: bool) -> int:
+    """
+    Keys (first round only) and `frames` distinct frames per uid, all through the router.
+    Returns how many frames were rejected, e.g. by a node that has no key for the uid.
+    """
+    rejected = 0
+    async with grpc.aio.insecure_channel(address) as channel:
+        stub = interface_pb2_grpc.EmotionServiceStub(channel)
+        if keys:
+            await asyncio.gather(*(stub.SendDecryptionKey(interface_pb2.KeyRequest(uid=uid, key=KEY)) for uid in uids))
+        for i in range(frames):
+            results = await asyncio.gather(*(
+                stub.SendEncryptedImage(interface_pb2.ImageRequest(
+                    uid=uid, encrypted_image=encrypt_frame(seed + i * len(uids) + n)))
+                for n, uid in enumerate(uids)
+            ), return_exceptions=True)
+            for uid, result in zip(uids, results):
+                if isinstance(result, grpc.aio.AioRpcError):
+                    print(f"  {uid}: frame rejected: {result.code()} {result.details()}")
+                    rejected += 1
+                elif isinstance(result, Exception):
+                    raise result
+    return rejected
+
+
+async def collect(received, uids, frames: int, timeout: float):
+    """Wait until every uid has `frames` updates (from any node) or the timeout passes"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        if all(sum(received[uid].values()) >= frames for uid in uids):
+            return
+        await asyncio.sleep(0.2)
+
+
+def compare(received, uids, ring: HashRing, label: str) -> bool:
+    """Every uid's updates came from exactly its ring owner"""
+    ok = True
+    per_node = defaultdict(int)
+    for uid in uids:
+        nodes = {node for node, count in received[uid].items() if count}
+        expected = ring.owner(uid)
+        per_node[expected] += 1
+        if nodes != {expected}:
+            print(f"  {uid}: expected {expected}, updates from {dict(received[uid]) or 'no node'}")
+            ok = False
+    spread = ", ".join(f"{node}={count}" for node, count in sorted(per_node.items()))
+    print(f"{label}: {len(uids)} uids ({spread}) -> {'each on its owner' if ok else 'MISROUTED'}")
+    return ok
+
+
+async def check(port: int, node_count: int, uid_count: int, frames: int, timeout: float) -> bool:
+    router_address = f"localhost:{port}"
+    nodes = [f"localhost:{port + 1 + i}" for i in range(node_count)]
+    uids = [f"router-check-{i}" for i in range(uid_count)]
+    received = defaultdict(lambda: defaultdict(int))  # uid -> node -> updates
+
+    async def consume(node: str, uid: str):
+        async for _ in remote_updates(node, uid, retry_seconds=0.5):
+            received[uid][node] += 1
+
+    with tempfile.TemporaryDirectory() as data_dir, open(os.path.join(data_dir, "processes.log"), "w+") as log:
+        workers, consumers = {}, []
+        router = None
+        try:
+            for node in nodes:
+                node_dir = os.path.join(data_dir, node.replace(":", "-"))
+                os.makedirs(node_dir)
+                write_model(node_dir)
+                workers[node] = start_worker(int(node.rsplit(":", 1)[1]), node_dir, log)
+            router = start_router(port, nodes, data_dir, log)
+            await asyncio.gather(*(wait_serving(address, timeout) for address in nodes + [router_address]))
+            await asyncio.sleep(HEALTH_INTERVAL * 3)  # the router has seen every node by now
+
+            consumers = [asyncio.create_task(consume(node, uid)) for node in nodes for uid in uids]
+            await asyncio.sleep(1.0)  # let the subscriptions open before the first frame
+
+            # 1. Stable membership: each uid sticks to one node, the same one every frame.
+            rejected = await send_round(router_address, uids, frames, seed=0, keys=True)
+            await collect(received, uids, frames, timeout)
+            ok = compare(received, uids, HashRing(nodes), f"{len(nodes)} nodes") and not rejected
+
+            # 2. One node leaves: its uids' keys move to their new owners, the rest stay put.
+            leaving = nodes[0]
+            workers[leaving].terminate()
+            workers[leaving].wait(timeout)
+            await asyncio.sleep(HEALTH_INTERVAL * 4)  # health check notices, keys are pushed
+            remaining = HashRing(nodes[1:])
+            moved = [uid for uid in uids if HashRing(nodes).owner(uid) == leaving]
+            received.clear()
+            rejected = await send_round(router_address, uids, frames, seed=10_000, keys=False)
+            await collect(received, uids, frames, timeout)
+            ok = compare(received, uids, remaining, f"{leaving} left, {len(moved)} uids moved") and not rejected and ok
+        finally:
+            for task in consumers:
+                task.cancel()
+            for process in [router, *workers.values()]:
+                if process is not None and process.poll() is None:
+                    process.terminate()
+                    process.wait(timeout)
+            if not any(received.values()):
+                log.seek(0)
+                print(log.read()[-3000:])
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check uid sharding and key rebalancing across local processes")
+    parser.add_argument("--port", type=int, default=50181, help="router port; nodes use the following ports")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--uids", type=int, default=24)
+    parser.add_argument("--frames", type=int, default=2, help="frames per uid in each round")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    ok = asyncio.run(check(args.port, args.nodes, args.uids, args.frames, args.timeout))
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
@@ -2,8 +2,17 @@ import sqlite3
 import os
 
 class KeyStorage:
-    def __init__(self, db_path="keys.db"):
-        self.db_path = db_path
+    """
+    SQLite-backed key store. Anything with the same save_key / get_key / items methods
+    can be passed to RequestQueue, EmotionService or the shard router instead.
+
+    Keys are replaced but never deleted, so uids known to have a key are cached in memory
+    and has_key() only goes to SQLite for uids it hasn't seen yet.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.getenv("KEYS_DB_PATH", "keys.db")
+        self._known_uids = set()
         self._init_db()
 
     def _init_db(self):
@@ -27,6 +36,7 @@ class KeyStorage:
                     VALUES (?, ?)
                 """, (uid, key))
                 conn.commit()
+            self._known_uids.add(uid)
             return True
         except Exception as e:
             print(f"Error saving key: {e}")
@@ -38,7 +48,23 @@ class KeyStorage:
                 cursor = conn.cursor()
                 cursor.execute("SELECT key FROM decryption_keys WHERE uid = ?", (uid,))
                 result = cursor.fetchone()
+                if result:
+                    self._known_uids.add(uid)
                 return result[0] if result else None
         except Exception as e:
             print(f"Error retrieving key: {e}")
             return None
+
+    def has_key(self, uid: str) -> bool:
+        return uid in self._known_uids or self.get_key(uid) is not None
+
+    def items(self):
+        """All (uid, key) pairs; used by the shard router to re-home keys when nodes change."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT uid, key FROM decryption_keys")
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Error listing keys: {e}")
+            return []
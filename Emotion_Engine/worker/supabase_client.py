@@ -1,5 +1,8 @@
+import asyncio
 import os
-from supabase import create_client, Client
+import time
+
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,36 +13,111 @@ key: str = os.environ.get("SUPABASE_KEY")
 if not url or not key:
     print("Warning: SUPABASE_URL or SUPABASE_KEY not set in environment.")
 
-supabase: Client = create_client(url, key) if url and key else None
+# Pool and timeout settings for the result sink
+SINK_MAX_CONNECTIONS = int(os.getenv("SINK_MAX_CONNECTIONS", "20"))
+SINK_MAX_KEEPALIVE = int(os.getenv("SINK_MAX_KEEPALIVE", "10"))
+SINK_KEEPALIVE_SECONDS = float(os.getenv("SINK_KEEPALIVE_SECONDS", "30"))
+SINK_TIMEOUT_SECONDS = float(os.getenv("SINK_TIMEOUT_SECONDS", "5"))
+SINK_CONNECT_TIMEOUT_SECONDS = float(os.getenv("SINK_CONNECT_TIMEOUT_SECONDS", "2"))
+SINK_MAX_CONCURRENCY = int(os.getenv("SINK_MAX_CONCURRENCY", "32"))
+SINK_HTTP2 = os.getenv("SINK_HTTP2", "0") == "1"
 
-async def save_user_emotion(user_id: str, emotion: str, timestamp: str) -> bool:
+
+class SupabaseSink:
     """
-    Saves the user emotion and timestamp to Supabase.
+    Async writer for `user_emotion` rows over Supabase's REST API (PostgREST).
+
+    One pooled httpx.AsyncClient per sink: connections are kept alive and reused (optionally
+    over HTTP/2), every request has connect/read timeouts, and at most `max_concurrency`
+    inserts are in flight - the rest wait their turn instead of piling onto the pool.
+    `base_url` can point at any PostgREST-compatible endpoint, e.g. fake_sink_server.py.
     """
-    if not supabase:
-        print("Supabase client not initialized. Cannot save data.")
-        return False
 
-    try:
-        data = {
+    def __init__(self, base_url: str, api_key: str, max_connections: int = SINK_MAX_CONNECTIONS,
+                 max_keepalive: int = SINK_MAX_KEEPALIVE, keepalive_seconds: float = SINK_KEEPALIVE_SECONDS,
+                 timeout: float = SINK_TIMEOUT_SECONDS, connect_timeout: float = SINK_CONNECT_TIMEOUT_SECONDS,
+                 max_concurrency: int = SINK_MAX_CONCURRENCY, http2: bool = SINK_HTTP2):
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/") + "/rest/v1",
+            headers={
+                "apikey": api_key,
+                "Authorization": f"Bearer {api_key}",
+                "Prefer": "return=minimal",
+            },
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_seconds,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            http2=http2,
+        )
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.stats = {"inserted": 0, "failed": 0, "timeouts": 0, "seconds": 0.0}
+
+    async def insert(self, table: str, row: dict) -> bool:
+        async with self._slots:
+            start = time.perf_counter()
+            try:
+                response = await self.client.post(f"/{table}", json=row)
+            except httpx.TimeoutException as e:
+                self.stats["timeouts"] += 1
+                self.stats["failed"] += 1
+                print(f"Timed out writing to {table}: {e!r}")
+                return False
+            except httpx.HTTPError as e:
+                self.stats["failed"] += 1
+                print(f"Error writing to {table}: {e!r}")
+                return False
+            finally:
+                self.stats["seconds"] += time.perf_counter() - start
+        if response.status_code >= 300:
+            self.stats["failed"] += 1
+            print(f"Failed to write to {table}: {response.status_code} {response.text}")
+            return False
+        self.stats["inserted"] += 1
+        return True
+
+    async def save_user_emotion(self, user_id: str, emotion: str, timestamp: str) -> bool:
+        return await self.insert("user_emotion", {
             "userId": user_id,
             "Emotion": emotion,
             "TimeStamp": timestamp
-        }
-        # execute() is synchronous in the current supabase-py client version usually, 
-        # but we can wrap it or just call it. For high throughput, maybe async is better,
-        # but for this worker, simple call is fine.
-        response = supabase.table("user_emotion").insert(data).execute()
-        
-        # Check for success? The generic client raises exception on error usually 
-        # or returns data.
-        if response.data:
-            print(f"Saved for userid {user_id}: {emotion}")
-            return True
-        else:
-            print(f"Failed to save for {user_id}. Response: {response}")
-            return False
+        })
+
+    async def aclose(self):
+        await self.client.aclose()
+
 
-    except Exception as e:
-        print(f"Error saving to Supabase for {user_id}: {e}")
+_sink: SupabaseSink | None = None
+
+
+def get_sink() -> SupabaseSink | None:
+    """The worker's shared sink, created on first use inside the running event loop"""
+    global _sink
+    if _sink is None and url and key:
+        _sink = SupabaseSink(url, key)
+    return _sink
+
+
+async def close_sink():
+    global _sink
+    if _sink is not None:
+        await _sink.aclose()
+        print(f"Result sink stats: {_sink.stats}")
+        _sink = None
+
+
+async def save_user_emotion(user_id: str, emotion: str, timestamp: str) -> bool:
+    """
+    Saves the user emotion and timestamp to Supabase.
+    """
+    sink = get_sink()
+    if not sink:
+        print("Supabase client not initialized. Cannot save data.")
         return False
+
+    if await sink.save_user_emotion(user_id, emotion, timestamp):
+        print(f"Saved for userid {user_id}: {emotion}")
+        return True
+    return False
@@ -16,6 +16,10 @@ const packageDefinition = protoLoader.loadSync(PROTO_PATH, {
   oneofs: true,
 });
 
+// ImageRequest.envelope_version for what the student app sends: 16-byte IV + AES-256-CBC
+// of {"image": <base64>}. The worker refuses versions it can't decrypt before queueing.
+export const ENVELOPE_VERSION = 1;
+
 const emotionProto = grpc.loadPackageDefinition(packageDefinition).emotion as any;
 
 export const grpcClient = new emotionProto.EmotionService(
@@ -1,4 +1,4 @@
-import { grpcClient } from "./grpc.client.js";
+import { ENVELOPE_VERSION, grpcClient } from "./grpc.client.js";
 
 export async function sendEncrytedData(
    { userId, encryptedData }: { userId: string, encryptedData: string }
@@ -11,7 +11,7 @@ export async function sendEncrytedData(
     // We must decode it to get the raw ciphertext bytes.
     const imageBuffer = Buffer.from(encryptedData, 'base64'); 
 
-    grpcClient.SendEncryptedImage({ uid: userId, encrypted_image: imageBuffer }, (err: any, response: any) => {
+    grpcClient.SendEncryptedImage({ uid: userId, encrypted_image: imageBuffer, envelope_version: ENVELOPE_VERSION }, (err: any, response: any) => {
       if (err) {
         console.error("gRPC SendEncryptedImage Error:", err);
         reject(err);